@@ -1,7 +1,28 @@
-"""Channel adapters for user interaction surfaces."""
+"""Channel adapters for user interaction surfaces.
 
-from app.channels.cli_app import run_cli_channel
-from app.channels.m365_app import AGENT_APP
-from app.channels.start_server import start_server
+Los canales se importan bajo demanda para que cada runtime cargue solo su SDK: la
+CLI y el modo batch no necesitan el Microsoft 365 Agents SDK, y el canal M365 no
+necesita la CLI.
+"""
 
-__all__ = ["run_cli_channel", "AGENT_APP", "start_server"]
+from importlib import import_module
+from typing import Any
+
+_LAZY_EXPORTS = {
+    "run_cli_channel": "app.channels.cli_app",
+    "run_batch_channel": "app.channels.batch_app",
+    "AGENT_APP": "app.channels.m365_app",
+    "start_server": "app.channels.start_server",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+__all__ = ["run_cli_channel", "run_batch_channel", "AGENT_APP", "start_server"]
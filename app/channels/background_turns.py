@@ -0,0 +1,92 @@
+"""Background worker pool for acknowledge-then-deliver turns.
+
+Los turnos lentos (p. ej. con web search) se pueden confirmar al instante y
+ejecutar en segundo plano; la respuesta se entrega después como mensaje
+proactivo. El pool limita la concurrencia, acota los trabajos pendientes y
+se drena de forma ordenada al apagar el servidor.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from app.core.runtime_env import get_env_bool, get_env_float, get_env_int
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTurnPool:
+    """Pool acotado de tareas asyncio para turnos entregados de forma proactiva."""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = False,
+        max_workers: int = 8,
+        max_pending: int = 100,
+        drain_timeout_seconds: float = 30.0,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers debe ser mayor que 0.")
+        self.enabled = enabled
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._max_pending = max_pending
+        self._drain_timeout_seconds = drain_timeout_seconds
+        self._tasks: set[asyncio.Task] = set()
+        self._accepting = True
+
+    @classmethod
+    def from_env(cls) -> "BackgroundTurnPool":
+        """Construye el pool leyendo las variables ``BACKGROUND_TURNS_*``."""
+        return cls(
+            enabled=get_env_bool("BACKGROUND_TURNS_ENABLED", False),
+            max_workers=get_env_int("BACKGROUND_TURNS_MAX_WORKERS", 8),
+            max_pending=get_env_int("BACKGROUND_TURNS_MAX_PENDING", 100),
+            drain_timeout_seconds=get_env_float("BACKGROUND_TURNS_DRAIN_SECONDS", 30.0),
+        )
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, job: Callable[[], Awaitable[None]], *, on_done: Callable[[], None] | None = None) -> bool:
+        """Programa ``job`` en segundo plano.
+
+        Devuelve ``False`` si el pool está desactivado, apagándose o lleno; en ese caso
+        el llamador debe atender el turno de forma síncrona. ``on_done`` se llama siempre
+        al terminar la tarea, también si se cancela antes de que ``job`` llegue a empezar
+        (p. ej. esperando un hueco del pool durante ``drain``).
+        """
+        if not self.enabled or not self._accepting or len(self._tasks) >= self._max_pending:
+            return False
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if on_done is not None:
+            task.add_done_callback(lambda _: on_done())
+        return True
+
+    async def _run(self, job: Callable[[], Awaitable[None]]) -> None:
+        async with self._semaphore:
+            try:
+                await job()
+            except Exception as exc:
+                logger.error("Error en turno en segundo plano: %s", exc, exc_info=True)
+
+    async def drain(self) -> None:
+        """Deja de aceptar trabajos y espera a los pendientes; cancela los que excedan el plazo."""
+        self._accepting = False
+        if not self._tasks:
+            return
+        logger.info("Esperando %s turnos en segundo plano antes de apagar...", len(self._tasks))
+        _, still_running = await asyncio.wait(set(self._tasks), timeout=self._drain_timeout_seconds)
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            await asyncio.gather(*still_running, return_exceptions=True)
+            logger.warning("%s turnos en segundo plano cancelados por apagado.", len(still_running))
+
+
+__all__ = ["BackgroundTurnPool"]
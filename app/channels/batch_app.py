@@ -0,0 +1,270 @@
+"""Modo batch: responde un fichero JSONL de prompts con paralelismo acotado.
+
+Cada línea de entrada es un objeto JSON con ``prompt`` (o ``text``) y, opcionalmente,
+``id`` y ``conversation_id``:
+
+- Sin ``conversation_id`` el prompt se responde aislado (``stateless``), en su propio
+  hilo desechable.
+- Con ``conversation_id`` los prompts de esa conversación comparten historial y se
+  ejecutan en el orden del fichero.
+
+La entrada se lee por líneas según avanzan los workers (no se carga entera en
+memoria) y cada resultado se añade al JSONL de salida en cuanto termina, con el
+texto, la latencia, las tools ofrecidas y usadas y los tokens del turno. La salida
+hace de checkpoint: al relanzar, los ``id`` que ya tienen una respuesta sin error
+se saltan (los fallidos se reintentan y su nueva línea sustituye a la anterior).
+``rpm`` fija un techo global de prompts por minuto, repartidos de forma uniforme.
+
+Por defecto el batch no usa la caché de respuestas: una evaluación o regresión debe
+medir lo que responde el modelo, no una respuesta guardada para otro prompt.
+``use_response_cache=True`` (``BATCH_USE_RESPONSE_CACHE``) la activa para ahorrar
+llamadas en ficheros con prompts repetidos.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from app.core.agent_viewer import ChatService
+from app.core.runtime_env import get_env_bool, get_env_float, get_env_int
+from app.core.turn_report import capture_turn
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos prompts completados se informa del progreso.
+PROGRESS_EVERY = 100
+
+
+@dataclass
+class BatchPrompt:
+    """Un prompt del fichero de entrada."""
+
+    record_id: str
+    line_number: int
+    prompt: str
+    conversation_id: str | None = None
+
+
+def read_prompts(path: str | Path) -> Iterator[BatchPrompt]:
+    """Lee los prompts de ``path`` de uno en uno; las líneas vacías se ignoran."""
+    with Path(path).open(encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"Línea {line_number} de {path}: JSON no válido ({exc}).") from exc
+            prompt = record.get("prompt", record.get("text")) if isinstance(record, dict) else None
+            if not isinstance(prompt, str) or not prompt.strip():
+                raise ValueError(f"Línea {line_number} de {path}: falta el campo 'prompt'.")
+            conversation_id = record.get("conversation_id")
+            yield BatchPrompt(
+                record_id=str(record.get("id", f"line-{line_number}")),
+                line_number=line_number,
+                prompt=prompt,
+                conversation_id=str(conversation_id) if conversation_id else None,
+            )
+
+
+def completed_ids(path: str | Path) -> set[str]:
+    """``id`` con respuesta sin error en una salida anterior (la última línea de cada ``id`` manda)."""
+    target = Path(path)
+    if not target.exists():
+        return set()
+    done: set[str] = set()
+    with target.open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Última línea a medio escribir si la ejecución anterior se interrumpió.
+                continue
+            if record.get("error"):
+                done.discard(record.get("id"))
+            else:
+                done.add(record.get("id"))
+    return done
+
+
+class RequestPacer:
+    """Reparte las peticiones para no superar ``rpm`` por minuto en todo el batch (0 = sin límite)."""
+
+    def __init__(self, rpm: float = 0.0, *, clock: Callable[[], float] = time.monotonic) -> None:
+        if rpm < 0:
+            raise ValueError("rpm no puede ser negativo.")
+        self._interval = 60.0 / rpm if rpm else 0.0
+        self._clock = clock
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        """Espera al siguiente hueco libre; los llamadores se atienden por orden de llegada."""
+        if not self._interval:
+            return
+        async with self._lock:
+            delay = self._next_at - self._clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = max(self._next_at, self._clock()) + self._interval
+
+
+@dataclass
+class _Job:
+    item: BatchPrompt
+    # Turno anterior de la misma conversación compartida: hay que esperarlo para respetar el orden.
+    after: asyncio.Future | None
+    done: asyncio.Future | None
+
+
+async def run_batch(
+    chat_service: ChatService,
+    input_path: str | Path,
+    output_path: str | Path,
+    *,
+    workers: int = 4,
+    rpm: float = 0.0,
+    resume: bool = True,
+    use_response_cache: bool = False,
+) -> dict[str, Any]:
+    """Responde los prompts de ``input_path`` y añade los resultados a ``output_path``.
+
+    Con ``resume=False`` la salida se vacía y se empieza de cero. Devuelve el resumen de la ejecución.
+    """
+    if workers < 1:
+        raise ValueError("workers debe ser mayor que 0.")
+    target = Path(output_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    skip = completed_ids(target) if resume else set()
+    if skip:
+        logger.info("[BATCH] Reanudando: %s prompts ya respondidos en %s.", len(skip), target)
+
+    pacer = RequestPacer(rpm)
+    queue: asyncio.Queue[_Job | None] = asyncio.Queue(maxsize=workers * 2)
+    stats = {"completed": 0, "errors": 0, "skipped": 0}
+    latencies: list[float] = []
+    started = time.perf_counter()
+
+    with target.open("a" if resume else "w", encoding="utf-8", buffering=1) as out:
+
+        async def produce() -> None:
+            last_turn: dict[str, asyncio.Future] = {}
+            loop = asyncio.get_running_loop()
+            for item in read_prompts(input_path):
+                if item.record_id in skip:
+                    stats["skipped"] += 1
+                    continue
+                after = done = None
+                if item.conversation_id:
+                    after = last_turn.get(item.conversation_id)
+                    done = last_turn[item.conversation_id] = loop.create_future()
+                await queue.put(_Job(item, after, done))
+            for _ in range(workers):
+                await queue.put(None)
+
+        async def answer(item: BatchPrompt) -> dict[str, Any]:
+            await pacer.wait()
+            shared = item.conversation_id is not None
+            # Los prompts aislados usan su propia clave para que el planificador no los serialice.
+            conversation_id = item.conversation_id or f"batch-{item.line_number}"
+            start = time.perf_counter()
+            with capture_turn() as report:
+                try:
+                    response = await chat_service.ask(
+                        item.prompt, conversation_id, stateless=not shared, use_response_cache=use_response_cache
+                    )
+                except Exception as exc:
+                    logger.error("[BATCH] Error en el prompt %s: %s", item.record_id, exc)
+                    response = None
+                    report.source = "error"
+                    report.error = f"{type(exc).__name__}: {exc}"
+            latency = time.perf_counter() - start
+            return {
+                "id": item.record_id,
+                "conversation_id": item.conversation_id,
+                "prompt": item.prompt,
+                "response": response,
+                "latency_seconds": round(latency, 4),
+                **report.to_dict(),
+            }
+
+        async def work() -> None:
+            while (job := await queue.get()) is not None:
+                try:
+                    if job.after is not None:
+                        await job.after
+                    record = await answer(job.item)
+                finally:
+                    if job.done is not None:
+                        job.done.set_result(None)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                latencies.append(record["latency_seconds"])
+                stats["completed"] += 1
+                if record["error"]:
+                    stats["errors"] += 1
+                if stats["completed"] % PROGRESS_EVERY == 0:
+                    logger.info("[BATCH] %s prompts completados (%s con error).", stats["completed"], stats["errors"])
+
+        tasks = [asyncio.create_task(produce()), *(asyncio.create_task(work()) for _ in range(workers))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Ante un error (p. ej. una línea no válida) o Ctrl+C no quedan workers esperando en la cola.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        **stats,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_minute": round(stats["completed"] / elapsed * 60, 2) if elapsed else 0.0,
+        "mean_latency_seconds": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        "max_latency_seconds": max(latencies, default=0.0),
+        "output": str(target),
+    }
+    logger.info("[BATCH] Terminado: %s", summary)
+    return summary
+
+
+async def run_batch_channel(
+    input_path: str | Path,
+    output_path: str | Path | None = None,
+    *,
+    workers: int | None = None,
+    rpm: float | None = None,
+    resume: bool = True,
+    use_response_cache: bool | None = None,
+) -> dict[str, Any]:
+    """Ejecuta un batch con un ``ChatService`` propio.
+
+    Por defecto la salida es ``<entrada>.results.jsonl``, los workers ``BATCH_WORKERS``, el
+    techo de prompts por minuto ``BATCH_RPM`` y el uso de la caché de respuestas
+    ``BATCH_USE_RESPONSE_CACHE`` (desactivada).
+    """
+    source = Path(input_path)
+    chat_service = ChatService()
+    await chat_service.start()
+    try:
+        return await run_batch(
+            chat_service,
+            source,
+            output_path or source.with_suffix(".results.jsonl"),
+            workers=workers or get_env_int("BATCH_WORKERS", 4),
+            rpm=get_env_float("BATCH_RPM", 0.0) if rpm is None else rpm,
+            resume=resume,
+            use_response_cache=(
+                get_env_bool("BATCH_USE_RESPONSE_CACHE", False) if use_response_cache is None else use_response_cache
+            ),
+        )
+    finally:
+        await chat_service.stop()
+
+
+__all__ = ["BatchPrompt", "RequestPacer", "completed_ids", "read_prompts", "run_batch", "run_batch_channel"]
@@ -1,44 +1,156 @@
-"""CLI channel runner for interactive terminal conversations."""
+"""CLI channel runner for interactive terminal conversations.
 
+El banner y el prompt aparecen al instante: la importación del agente (agent_framework
+y los SDK de Azure tardan segundos en cargarse), su inicialización, el token de
+Entra ID y la conexión con Foundry se preparan en segundo plano
+(``ChatService.start_warm_up``) mientras el usuario escribe. La entrada estándar se
+lee sin bloquear el event loop, de modo que las tareas de fondo siguen avanzando
+entre turnos. Ctrl+C durante una respuesta cancela solo ese turno; en el prompt,
+termina la sesión.
+"""
+
+import asyncio
 import logging
-from app.core.agent_viewer import ChatService
+import signal
+import sys
+import threading
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+if TYPE_CHECKING:
+    from app.core.agent_viewer import ChatService
 
 logger = logging.getLogger(__name__)
 
 
+class StdinReader:
+    """Lee líneas de stdin en un hilo daemon y las entrega al event loop sin bloquearlo.
+
+    ``connect_read_pipe`` no admite la consola de Windows, así que se usa un hilo lector
+    (daemon: no impide salir aunque quede esperando una línea).
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._lines: asyncio.Queue[str | None] = asyncio.Queue()
+        threading.Thread(target=self._pump, name="cli-stdin", daemon=True).start()
+
+    def _pump(self) -> None:
+        for line in iter(sys.stdin.readline, ""):
+            if not self._deliver(line):
+                return
+        # Fin de la entrada (Ctrl+D / Ctrl+Z o fichero redirigido agotado).
+        self._deliver(None)
+
+    def _deliver(self, line: str | None) -> bool:
+        try:
+            self._loop.call_soon_threadsafe(self._lines.put_nowait, line)
+        except RuntimeError:
+            # El event loop ya se cerró.
+            return False
+        return True
+
+    async def readline(self) -> str | None:
+        """Siguiente línea (sin el salto de línea) o ``None`` al llegar al final de la entrada."""
+        line = await self._lines.get()
+        return None if line is None else line.rstrip("\r\n")
+
+
+class Interruptible:
+    """Ejecuta una operación cada vez y la cancela al pulsar Ctrl+C (sin terminar el proceso)."""
+
+    def __init__(self) -> None:
+        self._active: asyncio.Task | None = None
+
+    def interrupt(self) -> None:
+        if self._active is not None and not self._active.done():
+            self._active.cancel()
+
+    def install(self) -> Callable[[], None]:
+        """Redirige SIGINT a ``interrupt``; devuelve la función que restaura el manejador anterior."""
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGINT)
+        signal.signal(signal.SIGINT, lambda *_: loop.call_soon_threadsafe(self.interrupt))
+        return lambda: signal.signal(signal.SIGINT, previous)
+
+    async def run(self, operation: Awaitable[Any]) -> tuple[bool, Any]:
+        """Devuelve ``(True, resultado)`` o ``(False, None)`` si el usuario la interrumpió."""
+        self._active = asyncio.ensure_future(operation)
+        try:
+            await asyncio.wait({self._active})
+        except asyncio.CancelledError:
+            # Cancelación externa (cierre del programa): se propaga también a la operación.
+            self._active.cancel()
+            raise
+        finally:
+            task, self._active = self._active, None
+        if task.cancelled():
+            return False, None
+        return True, task.result()
+
+
+async def _start_chat_service() -> "ChatService":
+    """Importa el agente en un hilo (sin bloquear el prompt), crea el servicio y lanza su precalentamiento."""
+    agent_viewer = await asyncio.to_thread(import_module, "app.core.agent_viewer")
+    chat_service = agent_viewer.ChatService()
+    await chat_service.start_warm_up()
+    return chat_service
+
+
+async def _answer(service_task: "asyncio.Task[ChatService]", user_input: str) -> None:
+    # Si la carga o el precalentamiento siguen en curso, el primer turno espera a que el agente esté listo.
+    chat_service = await asyncio.shield(service_task)
+    await chat_service.ensure_started()
+    # Los fragmentos se imprimen según llegan para reducir el tiempo hasta el primer token.
+    async for chunk in chat_service.ask_stream(user_input):
+        print(chunk, end="", flush=True)
+    print()
+
+
 async def run_cli_channel() -> None:
     """Ejecuta la experiencia de chat interactivo por terminal."""
-    chat_service = ChatService()
-    await chat_service.start()
-
     print("\n" + "=" * 60)
     print(" CHAT INTERACTIVO - Microsoft Agent Framework")
     print("=" * 60)
     print(" Escribe 'exit' o 'salir' para terminar")
     print(" Escribe 'clear' o 'limpiar' para limpiar el historial")
+    print(" Pulsa Ctrl+C para cancelar una respuesta en curso")
     print("=" * 60 + "\n")
 
+    service_task = asyncio.create_task(_start_chat_service())
+    stdin = StdinReader()
+    interruptible = Interruptible()
+    restore_sigint = interruptible.install()
     try:
         while True:
-            try:
-                user_input = input("\n[Tu]: ").strip()
-
-                if not user_input:
-                    continue
-
-                if user_input.lower() in ["exit", "salir", "quit"]:
-                    print("\n[Asistente]: ¡Adiós! Que tengas un buen día.")
-                    break
+            print("\n[Tu]: ", end="", flush=True)
+            completed, user_input = await interruptible.run(stdin.readline())
+            if not completed or user_input is None:
+                print("\n\nSesión interrumpida.")
+                break
 
-                response = await chat_service.ask(user_input)
-                print(f"\n[Asistente]: {response}")
+            user_input = user_input.strip()
+            if not user_input:
+                continue
 
-            except KeyboardInterrupt:
-                print("\n\nSesión interrumpida.")
+            if user_input.lower() in ["exit", "salir", "quit"]:
+                print("\n[Asistente]: ¡Adiós! Que tengas un buen día.")
                 break
+
+            print("\n[Asistente]: ", end="", flush=True)
+            try:
+                completed, _ = await interruptible.run(_answer(service_task, user_input))
+                if not completed:
+                    print("\n[Respuesta cancelada]")
             except Exception as exc:
-                logger.error(f"Error inesperado: {exc}", exc_info=True)
+                logger.error("Error inesperado: %s", exc, exc_info=True)
                 print("\n[Error]: Ocurrió un error inesperado. Intenta de nuevo.")
 
     finally:
-        await chat_service.stop()
+        restore_sigint()
+        try:
+            chat_service = await service_task
+        except Exception as exc:
+            logger.error("El agente no pudo cargarse: %s", exc)
+        else:
+            await chat_service.stop()
@@ -0,0 +1,79 @@
+"""Clientes del Bot Connector sobre el transporte HTTP compartido.
+
+El adapter del SDK crea un ``ConnectorClient`` (y su ``ClientSession`` de aiohttp)
+para cada respuesta y lo cierra al terminar el turno, así que cada ``send_activity``
+abría una conexión TLS nueva. Esta factoría construye las mismas sesiones sobre el
+connector de ``HttpTransport``: cerrarlas al final del turno solo libera la sesión,
+mientras que los sockets quedan en el pool para los turnos siguientes.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from aiohttp import ClientSession
+
+from microsoft_agents.hosting.core import RestChannelServiceClientFactory, TurnContext
+from microsoft_agents.hosting.core.authorization import AccessTokenProviderBase, ClaimsIdentity, Connections
+from microsoft_agents.hosting.core.connector import ConnectorClientBase
+from microsoft_agents.hosting.core.connector.get_product_info import get_product_info
+from microsoft_agents.hosting.core.connector.teams import TeamsConnectorClient
+
+from app.core.telemetry import client_trace_config
+from app.core.transport import HttpTransport
+
+# Cada envío al Bot Connector (respuesta, fragmento de streaming o mensaje proactivo) es un span.
+SEND_ACTIVITY_TRACE = client_trace_config("send_activity")
+
+
+class PooledChannelServiceClientFactory(RestChannelServiceClientFactory):
+    """Factoría de clientes del canal que reutiliza el pool de conexiones del servicio."""
+
+    def __init__(self, connection_manager: Connections, transport: HttpTransport) -> None:
+        super().__init__(connection_manager)
+        self._transport = transport
+
+    def _session(self, endpoint: str) -> ClientSession:
+        if not endpoint.endswith("/"):
+            endpoint += "/"
+        # Mismas cabeceras que usan los clientes del SDK cuando crean su propia sesión.
+        return self._transport.session(
+            base_url=endpoint,
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+                "User-Agent": get_product_info(),
+            },
+            trace_configs=[SEND_ACTIVITY_TRACE],
+        )
+
+    async def create_connector_client(
+        self,
+        context: TurnContext | None,
+        claims_identity: ClaimsIdentity,
+        service_url: str,
+        audience: str,
+        scopes: Optional[list[str]] = None,
+        use_anonymous: bool = False,
+    ) -> ConnectorClientBase:
+        if not claims_identity:
+            raise TypeError("claims_identity is required")
+        if not service_url:
+            raise TypeError("create_connector_client: service_url can't be None or Empty")
+        if not audience:
+            raise TypeError("create_connector_client: audience can't be None or Empty")
+
+        if context and context.activity.is_agentic_request():
+            token = await self._get_agentic_token(context, service_url)
+        else:
+            token_provider: AccessTokenProviderBase = (
+                self._connection_manager.get_token_provider(claims_identity, service_url)
+                if not use_anonymous
+                else self._ANONYMOUS_TOKEN_PROVIDER
+            )
+            token = await token_provider.get_access_token(audience, scopes or claims_identity.get_token_scope())
+
+        return TeamsConnectorClient(endpoint=service_url, token=token, session=self._session(service_url))
+
+
+__all__ = ["PooledChannelServiceClientFactory"]
@@ -1,44 +1,117 @@
-"""Microsoft 365 channel application using Microsoft 365 Agents SDK."""
-
-import asyncio
+"""Microsoft 365 channel application using Microsoft 365 Agents SDK.
+
+El ``ChatService`` del canal y ``AGENT_APP`` se crean en el primer uso, no al importar
+el módulo: ``main_m365`` construye su propia aplicación con el adapter autenticado y
+la aplicación por defecto no debe pagarse en el arranque.
+"""
+
+import logging
+import os
+from typing import Any
+from app.channels.background_turns import BackgroundTurnPool
+from app.channels.turn_dedup import TurnDeduplicator
 from app.core.agent_viewer import ChatService
+from app.core.rate_limits import QuotaExceededError
+from app.core.scheduler import SchedulerBusyError
+from microsoft_agents.activity import Activity, ActivityTypes
 from microsoft_agents.hosting.aiohttp import CloudAdapter
-from microsoft_agents.hosting.core import AgentApplication, MemoryStorage, TurnContext, TurnState
+from microsoft_agents.hosting.core import AgentApplication, MemoryStorage, Storage, TurnContext, TurnState
 
-chat_service = ChatService()
-_is_started = False
-_startup_lock = asyncio.Lock()
+logger = logging.getLogger(__name__)
 
+_chat_service: ChatService | None = None
+_default_agent_app: AgentApplication[TurnState] | None = None
+background_turns = BackgroundTurnPool.from_env()
+turn_dedup = TurnDeduplicator.from_env()
+BUSY_REPLY = "Ahora mismo estoy atendiendo muchas conversaciones. Inténtalo de nuevo en unos segundos."
+THINKING_UPDATE = "Pensando..."
+BACKGROUND_ACK = "Estoy buscando la información; te envío la respuesta en cuanto la tenga."
+STARTING_REPLY = "Estoy terminando de arrancar; vuelve a escribirme en unos segundos."
+QUOTA_REPLY = "Has alcanzado el límite de mensajes por minuto. Podrás volver a preguntar en unos {seconds} s."
 
-async def _ensure_started() -> None:
-    global _is_started
-    if _is_started:
-        return
 
-    async with _startup_lock:
-        if _is_started:
-            return
-        await chat_service.start()
-        _is_started = True
+def get_chat_service() -> ChatService:
+    """``ChatService`` del canal, creado en el primer uso."""
+    global _chat_service
+    if _chat_service is None:
+        _chat_service = ChatService()
+    return _chat_service
+
+
+def set_chat_service(service: ChatService) -> None:
+    """Sustituye el servicio del canal (p. ej. por uno con el backend simulado de ``benchmarks``)."""
+    global _chat_service
+    _chat_service = service
+
+
+def _quota_reply(error: QuotaExceededError) -> str:
+    return QUOTA_REPLY.format(seconds=max(1, round(error.retry_after_seconds)))
 
 
-def create_agent_application(adapter: CloudAdapter | None = None) -> AgentApplication[TurnState]:
-    """Crea la aplicación de canal M365 usando un adapter configurable."""
+def _quota_identity(activity: Activity) -> dict[str, str | None]:
+    """Usuario y tenant de la actividad, claves de las cuotas de uso."""
+    sender = activity.from_property
+    tenant_id = (activity.conversation.tenant_id if activity.conversation else None) or (
+        sender.tenant_id if sender else None
+    )
+    return {"user_id": sender.id if sender else None, "tenant_id": tenant_id}
+
+
+async def _deliver_in_background(
+    adapter: CloudAdapter,
+    continuation: Activity,
+    user_text: str,
+    conversation_id: str,
+    identity: dict[str, str | None],
+) -> None:
+    """Ejecuta el turno fuera de la petición HTTP y entrega la respuesta como mensaje proactivo."""
+    try:
+        answer = await get_chat_service().ask(user_text, conversation_id, **identity)
+    except SchedulerBusyError:
+        answer = BUSY_REPLY
+    except QuotaExceededError as e:
+        answer = _quota_reply(e)
+
+    async def send_answer(turn_context: TurnContext) -> None:
+        await turn_context.send_activity(answer)
+
+    await adapter.continue_conversation(os.getenv("MICROSOFT_APP_ID", ""), continuation, send_answer)
+    logger.debug("Respuesta en segundo plano entregada a la conversación %s", conversation_id)
+
+
+async def _stream_answer(
+    context: TurnContext, user_text: str, conversation_id: str, identity: dict[str, str | None]
+) -> None:
+    # Indicador de escritura inmediato; después la respuesta se entrega en streaming
+    # (en canales sin streaming, StreamingResponse envía solo el mensaje final).
+    await context.send_activity(Activity(type=ActivityTypes.typing))
+    streaming = context.streaming_response
+    streaming.queue_informative_update(THINKING_UPDATE)
+    try:
+        async for chunk in get_chat_service().ask_stream(user_text, conversation_id, **identity):
+            streaming.queue_text_chunk(chunk)
+    except SchedulerBusyError:
+        streaming.queue_text_chunk(BUSY_REPLY)
+    except QuotaExceededError as e:
+        streaming.queue_text_chunk(_quota_reply(e))
+    await streaming.end_stream()
+
+
+def create_agent_application(
+    adapter: CloudAdapter | None = None, storage: Storage | None = None
+) -> AgentApplication[TurnState]:
+    """Crea la aplicación de canal M365 usando un adapter y un almacenamiento configurables.
+
+    Sin ``storage`` el estado de turno vive en memoria (``MemoryStorage``).
+    """
     agent_app = AgentApplication[TurnState](
-        storage=MemoryStorage(),
+        storage=storage or MemoryStorage(),
         adapter=adapter or CloudAdapter(),
     )
 
     @agent_app.conversation_update("membersAdded")
     async def on_members_added(context: TurnContext, _: TurnState):
-        while True:
-            try:
-                await _ensure_started()
-                break
-            except Exception as e:
-                print(f"Error durante startup del agente: {e}. Reintentando en 5 segundos...")
-                await asyncio.sleep(5)
-                
+        # El agente se inicializa al arrancar el servidor (ChatService.start_warm_up); aquí no se espera.
         await context.send_activity(
             "Hola, soy tu agente conectado a Foundry. Escribe /help para ayuda."
         )
@@ -50,7 +123,13 @@ def create_agent_application(adapter: CloudAdapter | None = None) -> AgentApplic
 
     @agent_app.activity("message")
     async def on_message(context: TurnContext, _: TurnState):
-        await _ensure_started()
+        chat_service = get_chat_service()
+        try:
+            await chat_service.ensure_started()
+        except Exception as e:
+            logger.error("El agente no pudo inicializarse: %s", e)
+            await context.send_activity(STARTING_REPLY)
+            return
         text = (context.activity.text or "").strip()
 
         if not text:
@@ -63,15 +142,45 @@ def create_agent_application(adapter: CloudAdapter | None = None) -> AgentApplic
             )
             return
 
-        if text == "/clear":
-            response = await chat_service.ask("clear")
-            await context.send_activity(response)
+        conversation_id = context.activity.conversation.id
+        user_text = "clear" if text == "/clear" else text
+        identity = _quota_identity(context.activity)
+
+        # Los reenvíos del Bot Connector y los dobles envíos no repiten el turno: esperan al original.
+        claim = turn_dedup.claim(conversation_id, context.activity.id, user_text, identity["user_id"])
+        if not claim.owner:
+            await turn_dedup.wait(claim)
             return
 
-        answer = await chat_service.ask(text)
-        await context.send_activity(answer)
+        # Modo opcional acuse-y-entrega: los turnos previsiblemente lentos se confirman al momento
+        # y la respuesta llega después por continue_conversation, liberando la petición HTTP.
+        if background_turns.enabled and chat_service.expects_slow_turn(user_text, conversation_id):
+            continuation = context.activity.get_conversation_reference().get_continuation_activity()
+            # El claim se libera al terminar la tarea, aunque se cancele antes de empezar (apagado).
+            submitted = background_turns.submit(
+                lambda: _deliver_in_background(context.adapter, continuation, user_text, conversation_id, identity),
+                on_done=lambda: turn_dedup.complete(claim),
+            )
+            if submitted:
+                await context.send_activity(BACKGROUND_ACK)
+                return
+
+        try:
+            await _stream_answer(context, user_text, conversation_id, identity)
+        finally:
+            turn_dedup.complete(claim)
 
     return agent_app
 
 
-AGENT_APP = create_agent_application()
+def __getattr__(name: str) -> Any:
+    # ``AGENT_APP`` (aplicación con adapter y almacenamiento por defecto) y ``chat_service`` se
+    # mantienen como atributos del módulo, pero se construyen al pedirlos por primera vez.
+    global _default_agent_app
+    if name == "AGENT_APP":
+        if _default_agent_app is None:
+            _default_agent_app = create_agent_application()
+        return _default_agent_app
+    if name == "chat_service":
+        return get_chat_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
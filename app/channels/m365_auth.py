@@ -18,7 +18,9 @@ from pathlib import Path
 from microsoft_agents.authentication.msal import MsalConnectionManager
 from microsoft_agents.hosting.aiohttp import CloudAdapter
 from microsoft_agents.hosting.core import AgentAuthConfiguration
+from app.channels.connector_clients import PooledChannelServiceClientFactory
 from app.core.runtime_env import load_local_env_if_needed
+from app.core.transport import HttpTransport
 
 ENV_FILE = load_local_env_if_needed(Path(__file__).resolve())
 
@@ -30,13 +32,15 @@ def _require_env(name: str) -> str:
     return value
 
 
-def create_m365_auth_runtime() -> tuple[CloudAdapter, AgentAuthConfiguration]:
+def create_m365_auth_runtime(transport: HttpTransport | None = None) -> tuple[CloudAdapter, AgentAuthConfiguration]:
     """Construye adapter y configuración auth de canal M365 desde variables de entorno.
 
     Implementación actual:
     - Una única conexión real: ``SERVICE_CONNECTION``.
     - ``CONNECTIONSMAP`` vacío, por lo que el runtime usa la conexión por defecto
       para todos los casos.
+    - Con ``transport``, las respuestas al Bot Connector reutilizan su pool de
+      conexiones en lugar de abrir una sesión HTTP nueva por turno.
 
     Variante 1 (misma conexión para todo, incluido Graph):
 
@@ -91,5 +95,8 @@ def create_m365_auth_runtime() -> tuple[CloudAdapter, AgentAuthConfiguration]:
         CONNECTIONSMAP=[],
     )
 
-    adapter = CloudAdapter(connection_manager=connection_manager)
+    client_factory = (
+        PooledChannelServiceClientFactory(connection_manager, transport) if transport is not None else None
+    )
+    adapter = CloudAdapter(connection_manager=connection_manager, channel_service_client_factory=client_factory)
     return adapter, auth_configuration
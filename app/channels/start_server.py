@@ -1,7 +1,11 @@
 """HTTP server bootstrap for Microsoft 365 channel endpoint."""
 
 from os import environ
-from aiohttp.web import Application, Request, Response, run_app
+from typing import Awaitable, Callable, Sequence
+from aiohttp.web import Application, Request, Response, json_response, middleware, run_app
+from app.channels.worker_pool import AffinityRouter, WorkerSlot, bind_internal_socket
+from app.core.telemetry import stage
+from opentelemetry import context as otel_context, propagate
 from microsoft_agents.hosting.aiohttp import (
     CloudAdapter,
     jwt_authorization_middleware,
@@ -9,27 +13,122 @@ from microsoft_agents.hosting.aiohttp import (
 )
 from microsoft_agents.hosting.core import AgentApplication, AgentAuthConfiguration
 
+# Sondas del balanceador/orquestador: no llevan token del Bot Service, así que no pasan por la validación JWT.
+PROBE_PATHS = frozenset({"/healthz", "/readyz"})
 
-def start_server(
+
+@middleware
+async def _trace_requests(request: Request, handler):
+    """Span raíz de cada petición entrante (continúa la traza del llamador si trae ``traceparent``)."""
+    if request.path in PROBE_PATHS:
+        return await handler(request)
+    token = otel_context.attach(propagate.extract(request.headers))
+    try:
+        with stage(
+            "http_request", {"http.route": request.path}, **{"http.request.method": request.method}
+        ) as span:
+            response = await handler(request)
+            span.set_attribute("http.response.status_code", response.status)
+            return response
+    finally:
+        otel_context.detach(token)
+
+
+@middleware
+async def _authorize_except_probes(request: Request, handler):
+    if request.path in PROBE_PATHS:
+        return await handler(request)
+    return await jwt_authorization_middleware(request, handler)
+
+
+def build_app(
     agent_application: AgentApplication,
     auth_configuration: AgentAuthConfiguration | None,
-) -> None:
-    """Inicia el servidor HTTP para recibir actividades en /api/messages."""
+    on_startup: Sequence[Callable[[], Awaitable[None]]] = (),
+    on_shutdown: Sequence[Callable[[], Awaitable[None]]] = (),
+    readiness: Callable[[], bool] | None = None,
+    worker: WorkerSlot | None = None,
+) -> Application:
+    """Construye la aplicación aiohttp con /api/messages, sondas y hooks de ciclo de vida.
+
+    - ``on_startup``: corrutinas que se ejecutan al arrancar (p. ej. lanzar el precalentamiento
+      del agente en segundo plano); no deben bloquear el arranque.
+    - ``on_shutdown``: corrutinas que se ejecutan en orden al apagar el servidor (p. ej. drenar
+      turnos en segundo plano) antes de cerrar las conexiones.
+    - ``readiness``: indica si el agente puede atender tráfico; ``GET /readyz`` responde 503
+      hasta entonces. ``GET /healthz`` solo comprueba que el proceso responde.
+    """
 
     async def entry_point(req: Request) -> Response:
         agent: AgentApplication = req.app["agent_app"]
         adapter: CloudAdapter = req.app["adapter"]
         return await start_agent_process(req, agent, adapter)
 
-    app = Application(middlewares=[jwt_authorization_middleware])
+    async def health(_: Request) -> Response:
+        return json_response({"status": "alive"})
+
+    async def ready(_: Request) -> Response:
+        if readiness is None or readiness():
+            return json_response({"status": "ready"})
+        return json_response({"status": "warming_up"}, status=503)
+
+    middlewares = [_trace_requests, _authorize_except_probes]
+    router: AffinityRouter | None = None
+    if worker is not None and worker.affinity:
+        # El reenvío va antes de la validación JWT: la repite el worker dueño de la conversación.
+        router = AffinityRouter(worker)
+        middlewares.insert(1, router.middleware)
+
+    app = Application(middlewares=middlewares)
     app.router.add_post("/api/messages", entry_point)
     app.router.add_get("/api/messages", lambda _: Response(status=200))
+    app.router.add_get("/healthz", health)
+    app.router.add_get("/readyz", ready)
     app["agent_configuration"] = auth_configuration
     app["agent_app"] = agent_application
     app["adapter"] = agent_application.adapter
 
+    async def run_startup_hooks(_: Application) -> None:
+        for hook in on_startup:
+            await hook()
+
+    async def run_shutdown_hooks(_: Application) -> None:
+        for hook in on_shutdown:
+            await hook()
+        if router is not None:
+            await router.close()
+
+    app.on_startup.append(run_startup_hooks)
+    app.on_shutdown.append(run_shutdown_hooks)
+    return app
+
+
+def start_server(
+    agent_application: AgentApplication,
+    auth_configuration: AgentAuthConfiguration | None,
+    on_startup: Sequence[Callable[[], Awaitable[None]]] = (),
+    on_shutdown: Sequence[Callable[[], Awaitable[None]]] = (),
+    readiness: Callable[[], bool] | None = None,
+    worker: WorkerSlot | None = None,
+) -> None:
+    """Inicia el servidor HTTP para recibir actividades en /api/messages (ver ``build_app``).
+
+    Con ``worker`` el proceso forma parte de un pool (ver ``worker_pool``): comparte el
+    puerto con ``SO_REUSEPORT`` y, si hay afinidad, reenvía cada conversación a su worker.
+    """
+    app = build_app(
+        agent_application,
+        auth_configuration,
+        on_startup=on_startup,
+        on_shutdown=on_shutdown,
+        readiness=readiness,
+        worker=worker,
+    )
+    sockets = [bind_internal_socket(worker)] if worker is not None and worker.affinity else []
     run_app(
         app,
         host=environ.get("AGENT_HOST", "0.0.0.0"),
         port=int(environ.get("PORT", "3978")),
+        sock=sockets or None,
+        reuse_port=True if worker is not None else None,
     )
@@ -0,0 +1,86 @@
+"""Implementación de ``Storage`` del Microsoft 365 Agents SDK sobre el almacén de estado duradero.
+
+Sustituye a ``MemoryStorage`` cuando ``STATE_STORE_URL`` está configurada, de modo
+que el estado de turno (conversación/usuario) sobrevive a reinicios y se comparte
+entre workers. Sigue la convención de etags del SDK: el documento leído incluye
+``e_tag`` y, si vuelve en la escritura, la versión almacenada debe coincidir
+(``"*"`` o ausente = escritura incondicional).
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Type, TypeVar
+
+from microsoft_agents.hosting.core import Storage, StoreItem
+
+from app.core.state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+ETAG_FIELD = "e_tag"
+StoreItemT = TypeVar("StoreItemT", bound=StoreItem)
+
+
+class DurableStorage(Storage):
+    """``Storage`` del SDK respaldado por ``StateStore`` (SQLite/WAL o Redis)."""
+
+    def __init__(self, store: StateStore) -> None:
+        self._store = store
+
+    @classmethod
+    def from_env(cls) -> "DurableStorage | None":
+        """Devuelve el almacenamiento duradero o ``None`` si ``STATE_STORE_URL`` no está definida."""
+        store = StateStore.from_env()
+        return cls(store) if store is not None else None
+
+    @property
+    def store(self) -> StateStore:
+        return self._store
+
+    async def read(
+        self, keys: list[str], *, target_cls: Type[StoreItemT] = None, **kwargs: Any
+    ) -> dict[str, StoreItemT]:
+        if not keys:
+            raise ValueError("Storage.read(): Keys are required when reading.")
+        if not target_cls:
+            raise ValueError("Storage.read(): target_cls cannot be None.")
+        if "" in keys:
+            raise ValueError("DurableStorage.read(): key cannot be empty")
+
+        result: dict[str, StoreItemT] = {}
+        for key, (document, etag) in (await self._store.read(keys)).items():
+            document = dict(document or {})
+            document[ETAG_FIELD] = etag
+            result[key] = target_cls.from_json_to_store_item(document)
+        return result
+
+    async def write(self, changes: dict[str, StoreItemT]) -> None:
+        if not changes:
+            raise ValueError("DurableStorage.write(): changes cannot be None")
+        if "" in changes:
+            raise ValueError("DurableStorage.write(): key cannot be empty")
+
+        items: dict[str, tuple[dict[str, Any], str | None]] = {}
+        for key, item in changes.items():
+            document = dict((item.store_item_to_json() if isinstance(item, StoreItem) else item) or {})
+            items[key] = (document, document.pop(ETAG_FIELD, None))
+        etags = await self._store.write(items)
+
+        # El elemento en memoria pasa a la versión recién escrita: una segunda escritura en el
+        # mismo turno no debe interpretarse como conflicto.
+        for key, etag in etags.items():
+            state = getattr(changes[key], "state", changes[key])
+            if isinstance(state, dict) and ETAG_FIELD in state:
+                state[ETAG_FIELD] = etag
+
+    async def delete(self, keys: list[str]) -> None:
+        if not keys:
+            raise ValueError("Storage.delete(): Keys are required when deleting.")
+        await self._store.delete(keys)
+
+    async def close(self) -> None:
+        await self._store.close()
+
+
+__all__ = ["DurableStorage"]
@@ -0,0 +1,145 @@
+"""Idempotencia de las actividades del Bot Connector y agrupación de turnos idénticos.
+
+Si el handler tarda, el Bot Connector reenvía la misma actividad (mismo
+``activity.id``) y cada reenvío ejecutaba otro turno completo contra Foundry, con
+una respuesta duplicada. ``TurnDeduplicator`` recuerda los ``activity.id`` ya
+atendidos en un conjunto acotado con TTL y registra los turnos en curso:
+
+- Un reenvío de una actividad en curso se adjunta al turno original y espera a que
+  termine, sin lanzar trabajo nuevo ni enviar otra respuesta.
+- Un reenvío de una actividad ya terminada se confirma sin hacer nada.
+- Un mensaje con el mismo texto del mismo remitente en la misma conversación mientras
+  el primero sigue en curso (doble envío) se agrupa con él: la respuesta llega una sola
+  vez. La misma pregunta de otro usuario (p. ej. en un chat de grupo) es un turno aparte.
+
+El estado es por proceso; con varios workers, la afinidad por conversación
+(``SERVER_CONVERSATION_AFFINITY``) hace que los reenvíos lleguen al mismo worker.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from app.core.runtime_env import get_env_float, get_env_int
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TurnClaim:
+    """Resultado de registrar una actividad: dueña del turno o duplicado de otro."""
+
+    owner: bool
+    activity_id: str | None
+    future: asyncio.Future | None
+    text_key: tuple[str, str, str] | None = None
+
+
+class TurnDeduplicator:
+    """Conjunto acotado con TTL de actividades atendidas y registro de turnos en curso."""
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = 600.0,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._clock = clock
+        self._completed: OrderedDict[str, float] = OrderedDict()
+        self._by_activity: dict[str, asyncio.Future] = {}
+        self._by_text: dict[tuple[str, str, str], asyncio.Future] = {}
+        self.redeliveries = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls) -> "TurnDeduplicator":
+        """Construye el deduplicador leyendo ``ACTIVITY_DEDUP_*``."""
+        return cls(
+            ttl_seconds=get_env_float("ACTIVITY_DEDUP_TTL_SECONDS", 600.0),
+            max_entries=get_env_int("ACTIVITY_DEDUP_MAX_ENTRIES", 10000),
+        )
+
+    @property
+    def avoided(self) -> int:
+        """Llamadas al backend evitadas (reenvíos más turnos agrupados)."""
+        return self.redeliveries + self.coalesced
+
+    def _seen(self, activity_id: str) -> bool:
+        now = self._clock()
+        while self._completed:
+            oldest_id, expires_at = next(iter(self._completed.items()))
+            if expires_at > now:
+                break
+            self._completed.pop(oldest_id)
+        return activity_id in self._completed
+
+    def claim(
+        self, conversation_id: str, activity_id: str | None, text: str, sender_id: str | None = None
+    ) -> TurnClaim:
+        """Registra la actividad; si ya está atendida o en curso devuelve un duplicado (``owner=False``).
+
+        Solo se agrupan mensajes idénticos del mismo ``sender_id``.
+        """
+        if activity_id:
+            in_flight = self._by_activity.get(activity_id)
+            if in_flight is not None or self._seen(activity_id):
+                self.redeliveries += 1
+                logger.info("[DEDUP] Reenvío de la actividad %s; no se repite el turno.", activity_id)
+                return TurnClaim(owner=False, activity_id=activity_id, future=in_flight)
+        text_key = (conversation_id, sender_id or "", text.strip().casefold())
+        in_flight = self._by_text.get(text_key)
+        if in_flight is not None:
+            self.coalesced += 1
+            if activity_id:
+                # El duplicado queda ligado al turno original: sus propios reenvíos también se ignoran.
+                self._by_activity[activity_id] = in_flight
+            logger.info("[DEDUP] Mensaje idéntico en curso en %s; se agrupa con el turno original.", conversation_id)
+            return TurnClaim(owner=False, activity_id=activity_id, future=in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        if activity_id:
+            self._by_activity[activity_id] = future
+        self._by_text[text_key] = future
+        return TurnClaim(owner=True, activity_id=activity_id, future=future, text_key=text_key)
+
+    def complete(self, claim: TurnClaim) -> None:
+        """Marca el turno como terminado: despierta a los duplicados y recuerda el ``activity.id``."""
+        if not claim.owner or claim.future is None:
+            return
+        if not claim.future.done():
+            claim.future.set_result(None)
+        expires_at = self._clock() + self._ttl_seconds
+        for activity_id in [key for key, future in self._by_activity.items() if future is claim.future]:
+            del self._by_activity[activity_id]
+            self._completed[activity_id] = expires_at
+            self._completed.move_to_end(activity_id)
+        while len(self._completed) > self._max_entries:
+            self._completed.popitem(last=False)
+        if claim.text_key is not None and self._by_text.get(claim.text_key) is claim.future:
+            self._by_text.pop(claim.text_key)
+
+    async def wait(self, claim: TurnClaim) -> None:
+        """Espera a que termine el turno al que se adjuntó el duplicado (sin cancelarlo si se cancela)."""
+        if claim.future is not None:
+            await asyncio.shield(claim.future)
+
+    def stats(self) -> dict[str, Any]:
+        """Reenvíos y turnos agrupados, y actividades recordadas o en curso."""
+        return {
+            "redeliveries": self.redeliveries,
+            "coalesced": self.coalesced,
+            "avoided_calls": self.avoided,
+            "in_flight": len(self._by_activity),
+            "remembered": len(self._completed),
+        }
+
+
+__all__ = ["TurnClaim", "TurnDeduplicator"]
@@ -0,0 +1,251 @@
+"""Modo servidor multi-worker para el canal M365 (``python main.py serve --workers N``).
+
+Un proceso supervisor arranca N workers aiohttp que comparten el puerto público
+con ``SO_REUSEPORT`` (el kernel reparte las conexiones entre ellos), reinicia los
+que terminan de forma inesperada con *backoff* exponencial y, al recibir SIGTERM o
+SIGINT, detiene los workers de forma ordenada (cada worker ejecuta sus hooks de
+apagado, p. ej. drenar turnos en segundo plano).
+
+Con afinidad por conversación, cada worker escucha además en un puerto interno
+(127.0.0.1) y reenvía a su dueño las actividades cuya conversación no le
+corresponde (``crc32(conversation.id) % N``). Así las sesiones, cachés e hilos en
+memoria de una conversación viven siempre en el mismo worker.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+from app.core.runtime_env import get_env_float, get_env_int
+
+logger = logging.getLogger(__name__)
+
+STABLE_UPTIME_SECONDS = 60.0
+FORWARDED_HEADER = "X-Agent-Worker-Forwarded"
+# Cabeceras que se conservan al reenviar una actividad (la validación JWT la repite el worker dueño).
+FORWARDED_REQUEST_HEADERS = ("Authorization", "Content-Type")
+
+
+@dataclass(frozen=True)
+class WorkerSlot:
+    """Identidad de un worker dentro del pool."""
+
+    index: int
+    count: int
+    affinity: bool = False
+    internal_port_base: int = 4078
+
+    def internal_port(self, index: int) -> int:
+        return self.internal_port_base + index
+
+
+def conversation_worker(conversation_id: str, worker_count: int) -> int:
+    """Worker dueño de la conversación (hash estable entre procesos y reinicios)."""
+    return zlib.crc32(conversation_id.encode("utf-8")) % worker_count
+
+
+def bind_internal_socket(slot: WorkerSlot) -> socket.socket:
+    """Socket del puerto interno del worker, usado solo para reenvíos entre workers."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", slot.internal_port(slot.index)))
+    sock.listen(128)
+    sock.setblocking(False)
+    return sock
+
+
+class AffinityRouter:
+    """Middleware aiohttp que reenvía cada actividad al worker dueño de su conversación."""
+
+    def __init__(self, slot: WorkerSlot, *, timeout_seconds: float = 120.0) -> None:
+        self._slot = slot
+        self._timeout = ClientTimeout(total=timeout_seconds)
+        self._session: ClientSession | None = None
+        self.local = 0
+        self.forwarded = 0
+        self.forward_failures = 0
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        if request.method != "POST" or request.path != "/api/messages" or FORWARDED_HEADER in request.headers:
+            return await handler(request)
+
+        # aiohttp guarda el cuerpo leído: el handler local puede volver a leerlo.
+        body = await request.read()
+        try:
+            conversation_id = (json.loads(body).get("conversation") or {}).get("id")
+        except (ValueError, AttributeError):
+            conversation_id = None
+        if not conversation_id:
+            return await handler(request)
+
+        owner = conversation_worker(conversation_id, self._slot.count)
+        if owner == self._slot.index:
+            self.local += 1
+            return await handler(request)
+
+        try:
+            response = await self._forward(owner, request, body)
+            self.forwarded += 1
+            return response
+        except (ClientError, OSError) as e:
+            # El dueño puede estar reiniciándose: se atiende aquí antes que perder la actividad.
+            self.forward_failures += 1
+            logger.warning("[WORKERS] No se pudo reenviar al worker %s (%s); se atiende localmente.", owner, e)
+            return await handler(request)
+
+    async def _forward(self, owner: int, request: web.Request, body: bytes) -> web.Response:
+        if self._session is None:
+            self._session = ClientSession(timeout=self._timeout)
+        headers = {name: request.headers[name] for name in FORWARDED_REQUEST_HEADERS if name in request.headers}
+        headers[FORWARDED_HEADER] = str(self._slot.index)
+        url = f"http://127.0.0.1:{self._slot.internal_port(owner)}{request.path_qs}"
+        async with self._session.post(url, data=body, headers=headers) as upstream:
+            payload = await upstream.read()
+            return web.Response(
+                status=upstream.status,
+                body=payload,
+                content_type=upstream.content_type if payload else None,
+            )
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+def _run_worker(slot: WorkerSlot) -> None:
+    """Punto de entrada de cada proceso worker."""
+    # Import diferido: cada worker construye su propio adapter, agente y estado.
+    from main_m365 import run
+
+    run(worker=slot)
+
+
+class WorkerSupervisor:
+    """Arranca, vigila y detiene los procesos worker."""
+
+    def __init__(
+        self,
+        worker_count: int,
+        *,
+        affinity: bool = False,
+        internal_port_base: int = 4078,
+        grace_seconds: float = 30.0,
+        max_restart_backoff_seconds: float = 30.0,
+    ) -> None:
+        if worker_count < 1:
+            raise ValueError("El número de workers debe ser mayor que 0.")
+        self._slots = [WorkerSlot(i, worker_count, affinity, internal_port_base) for i in range(worker_count)]
+        self._grace_seconds = grace_seconds
+        self._max_backoff = max_restart_backoff_seconds
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: dict[int, multiprocessing.process.BaseProcess] = {}
+        self._restarts: dict[int, int] = {slot.index: 0 for slot in self._slots}
+        self._next_start: dict[int, float] = {}
+        self._started_at: dict[int, float] = {}
+        self._stopping = False
+
+    def run(self) -> None:
+        """Bloquea hasta recibir SIGTERM/SIGINT, reiniciando los workers que terminen."""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        for slot in self._slots:
+            self._start(slot)
+        try:
+            while not self._stopping:
+                self._supervise()
+                time.sleep(0.5)
+        finally:
+            self._shutdown()
+
+    def _start(self, slot: WorkerSlot) -> None:
+        process = self._context.Process(target=_run_worker, args=(slot,), name=f"agent-worker-{slot.index}")
+        process.start()
+        self._processes[slot.index] = process
+        self._started_at[slot.index] = time.monotonic()
+        logger.info("[WORKERS] Worker %s iniciado (pid %s).", slot.index, process.pid)
+
+    def _supervise(self) -> None:
+        now = time.monotonic()
+        for slot in self._slots:
+            process = self._processes.get(slot.index)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                # Reinicio con backoff exponencial acotado para no entrar en un bucle de caídas.
+                self._processes.pop(slot.index)
+                if now - self._started_at[slot.index] > STABLE_UPTIME_SECONDS:
+                    # Un worker que llevaba tiempo estable vuelve a empezar con el backoff mínimo.
+                    self._restarts[slot.index] = 0
+                self._restarts[slot.index] += 1
+                delay = min(self._max_backoff, 2 ** min(self._restarts[slot.index] - 1, 10))
+                self._next_start[slot.index] = now + delay
+                logger.warning(
+                    f"[WORKERS] Worker {slot.index} terminó (código {process.exitcode}); "
+                    f"reinicio en {delay:.0f} s."
+                )
+            elif now >= self._next_start.get(slot.index, 0.0):
+                self._start(slot)
+
+    def _request_stop(self, *_: Any) -> None:
+        self._stopping = True
+
+    def _shutdown(self) -> None:
+        logger.info("[WORKERS] Deteniendo workers...")
+        for process in self._processes.values():
+            if process.is_alive():
+                # SIGTERM: aiohttp cierra el servidor y ejecuta los hooks de apagado del worker.
+                process.terminate()
+        deadline = time.monotonic() + self._grace_seconds
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("[WORKERS] %s no terminó a tiempo; se fuerza la parada.", process.name)
+                process.kill()
+                process.join()
+        logger.info("[WORKERS] Todos los workers detenidos.")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": len(self._slots),
+            "alive": sum(1 for process in self._processes.values() if process.is_alive()),
+            "restarts": dict(self._restarts),
+        }
+
+
+def serve(worker_count: int, *, affinity: bool = False) -> None:
+    """Arranca el canal M365 con ``worker_count`` procesos (1 = proceso único, sin supervisor)."""
+    if worker_count > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        logger.warning("[WORKERS] SO_REUSEPORT no está disponible en esta plataforma; se usa un único worker.")
+        worker_count = 1
+    if worker_count == 1:
+        from main_m365 import run
+
+        run()
+        return
+    if not affinity and not os.getenv("STATE_STORE_URL"):
+        logger.warning(
+            "[WORKERS] Varios workers sin afinidad ni STATE_STORE_URL: el historial de una conversación "
+            "puede repartirse entre procesos. Usa --affinity o configura un almacén de estado."
+        )
+    port = int(os.getenv("PORT", "3978"))
+    WorkerSupervisor(
+        worker_count,
+        affinity=affinity,
+        internal_port_base=get_env_int("WORKER_INTERNAL_PORT_BASE", port + 100),
+        grace_seconds=get_env_float("WORKER_SHUTDOWN_GRACE_SECONDS", 30.0),
+    ).run()
+
+
+__all__ = ["WorkerSlot", "WorkerSupervisor", "AffinityRouter", "conversation_worker", "serve"]
@@ -1,6 +1,27 @@
-"""Core module - Agent interfaces and implementations."""
+"""Core module - Agent interfaces and implementations.
+
+``SimpleChatAgent`` y ``ChatService`` se importan bajo demanda: cargarlos arrastra
+agent_framework y los SDK de Azure, y los procesos que solo necesitan utilidades
+ligeras de ``app.core`` (p. ej. el supervisor de ``main.py serve``) no deben pagarlo.
+"""
+from importlib import import_module
+from typing import Any
+
 from app.core.interfaces import AgentInterface, check_agent_interface
-from app.core.agent import SimpleChatAgent
-from app.core.agent_viewer import ChatService
+
+_LAZY_EXPORTS = {
+    "SimpleChatAgent": "app.core.agent",
+    "ChatService": "app.core.agent_viewer",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = ["AgentInterface", "check_agent_interface", "SimpleChatAgent", "ChatService"]
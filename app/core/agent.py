@@ -1,18 +1,39 @@
+import asyncio
+import hashlib
 import logging
 import os
+import time
 from pathlib import Path
+from typing import Any, AsyncIterator, Callable
 
+from app.core.agent_definitions import AgentDefinitionRegistry, VersionedAzureAIClient
+from app.core.credentials import CredentialProvider, get_credential_provider
 from app.core.interfaces import AgentInterface
 from app.core.runtime_env import is_cloud_runtime, load_local_env_if_needed
-from app.core.tools import get_weather_by_city, web_search_tool, route_tools_for_message
-
-from azure.identity import DefaultAzureCredential
+from app.core.history import HistoryCompactor
+from app.core.intents import IntentEngine
+from app.core.logging_config import HOT_PATH, lazy
+from app.core.model_router import DEFAULT_TIER, FAST_TIER, ModelRouter, is_throttling_error
+from app.core.resilience import CircuitOpenError, ResiliencePolicy
+from app.core.response_cache import ResponseCache
+from app.core.sessions import DEFAULT_CONVERSATION_ID, ConversationSession, SessionManager
+from app.core.state_store import StateStore
+from app.core.telemetry import record_approval, record_usage, stage
+from app.core.transport import HttpTransport
+from app.core.turn_report import note_turn
+from app.core.search_cache import WebSearchCache, extract_web_citations, format_search_results
+from app.core.tools import (
+    TOOL_CATALOG,
+    WEB_SEARCH_USER_LOCATION,
+    route_expects_web_search,
+    route_tools_for_message,
+    web_search_tool,
+)
 
 from agent_framework_azure_ai import AzureAIClient
-from agent_framework import ChatAgent, AgentThread, ChatMessage, Content
+from agent_framework import ChatAgent, AgentThread, AgentResponse, AgentResponseUpdate, ChatMessage
 
-# Configuración del logger a nivel INFO para mostrar mensajes informativos durante la ejecución del agente.
-logging.basicConfig(level=logging.INFO)
+# El nivel, el formato y los handlers los fija cada punto de entrada con configure_logging().
 logger = logging.getLogger(__name__)
 
 TOOL_LIMIT_HINTS = (
@@ -22,35 +43,27 @@ TOOL_LIMIT_HINTS = (
     "too many invocations",
 )
 
+# Ámbito del token de Entra ID que usa el cliente de Foundry (se pide por adelantado al precalentar).
+FOUNDRY_TOKEN_SCOPE = "https://ai.azure.com/.default"
+
 APPROVAL_YES = {"si", "yes", "approve", "ok", "vale", "confirm"}
 APPROVAL_NO = {"no", "cancel", "cancelar", "rechazar"}
 
+# Plantilla con la que se entregan al agente resultados de web search reutilizados de la caché.
+CACHED_SEARCH_TEMPLATE = (
+    "{message}\n\n"
+    "[Resultados recientes de búsqueda web para esta consulta; úsalos como fuente en lugar de volver a buscar]\n"
+    "{results}"
+)
+
 # Configurar httpx para no mostrar logs (propagate=False evita que los mensajes suban al logger raíz)
 logging.getLogger("httpx").propagate = False
 
 ENV_FILE = load_local_env_if_needed(Path(__file__).resolve())
 
 
-def _get_azure_credential():
-    """Devuelve la credencial Azure apropiada para el entorno actual.
-    
-    - En cloud: usa DefaultAzureCredential (Managed Identity preferida)
-    - En local: usa DefaultAzureCredential que intentará Azure CLI, VS Code, etc.
-    """
-    if is_cloud_runtime():
-        return DefaultAzureCredential(exclude_interactive_browser_credential=True)
-    else:
-        # En local, DefaultAzureCredential probará múltiples métodos:
-        # 1. Environment variables
-        # 2. Workload Identity
-        # 3. Managed Identity
-        # 4. Azure CLI
-        # 5. Azure PowerShell
-        # 6. Visual Studio Code
-        return DefaultAzureCredential(
-            exclude_interactive_browser_credential=True,
-            exclude_shared_token_cache_credential=True,
-        )
+def _tool_names(tools: list[object]) -> list[str]:
+    return [t.name if hasattr(t, "name") else type(t).__name__ for t in tools]
 
 
 class SimpleChatAgent(AgentInterface):
@@ -70,14 +83,43 @@ class SimpleChatAgent(AgentInterface):
     " Siempre proporciona contexto de dónde proviene la información."
     )
 
-    def __init__(self) -> None:
-        """Constructor del agente, no requiere parámetros de inicialización."""
+    def __init__(
+        self,
+        transport: HttpTransport | None = None,
+        chat_client_factory: Callable[[str, str], Any] | None = None,
+    ) -> None:
+        """Constructor del agente; ``transport`` permite compartir los pools HTTP salientes con otros componentes.
+
+        ``chat_client_factory(tier, deployment)`` sustituye a los clientes de Foundry (p. ej. por el
+        backend simulado de ``benchmarks``); en ese caso no se necesitan endpoint ni credenciales.
+        """
         
+        self._chat_client_factory = chat_client_factory
+        # Pools de conexiones salientes hacia Foundry; se cierran en cleanup.
+        self.transport = transport or HttpTransport.from_env()
+        # Versiones del agente en Foundry por huella de definición (se reutilizan entre reinicios y réplicas).
+        self.definitions = AgentDefinitionRegistry()
         # Definición de las variables de instancia para el cliente de chat y el agente, se inicializan como None y se configuran en el método initialize
+        self.credential: CredentialProvider | None = None
         self.chat_client: AzureAIClient | None = None
         self.agent: ChatAgent | None = None
-        self.agent_thread: AgentThread | None = None
-        self._pending_approval: Content | None = None
+        # Un cliente y un agente por tier de modelo (``default`` y, opcionalmente, ``fast``);
+        # chat_client/agent apuntan siempre al tier ``default``.
+        self.chat_clients: dict[str, AzureAIClient] = {}
+        self.agents: dict[str, ChatAgent] = {}
+        # Agente con sus propias instrucciones y sin tools para resumir el historial.
+        self.summarizer: ChatAgent | None = None
+        self.model_router: ModelRouter | None = None
+        self.resilience: ResiliencePolicy | None = None
+        # El estado conversacional (hilo + aprobación pendiente) vive en una sesión por conversation_id,
+        # de modo que cada chat de Teams/Copilot tiene su propio historial.
+        self.sessions: SessionManager | None = None
+        self.state_store: StateStore | None = None
+        self.search_cache: WebSearchCache | None = None
+        self.response_cache: ResponseCache | None = None
+        self.intents: IntentEngine | None = None
+        self.history: HistoryCompactor | None = None
+        self.deployment_name: str | None = None
 
         # No se llama a initialize en el constructor, ya que es un método asíncrono y no se pueden llamar métodos asíncronos desde el constructor.
         # En vez de ello, llamar a initialize desde el código que instancia el agente,
@@ -96,107 +138,403 @@ class SimpleChatAgent(AgentInterface):
         endpoint_api = os.getenv("ENDPOINT_API")
         deployment   = os.getenv("DEPLOYMENT_NAME")
         project_name = os.getenv("PROJECT_NAME")
+        self.deployment_name = deployment
+
+        if self._chat_client_factory is not None:
+            if not deployment:
+                raise ValueError("Falta la variable de entorno necesaria: DEPLOYMENT_NAME")
+            self.model_router = ModelRouter.from_env(deployment)
+            self.resilience = ResiliencePolicy.from_env()
+            self.chat_clients = {
+                tier: self._chat_client_factory(tier, tier_deployment)
+                for tier, tier_deployment in self.model_router.deployments.items()
+            }
+            self.chat_client = self.chat_clients[DEFAULT_TIER]
+            logger.info(
+                "[OK] Clientes de chat externos creados para los deployments %s.", self.model_router.deployments
+            )
+            return
 
         # Comprobación de que todas las variables necesarias están presentes, si falta alguna se lanza una excepción
         if not all([endpoint_api, deployment]):
             logger.error("Faltan variables obligatorias: ENDPOINT_API o DEPLOYMENT_NAME")
             raise ValueError("Falta alguna de las variables de entorno necesarias: ENDPOINT_API, DEPLOYMENT_NAME")
         
-        credential = _get_azure_credential()
+        # Una sola cadena de credenciales por proceso; los tokens se cachean y se renuevan en segundo plano.
+        credential = get_credential_provider()
+        self.credential = credential
         env_type = "cloud" if is_cloud_runtime() else "local"
-        logger.info(f"Usando autenticación Entra ID ({env_type}) con DefaultAzureCredential.")
+        logger.info("Usando autenticación Entra ID (%s) con DefaultAzureCredential compartida.", env_type)
         
-        # Creación del cliente de chat Azure AI con soporte para web search y herramientas avanzadas
-        self.chat_client = AzureAIClient(
-            project_endpoint=endpoint_api,
-            model_deployment_name=deployment,
-            credential=credential,
+        # Creación de un cliente de chat Azure AI por deployment (tier) configurado
+        self.model_router = ModelRouter.from_env(deployment)
+        # Reintentos con backoff y circuit breaker por deployment alrededor de cada llamada al LLM.
+        self.resilience = ResiliencePolicy.from_env()
+        self.chat_clients = {
+            tier: VersionedAzureAIClient(
+                project_endpoint=endpoint_api,
+                model_deployment_name=tier_deployment,
+                credential=credential,
+                transport=self.transport,
+                registry=self.definitions,
+            )
+            for tier, tier_deployment in self.model_router.deployments.items()
+        }
+        self.chat_client = self.chat_clients[DEFAULT_TIER]
+        logger.info(
+            "[OK] Clientes Azure AI creados exitosamente para los deployments %s.", self.model_router.deployments
         )
-        logger.info("[OK] Cliente Azure AI creado exitosamente con soporte para web search.")
     
     def _create_agent(self) -> None:
         """Asigna el cliente de chat creado al agente para que pueda interactuar con el entorno."""
-        logger.debug(f"Creando agente con prompt: {self.AGENT_PROMPT[:50]}...")
-        self.agent = ChatAgent(
-            chat_client=self.chat_client,
-            name="SimpleChatAgent",
-            instructions=self.AGENT_PROMPT,
-            tools=[get_weather_by_city, web_search_tool],
+        logger.debug("Creando agente con prompt: %s...", self.AGENT_PROMPT[:50])
+        # Cada tier es un agente distinto en Foundry (el nombre identifica al agente en el servicio).
+        # Los agentes no llevan tools por defecto: ``run`` suma las tools de cada llamada a las del
+        # agente, así que cada turno pasa exactamente las que eligió el router (o ninguna búsqueda
+        # si la caché de web search acertó).
+        self.agents = {
+            tier: ChatAgent(
+                chat_client=client,
+                name="SimpleChatAgent" if tier == DEFAULT_TIER else f"SimpleChatAgent-{tier}",
+                instructions=self.AGENT_PROMPT,
             )
+            for tier, client in self.chat_clients.items()
+        }
+        self.agent = self.agents[DEFAULT_TIER]
+        self.summarizer = ChatAgent(
+            chat_client=self.chat_clients.get(FAST_TIER, self.chat_client),
+            name="SimpleChatAgent-summarizer",
+            instructions="Resumes conversaciones de forma fiel y concisa, sin añadir información.",
+        )
         logger.info("[OK] Agente creado con web search habilitado.")
 
-    def _initialize_agent_thread(self) -> None:
-        """Crea un hilo para ejecutar el agente de manera asíncrona, permitiendo que el agente procese mensajes sin bloquear la ejecución principal."""
+    def _create_agent_thread(self) -> AgentThread:
+        """Crea un hilo nuevo del agente; cada conversación recibe el suyo a través del gestor de sesiones."""
         if not self.agent:
             logger.error("No se puede crear el hilo del agente porque el agente no ha sido inicializado.")
             raise ValueError("El agente debe ser inicializado antes de crear el hilo.")
-        
+
         logger.debug("Creando AgentThread...")
-        self.agent_thread = self.agent.get_new_thread()
-        logger.info("[OK] Hilo del agente iniciado exitosamente.")
+        return self.agent.get_new_thread()
+
+    def _initialize_sessions(self) -> None:
+        """Crea el gestor de sesiones por conversación con los límites configurados.
+
+        Si ``STATE_STORE_URL`` está definida, las sesiones se persisten y se comparten entre workers.
+        """
+        self.state_store = StateStore.from_env()
+        self.sessions = SessionManager.from_env(
+            self._create_agent_thread, store=self.state_store, thread_loader=self.agent.deserialize_thread
+        )
+        logger.info("[OK] Gestor de sesiones por conversación iniciado.")
 
     async def initialize(self) -> None:
         """Inicializa el agente cargando las variables de entorno necesarias."""
         if ENV_FILE:
-            logger.debug(f"Cargando .env desde {ENV_FILE}")
+            logger.debug("Cargando .env desde %s", ENV_FILE)
         self._create_chat_client()
         self._create_agent()
-        self._initialize_agent_thread()
+        self._initialize_sessions()
+        self.search_cache = WebSearchCache.from_env()
+        self.response_cache = ResponseCache.from_env()
+        self.intents = IntentEngine.from_env()
+        self.history = HistoryCompactor.from_env(self._summarize_history)
         logger.info("[OK] Agente inicializado y listo para interactuar.")
 
-    async def process_user_message(self, message: str) -> str:
-        """Procesa el mensaje del usuario y devuelve una respuesta predefinida."""
+    async def warm_up(self) -> None:
+        """Pide el token de Entra ID y abre la conexión HTTPS con Foundry antes del primer turno.
 
-        logger.debug(f"Procesando mensaje: '{message}'")
-        
-        # Respuestas simples basadas en palabras clave en el mensaje del usuario
-        if message.lower() in ["exit", "salir", "quit", "adios"]:
+        Lanza la excepción original si falla, para que quien llama pueda reintentar.
+        """
+        if not self.chat_clients:
+            raise ValueError("El agente debe ser inicializado antes de precalentarlo.")
+        if self.credential is None:
+            # Clientes externos (chat_client_factory): no hay credencial ni conexión que precalentar.
+            return
+        # Deja el token en la caché del proveedor, que a partir de aquí lo renueva antes de caducar.
+        await self.credential.get_token(FOUNDRY_TOKEN_SCOPE)
+        for tier, client in self.chat_clients.items():
+            # Una petición ligera deja abierta (y autenticada) la conexión del pool de cada cliente.
+            async for _ in client.project_client.agents.list(limit=1):
+                break
+            logger.debug("Conexión con Foundry precalentada para el tier '%s'.", tier)
+
+    async def _summarize_history(self, prompt: str) -> str:
+        """Resume turnos antiguos con el tier más barato, en un hilo desechable y sin tools."""
+        response = await self.summarizer.run(prompt, thread=self.summarizer.get_new_thread())
+        return response.text
+
+    async def _prepare_history(self, session: ConversationSession, run_args: dict[str, Any]) -> None:
+        """Compacta el hilo si supera el presupuesto de tokens y siembra el hilo nuevo en el turno.
+
+        Las respuestas a aprobaciones pendientes (mensajes que no son texto) deben llegar al
+        mismo hilo, así que nunca se compacta en ese caso.
+        """
+        if self.history is None or not isinstance(run_args.get("messages"), str):
+            return
+        if self.history.needs_compaction(session):
+            keep_turns = self.history.window_size(session)
+            synopsis = await self.history.summarize(session)
+            self.sessions.rebase(session, self._create_agent_thread(), synopsis, keep_turns)
+        if session.seed_pending:
+            run_args["messages"] = self.history.seed_messages(session, run_args["messages"])
+
+    @property
+    def prompt_version(self) -> str:
+        """Huella corta del prompt; cambia cuando cambian las instrucciones del agente."""
+        return hashlib.sha256(self.AGENT_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+    def _response_cache_scope(self) -> str:
+        return f"{self.deployment_name}:{self.prompt_version}"
+
+    def _resolve_turn(
+        self, message: str, conversation_id: str, stateless: bool = False, *, use_response_cache: bool = True
+    ) -> tuple[ConversationSession, str | None, dict[str, Any]]:
+        """Decide cómo atender el turno.
+
+        Devuelve la sesión, una respuesta local (si el mensaje se resuelve sin LLM o desde caché) o,
+        en su defecto, los argumentos de la llamada al agente (``messages`` y ``tools``).
+        Con ``stateless`` el turno usa un hilo desechable y no toca el historial de la conversación.
+        Con ``use_response_cache=False`` el turno ni se sirve desde la caché de respuestas ni la alimenta.
+        """
+        if stateless:
+            session = ConversationSession(conversation_id=conversation_id, thread=self._create_agent_thread())
+        else:
+            session = self.sessions.get(conversation_id)
+        run_args: dict[str, Any] = {}
+        response: str | None = None
+
+        # Intents locales (comandos, saludos, ayuda, FAQs) definidos en intents.json: se responden sin LLM.
+        intent_match = self.intents.match(message)
+        intent = intent_match.intent if intent_match is not None else None
+
+        if intent is not None and intent.action == "exit":
             logger.debug("Comando de salida detectado.")
-            response = "¡Adiós! Que tengas un buen día."
-        elif self._pending_approval is not None:
+            response = intent.response
+        elif session.pending_approval is not None:
             normalized = message.strip().lower()
             if normalized in APPROVAL_YES:
                 logger.debug("Aprobacion recibida para tool pendiente.")
-                approval_response = self._pending_approval.to_function_approval_response(approved=True)
-                self._pending_approval = None
-                approval_message = ChatMessage(role="user", contents=[approval_response])
-                response = await self.agent.run([approval_message], thread=self.agent_thread)
+                self._record_approval(session, approved=True)
+                approval_response = session.pending_approval.to_function_approval_response(approved=True)
+                # La continuación va al mismo deployment, con las mismas tools, que emitió la solicitud
+                # de aprobación (la tool aprobada tiene que estar entre ellas para poder ejecutarse).
+                tier = session.pending_approval_tier or DEFAULT_TIER
+                tools = [TOOL_CATALOG[name] for name in session.pending_approval_tools if name in TOOL_CATALOG]
+                session.pending_approval = None
+                session.pending_approval_tier = None
+                session.pending_approval_tools = []
+                session.dirty = True
+                run_args = {
+                    "messages": [ChatMessage(role="user", contents=[approval_response])],
+                    "tools": tools or list(TOOL_CATALOG.values()),
+                    "tiers": [tier],
+                }
             elif normalized in APPROVAL_NO:
                 logger.debug("Aprobacion rechazada para tool pendiente.")
-                self._pending_approval = None
+                self._record_approval(session, approved=False)
+                session.pending_approval = None
+                session.pending_approval_tier = None
+                session.pending_approval_tools = []
+                session.dirty = True
                 response = "Entendido, no ejecutare la herramienta."
             else:
                 response = "Necesito una confirmacion: responde 'si' para aprobar o 'no' para cancelar."
-        elif message.lower() in ["clear", "limpiar"]:
+        elif intent is not None and intent.action == "clear":
             logger.debug("Comando de limpieza detectado, reiniciando hilo.")
             # Reinicia el hilo del agente para limpiar el historial de conversación y comenzar un nuevo chat
-            self._initialize_agent_thread()
-            response = "Historial limpiado. Nuevo chat iniciado."
-        elif "hola" in message.lower():
-            logger.debug("Saludo detectado, respondiendo con respuesta predefinida.")
-            response = "¡Hola! ¿En qué puedo ayudarte hoy?"
+            session = self.sessions.reset(conversation_id)
+            response = intent.response
+        elif intent is not None:
+            logger.debug(
+                "Intent local '%s' (%s, score=%.2f).", intent.name, intent_match.method, intent_match.score
+            )
+            response = intent.response
         else:
-            # Para cualquier otro mensaje, se envía el mensaje al agente para que genere una respuesta 
+            # Solo las preguntas sin historial (primer turno o stateless) usan las cachés de respuestas y de
+            # búsquedas: a mitad de conversación el mismo texto depende del contexto previo.
+            without_history = stateless or session.turn_count == 0
+            cacheable = self.response_cache is not None and use_response_cache and without_history
+            if cacheable:
+                cached_response = self.response_cache.get(message, self._response_cache_scope())
+                if cached_response is not None:
+                    logger.info("[RESPONSE_CACHE] Acierto: respuesta servida sin llamar a agent.run().", extra=HOT_PATH)
+                    note_turn(source="response_cache")
+                    return session, cached_response, run_args
+
+            # Para cualquier otro mensaje, se envía el mensaje al agente para que genere una respuesta
             # utilizando el LLM configurado.
-            try:
-                logger.debug(f"Enviando mensaje al agente: {message}")
-                tools_for_call = route_tools_for_message(message)
-                logger.info(f"[TOOLS_CALL] Pasadas a agent.run(): {[t.name if hasattr(t, 'name') else type(t).__name__ for t in tools_for_call]}")
-                response = await self.agent.run(message, thread=self.agent_thread, tools=tools_for_call)
-                logger.debug("Respuesta generada por el agente.")
-            except Exception as e:
-                logger.error(f"Error al procesar el mensaje: {e}", exc_info=True)
-                error_text = str(e).lower()
-                if any(hint in error_text for hint in TOOL_LIMIT_HINTS):
-                    response = (
-                        "Se alcanzó el límite de uso de una herramienta en esta conversación. "
-                        "Puedes escribir 'clear' para reiniciar el chat e intentarlo de nuevo."
+            logger.debug("Enviando mensaje al agente: %s", message)
+            tools_for_call = route_tools_for_message(message)
+            # El deployment se elige con las tools del router (antes de descartar web_search por la caché).
+            tiers = self.model_router.candidates(message, tools_for_call)
+            run_args = {
+                "messages": message,
+                "tools": tools_for_call,
+                "cacheable": cacheable,
+                "tiers": tiers,
+                "stateless": stateless,
+            }
+            if self.search_cache is not None and without_history and web_search_tool in tools_for_call:
+                cached_results = self.search_cache.get(message, WEB_SEARCH_USER_LOCATION)
+                if cached_results is not None:
+                    # Acierto de caché: se evita la búsqueda externa y se pasan los resultados como contexto.
+                    logger.info(
+                        "[SEARCH_CACHE] Acierto: se reutilizan resultados recientes de web search.", extra=HOT_PATH
                     )
+                    tools_for_call = [t for t in tools_for_call if t is not web_search_tool]
+                    run_args = {
+                        "messages": CACHED_SEARCH_TEMPLATE.format(message=message, results=cached_results),
+                        "tools": tools_for_call,
+                        "cacheable": cacheable,
+                        "tiers": tiers,
+                        "stateless": stateless,
+                    }
                 else:
-                    response = "Lo siento, ocurrió un error al procesar tu mensaje."
+                    run_args["search_query"] = message
+            logger.info("[TOOLS_CALL] Pasadas a agent.run(): %s", lazy(_tool_names, tools_for_call), extra=HOT_PATH)
+            logger.info(
+                "[MODEL] Tier elegido: %s (%s)", tiers[0], self.model_router.deployments[tiers[0]], extra=HOT_PATH
+            )
+
+        return session, response, run_args
+
+    @staticmethod
+    def _record_approval(session: ConversationSession, approved: bool) -> None:
+        if session.approval_requested_at is not None:
+            record_approval(max(time.time() - session.approval_requested_at, 0.0), approved)
+            session.approval_requested_at = None
+
+    def expects_slow_turn(self, message: str, conversation_id: str = DEFAULT_CONVERSATION_ID) -> bool:
+        """Indica si el turno irá al LLM con web_search habilitado (candidato a entrega en segundo plano).
+
+        Los comandos locales y las respuestas a una aprobación pendiente se consideran rápidos.
+        """
+        if self.intents.match(message, record=False) is not None:
+            return False
+        if conversation_id in self.sessions and self.sessions.get(conversation_id).pending_approval is not None:
+            return False
+        return route_expects_web_search(message)
+
+    def _fallback_tier(self, tier: str, error: Exception, tiers: list[str], attempt: int, latency: float) -> bool:
+        """Registra un fallo del deployment y decide si el turno se reintenta en el siguiente tier.
+
+        Se cambia de tier ante *throttling* o si el circuito del deployment está abierto.
+        """
+        short_circuited = isinstance(error, CircuitOpenError)
+        throttled = is_throttling_error(error)
+        if not short_circuited:
+            self.model_router.record(tier, latency, ok=False, throttled=throttled)
+        if (throttled or short_circuited) and attempt + 1 < len(tiers):
+            reason = "Circuito abierto" if short_circuited else "Throttling"
+            logger.warning("[MODEL] %s en el tier '%s'; se reintenta con '%s'.", reason, tier, tiers[attempt + 1])
+            self.model_router.record_fallback(tier)
+            return True
+        return False
+
+    async def _run_agent(self, session: ConversationSession, run_args: dict[str, Any]) -> AgentResponse:
+        """Ejecuta el turno en el tier elegido con reintentos, pasando al siguiente tier ante 429 o circuito abierto.
 
-        logger.debug(f"Usuario: {message}")
+        Los 429 se reintentan en el mismo deployment solo en el último tier. Los turnos ``stateless``
+        usan un hilo desechable por intento, así que admiten peticiones *hedged*.
+        """
+        tiers = run_args.get("tiers") or [DEFAULT_TIER]
+        clock = self.model_router.clock
+        hedge = bool(run_args.get("stateless"))
+        for attempt, tier in enumerate(tiers):
+            agent = self.agents[tier]
+
+            labels = {"tier": tier, "deployment": self.model_router.deployments[tier]}
+
+            async def run_once() -> AgentResponse:
+                thread = agent.get_new_thread() if hedge else session.thread
+                with stage("agent_run", labels, hedged=hedge) as span:
+                    response = await agent.run(run_args["messages"], thread=thread, tools=run_args["tools"])
+                    record_usage(span, response.usage_details, labels)
+                return response
+
+            start = clock()
+            try:
+                response = await self.resilience.call(
+                    self.model_router.deployments[tier],
+                    run_once,
+                    hedge=hedge,
+                    retry_throttled=attempt + 1 == len(tiers),
+                )
+            except Exception as e:
+                if self._fallback_tier(tier, e, tiers, attempt, clock() - start):
+                    continue
+                raise
+            self.model_router.record(tier, clock() - start)
+            note_turn(tier=tier, deployment=labels["deployment"])
+            run_args["served_tier"] = tier
+            return response
+        raise RuntimeError("No hay deployments disponibles para atender el turno.")
+
+    @staticmethod
+    def _error_reply(error: Exception) -> str:
+        """Traduce una excepción de ``agent.run`` en un mensaje para el usuario."""
+        logger.error("Error al procesar el mensaje: %s", error, exc_info=True)
+        note_turn(source="error", error=f"{type(error).__name__}: {error}")
+        error_text = str(error).lower()
+        if isinstance(error, CircuitOpenError) or is_throttling_error(error):
+            return "El servicio está muy solicitado en este momento; inténtalo de nuevo en unos segundos."
+        if any(hint in error_text for hint in TOOL_LIMIT_HINTS):
+            return (
+                "Se alcanzó el límite de uso de una herramienta en esta conversación. "
+                "Puedes escribir 'clear' para reiniciar el chat e intentarlo de nuevo."
+            )
+        return "Lo siento, ocurrió un error al procesar tu mensaje."
+
+    @staticmethod
+    def _note_agent_turn(response: AgentResponse, run_args: dict[str, Any], citations: list[dict[str, str]]) -> None:
+        """Anota en el ``TurnReport`` activo las tools ofrecidas y usadas y los tokens del turno."""
+        tools_called = [
+            content.name
+            for message in response.messages
+            for content in message.contents
+            if getattr(content, "type", None) == "function_call" and getattr(content, "name", None)
+        ]
+        # web_search es una tool alojada: no aparece como function_call, sino en las fuentes citadas.
+        if citations:
+            tools_called.append(web_search_tool.name)
+        usage = response.usage_details or {}
+        note_turn(
+            source="agent",
+            tools_offered=_tool_names(run_args.get("tools") or []),
+            tools_called=list(dict.fromkeys(tools_called)),
+            usage={key: value for key, value in usage.items() if isinstance(value, int)},
+        )
+
+    def _complete_turn(
+        self,
+        session: ConversationSession,
+        message: str,
+        response: object,
+        run_args: dict[str, Any],
+    ) -> str:
+        """Extrae el texto de la respuesta, registra aprobaciones pendientes y contabiliza el turno.
+
+        ``run_args`` vacío indica que el turno se resolvió sin llamar al agente. Solo los turnos que
+        el agente respondió cuentan en el historial: los mensajes de error o de servicio saturado no
+        llegan al hilo y no deben gastar el primer turno ni acabar en el resumen. Si el turno buscó
+        en internet y la respuesta trae fuentes citadas, el resultado se guarda en la caché de
+        web search; si era una pregunta sin historial, en la caché de respuestas.
+        """
+        logger.debug("Usuario: %s", message)
         response_text = response.text if hasattr(response, 'text') else str(response)
+        # Solo se cachean respuestas reales del agente (no mensajes de error, que son str).
+        is_agent_response = hasattr(response, "messages")
+        search_query = run_args.get("search_query")
+        citations = extract_web_citations(response) if is_agent_response else []
+        if is_agent_response:
+            self._note_agent_turn(response, run_args, citations)
+        if search_query and response_text and is_agent_response and self.search_cache is not None:
+            if citations:
+                self.search_cache.put(search_query, WEB_SEARCH_USER_LOCATION, format_search_results(citations))
+        if is_agent_response:
+            # El hilo (nuevo tras una compactación) ya recibió la sinopsis y la ventana reciente.
+            session.seed_pending = False
         if not response_text and hasattr(response, "messages"):
             pending_request = None
             for msg in response.messages:
@@ -207,18 +545,172 @@ class SimpleChatAgent(AgentInterface):
                 if pending_request is not None:
                     break
             if pending_request is not None:
-                self._pending_approval = pending_request
+                session.pending_approval = pending_request
+                session.pending_approval_tier = run_args.get("served_tier")
+                session.pending_approval_tools = _tool_names(run_args.get("tools") or [])
+                session.approval_requested_at = time.time()
+                session.dirty = True
                 tool_name = pending_request.function_call.name if hasattr(pending_request, "function_call") else None
                 response_text = (
                     f"Necesito tu aprobacion para ejecutar la herramienta"
                     f"{f' {tool_name}' if tool_name else ''}. Responde 'si' para aprobar o 'no' para cancelar."
                 )
-        logger.debug(f"Asistente: {response_text}")
+        elif run_args.get("cacheable") and response_text and is_agent_response:
+            # Las respuestas que piden aprobación de una tool nunca llegan aquí (texto vacío), así que
+            # la caché no interfiere con el flujo de aprobaciones.
+            self.response_cache.put(message, self._response_cache_scope(), response_text)
+        logger.debug("Asistente: %s", response_text)
+        self.sessions.record_turn(session, message, response_text, in_thread=bool(run_args) and is_agent_response)
+        return response_text
+
+    async def process_user_message(
+        self,
+        message: str,
+        conversation_id: str = DEFAULT_CONVERSATION_ID,
+        stateless: bool = False,
+        *,
+        use_response_cache: bool = True,
+    ) -> str:
+        """Procesa el mensaje del usuario dentro de su conversación y devuelve la respuesta.
 
+        Con ``stateless=True`` el mensaje se atiende en un hilo aislado, sin historial.
+        Con ``use_response_cache=False`` la respuesta siempre sale del agente.
+        """
+
+        logger.debug("Procesando mensaje: '%s'", message)
+        if not stateless:
+            await self.sessions.hydrate(conversation_id)
+        session, response, run_args = self._resolve_turn(
+            message, conversation_id, stateless, use_response_cache=use_response_cache
+        )
+        # Mientras dure el turno la sesión no se expulsa de memoria: si no, su resultado no se persistiría.
+        self.sessions.begin_turn(session)
+        try:
+            if response is None:
+                try:
+                    await self._prepare_history(session, run_args)
+                    response = await self._run_agent(session, run_args)
+                    logger.debug("Respuesta generada por el agente.")
+                except Exception as e:
+                    response = self._error_reply(e)
+
+            response_text = self._complete_turn(session, message, response, run_args)
+            await self.sessions.persist(session)
+        finally:
+            self.sessions.end_turn(session)
         return response_text
 
+    async def process_user_message_stream(
+        self, message: str, conversation_id: str = DEFAULT_CONVERSATION_ID, stateless: bool = False
+    ) -> AsyncIterator[str]:
+        """Procesa el mensaje del usuario y va entregando el texto a medida que el LLM lo genera.
+
+        Las respuestas locales (comandos, saludos, aprobaciones) se entregan en un único fragmento.
+        """
+
+        logger.debug("Procesando mensaje en streaming: '%s'", message)
+        if not stateless:
+            await self.sessions.hydrate(conversation_id)
+        session, response, run_args = self._resolve_turn(message, conversation_id, stateless)
+        self.sessions.begin_turn(session)
+        try:
+            async for chunk in self._stream_turn(session, message, response, run_args):
+                yield chunk
+        finally:
+            self.sessions.end_turn(session)
+
+    async def _stream_turn(
+        self, session: ConversationSession, message: str, response: str | None, run_args: dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Cuerpo de ``process_user_message_stream`` una vez resuelto el turno."""
+        if response is not None:
+            response_text = self._complete_turn(session, message, response, run_args)
+            await self.sessions.persist(session)
+            yield response_text
+            return
+
+        streamed = False
+        try:
+            await self._prepare_history(session, run_args)
+        except Exception as e:
+            response_text = self._complete_turn(session, message, self._error_reply(e), run_args)
+            await self.sessions.persist(session)
+            yield response_text
+            return
+        tiers = run_args.get("tiers") or [DEFAULT_TIER]
+        clock = self.model_router.clock
+        response: object | None = None
+        for attempt, tier in enumerate(tiers):
+            deployment = self.model_router.deployments[tier]
+            labels = {"tier": tier, "deployment": deployment}
+            retry = 0
+            while response is None:
+                updates: list[AgentResponseUpdate] = []
+                start = clock()
+                try:
+                    self.resilience.before_call(deployment)
+                    # El span no se activa: el generador cede el control en cada fragmento.
+                    with stage("agent_run", labels, activate=False, streaming=True) as span:
+                        async for update in self.agents[tier].run_stream(
+                            run_args["messages"], thread=session.thread, tools=run_args["tools"]
+                        ):
+                            updates.append(update)
+                            if update.text:
+                                if not streamed:
+                                    span.add_event("first_token")
+                                streamed = True
+                                yield update.text
+                        response = AgentResponse.from_agent_run_response_updates(updates)
+                        record_usage(span, response.usage_details, labels)
+                    self.resilience.record_success(deployment)
+                    self.model_router.record(tier, clock() - start)
+                    note_turn(tier=tier, deployment=deployment)
+                    run_args["served_tier"] = tier
+                    logger.debug("Respuesta generada por el agente en streaming.")
+                except Exception as e:
+                    # Solo se reintenta o se cambia de deployment si todavía no se ha entregado texto al usuario.
+                    if streamed:
+                        self.resilience.record_failure(deployment, e)
+                        self.model_router.record(tier, clock() - start, ok=False, throttled=is_throttling_error(e))
+                    else:
+                        delay = self.resilience.retry_delay(
+                            deployment, e, retry, retry_throttled=attempt + 1 == len(tiers)
+                        )
+                        if delay is not None:
+                            self.model_router.record(tier, clock() - start, ok=False, throttled=is_throttling_error(e))
+                            retry += 1
+                            await asyncio.sleep(delay)
+                            continue
+                        if self._fallback_tier(tier, e, tiers, attempt, clock() - start):
+                            break
+                    response = self._error_reply(e)
+                    if streamed:
+                        # Parte de la respuesta ya se entregó: se añade el aviso de error al final.
+                        yield f"\n\n{response}"
+                except BaseException:
+                    # Turno cancelado o generador cerrado a mitad del streaming: libera la prueba del circuito.
+                    self.resilience.release(deployment)
+                    raise
+            if response is not None:
+                break
+
+        response_text = self._complete_turn(session, message, response, run_args)
+        await self.sessions.persist(session)
+        if not streamed:
+            # Sin texto parcial (p. ej. solicitud de aprobación o error inicial): se entrega el texto final.
+            yield response_text
+
     async def cleanup(self) -> None:
         """Limpia cualquier recurso utilizado por el agente (no es necesario en este caso pero se implementa para mantener la consistencia).
         Si el agente tuviera recursos como conexiones abiertas, archivos temporales, etc., aquí es donde se cerrarían o eliminarían."""
         logger.debug("Iniciando limpieza de recursos...")
+        if self.search_cache is not None:
+            self.search_cache.close()
+        if self.state_store is not None:
+            await self.state_store.close()
+        for client in self.chat_clients.values():
+            await client.close()
+        await self.transport.close()
+        if self.credential is not None:
+            await self.credential.close()
         logger.info("[OK] Agente limpiado y recursos liberados.")
@@ -0,0 +1,145 @@
+"""Reutilización de las definiciones de agente registradas en Foundry.
+
+Con ``AzureAIClient`` cada proceso registra una versión nueva del agente
+(``agents.create_version``) la primera vez que responde, aunque el prompt, las
+tools y el deployment sean idénticos a los de la versión que ya existe; ocurre en
+cada arranque y en cada réplica.
+
+``AgentDefinitionRegistry`` calcula una huella (SHA-256) de la definición que se
+registraría —deployment, instrucciones, tools y parámetros del modelo— y la guarda
+en los metadatos de la versión. Antes de crear una versión busca en el servicio una
+con la misma huella y la reutiliza; solo se crea otra cuando la definición cambia.
+Como la definición se serializa siempre igual, el prefijo del prompt (instrucciones
+y esquemas de tools) es idéntico byte a byte entre turnos, réplicas y reinicios, lo
+que permite aprovechar la caché de prompts del proveedor.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections.abc import Mapping
+from typing import Any
+
+from azure.ai.projects.aio import AIProjectClient
+from azure.ai.projects.models import PromptAgentDefinition
+from azure.core.exceptions import ResourceNotFoundError
+
+from app.core.transport import PooledAzureAIClient
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_METADATA_KEY = "definition_fingerprint"
+# Campos de run_options que forman parte de la definición del agente en Foundry.
+DEFINITION_FIELDS = ("model", "tools", "temperature", "top_p", "reasoning", "rai_config")
+# Versiones que se revisan al buscar una huella (las más recientes primero).
+LOOKUP_LIMIT = 20
+
+
+def definition_fingerprint(definition: Mapping[str, Any]) -> str:
+    """Huella estable de la definición: el mismo contenido produce siempre la misma huella."""
+    payload = json.dumps(definition, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AgentDefinitionRegistry:
+    """Resuelve cada definición de agente a una versión existente en Foundry o crea una nueva."""
+
+    def __init__(self) -> None:
+        self._versions: dict[tuple[str, str], str] = {}
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self.reused = 0
+        self.created = 0
+        self.lookups = 0
+
+    async def resolve(
+        self,
+        project_client: AIProjectClient,
+        agent_name: str,
+        definition: dict[str, Any],
+        description: str | None = None,
+    ) -> str:
+        """Versión del agente para la definición; consulta el servicio solo la primera vez por proceso."""
+        fingerprint = definition_fingerprint(definition)
+        key = (agent_name, fingerprint)
+        version = self._versions.get(key)
+        if version is not None:
+            return version
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            version = self._versions.get(key)
+            if version is None:
+                version = await self._find(project_client, agent_name, fingerprint)
+                if version is not None:
+                    self.reused += 1
+                    logger.info("[AGENT] Reutilizando %s v%s (huella %s).", agent_name, version, fingerprint[:12])
+                else:
+                    created = await project_client.agents.create_version(
+                        agent_name=agent_name,
+                        definition=PromptAgentDefinition(**definition),
+                        metadata={FINGERPRINT_METADATA_KEY: fingerprint},
+                        description=description,
+                    )
+                    version = created.version
+                    self.created += 1
+                    logger.info("[AGENT] Registrada %s v%s (huella %s).", agent_name, version, fingerprint[:12])
+                self._versions[key] = version
+        return version
+
+    async def _find(self, project_client: AIProjectClient, agent_name: str, fingerprint: str) -> str | None:
+        self.lookups += 1
+        try:
+            async for details in project_client.agents.list_versions(agent_name, limit=LOOKUP_LIMIT, order="desc"):
+                if (details.metadata or {}).get(FINGERPRINT_METADATA_KEY) == fingerprint:
+                    return details.version
+        except ResourceNotFoundError:
+            return None
+        return None
+
+    def stats(self) -> dict[str, int]:
+        """Definiciones resueltas y cuántas se reutilizaron o se registraron en el servicio."""
+        return {
+            "definitions": len(self._versions),
+            "lookups": self.lookups,
+            "reused": self.reused,
+            "created": self.created,
+        }
+
+
+class VersionedAzureAIClient(PooledAzureAIClient):
+    """Cliente de Foundry que resuelve la versión del agente por huella de su definición."""
+
+    def __init__(self, *, registry: AgentDefinitionRegistry, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._registry = registry
+
+    async def _get_agent_reference_or_create(
+        self,
+        run_options: dict[str, Any],
+        messages_instructions: str | None,
+        chat_options: Mapping[str, Any] | None = None,
+    ) -> dict[str, str]:
+        # Versión fijada explícitamente, sin modelo o con formato de respuesta: comportamiento base.
+        if (
+            self.agent_version is not None
+            or not self.agent_name
+            or not run_options.get("model")
+            or (chat_options and chat_options.get("response_format"))
+        ):
+            return await super()._get_agent_reference_or_create(run_options, messages_instructions, chat_options)
+
+        definition = {field: run_options[field] for field in DEFINITION_FIELDS if field in run_options}
+        instructions = "".join(
+            part for part in (messages_instructions, run_options.get("instructions")) if part
+        )
+        if instructions:
+            definition["instructions"] = instructions
+        # Cada combinación de tools (según la ruta del turno) se resuelve a su propia versión.
+        version = await self._registry.resolve(
+            self.project_client, self.agent_name, definition, self.agent_description
+        )
+        return {"name": self.agent_name, "version": version, "type": "agent_reference"}
+
+
+__all__ = ["AgentDefinitionRegistry", "VersionedAzureAIClient", "definition_fingerprint"]
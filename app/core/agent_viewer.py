@@ -1,22 +1,221 @@
 """Application service layer for chat interactions."""
 
+import asyncio
+import logging
+import random
+import uuid
+from typing import Any, AsyncIterator
+
 from app.core.agent import SimpleChatAgent
+from app.core.logging_config import log_context, logging_stats
+from app.core.runtime_env import get_env_float, get_env_int
+from app.core.rate_limits import QuotaLease, RateLimiter
+from app.core.scheduler import TurnScheduler
+from app.core.sessions import DEFAULT_CONVERSATION_ID
+from app.core.telemetry import stage
+from app.core.tools import TOOL_ROUTER
+from app.core.transport import HttpTransport
+
+logger = logging.getLogger(__name__)
 
 
 class ChatService:
     """Servicio de aplicación que encapsula el ciclo de vida del agente de chat."""
 
-    def __init__(self) -> None:
-        self._agent = SimpleChatAgent()
+    def __init__(self, agent: SimpleChatAgent | None = None) -> None:
+        """``agent`` permite inyectar un agente ya construido (p. ej. con el backend simulado de ``benchmarks``)."""
+        # Transporte HTTP del servicio: lo comparten los clientes de Foundry y, en M365, el adapter.
+        self._agent = agent or SimpleChatAgent(transport=HttpTransport.from_env())
+        self.transport = self._agent.transport
+        self._scheduler = TurnScheduler.from_env()
+        self._limiter: RateLimiter | None = None
+        self._started = False
+        self._ready = False
+        self._start_lock = asyncio.Lock()
+        self._warm_up_task: asyncio.Task[bool] | None = None
+
+    @property
+    def ready(self) -> bool:
+        """El agente está inicializado y precalentado (credencial y conexión con Foundry)."""
+        return self._ready
 
     async def start(self) -> None:
         """Inicializa recursos del agente."""
         await self._agent.initialize()
+        # Con RATE_LIMIT_SHARED las cuotas se guardan en el almacén de estado del agente (compartido entre workers).
+        self._limiter = RateLimiter.from_env(store=self._agent.state_store)
+        self._started = True
+
+    async def ensure_started(self) -> None:
+        """Inicializa el agente una sola vez aunque lo pidan varios turnos a la vez."""
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self.start()
+
+    async def warm_up(
+        self,
+        *,
+        max_attempts: int = 0,
+        base_delay_seconds: float = 1.0,
+        max_delay_seconds: float = 60.0,
+    ) -> bool:
+        """Inicializa y precalienta el agente reintentando con backoff exponencial acotado.
+
+        ``max_attempts=0`` reintenta indefinidamente (la espera entre intentos nunca supera
+        ``max_delay_seconds``). Devuelve ``True`` cuando el servicio queda listo.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await self.ensure_started()
+                await self._agent.warm_up()
+                self._ready = True
+                logger.info("[OK] Agente precalentado y listo (intento %s).", attempt)
+                return True
+            except Exception as e:
+                if max_attempts and attempt >= max_attempts:
+                    logger.error("Precalentamiento del agente abandonado tras %s intentos: %s", attempt, e)
+                    return False
+                # Jitter para que varios workers no reintenten a la vez contra Entra ID/Foundry.
+                delay = min(max_delay_seconds, base_delay_seconds * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                logger.warning(
+                    "Error al precalentar el agente (intento %s): %s. Reintento en %.1f s.", attempt, e, delay
+                )
+                await asyncio.sleep(delay)
+
+    async def start_warm_up(self) -> None:
+        """Lanza el precalentamiento en segundo plano (hook de arranque del servidor)."""
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(
+                self.warm_up(
+                    max_attempts=get_env_int("WARMUP_MAX_ATTEMPTS", 0),
+                    base_delay_seconds=get_env_float("WARMUP_BASE_DELAY_SECONDS", 1.0),
+                    max_delay_seconds=get_env_float("WARMUP_MAX_DELAY_SECONDS", 60.0),
+                )
+            )
+
+    async def ask(
+        self,
+        user_text: str,
+        conversation_id: str = DEFAULT_CONVERSATION_ID,
+        stateless: bool = False,
+        *,
+        user_id: str | None = None,
+        tenant_id: str | None = None,
+        use_response_cache: bool = True,
+    ) -> str:
+        """Procesa un mensaje de usuario en su conversación y devuelve la respuesta.
+
+        Los turnos de conversaciones distintas se ejecutan en paralelo; los de una misma
+        conversación, en orden. Lanza ``SchedulerBusyError`` si la cola de espera está llena
+        y ``QuotaExceededError`` si el usuario o su tenant han agotado su cuota. Si el turno
+        no llega a responderse (cola llena, cancelación o error), la cuota reservada se devuelve.
+        Con ``stateless=True`` el mensaje se responde sin historial (y puede salir de la caché
+        de respuestas, salvo con ``use_response_cache=False``).
+        """
+        with log_context(conversation_id=conversation_id, turn_id=uuid.uuid4().hex[:12]):
+            lease = await self._acquire_quota(user_text, conversation_id, user_id, tenant_id)
+            try:
+                with stage("turn", {"stateless": str(stateless).lower()}, conversation_id=conversation_id):
+                    answer = await self._scheduler.run(
+                        conversation_id,
+                        lambda: self._agent.process_user_message(
+                            user_text, conversation_id, stateless, use_response_cache=use_response_cache
+                        ),
+                    )
+            except BaseException:
+                if lease is not None:
+                    await self._limiter.release(lease)
+                raise
+            if lease is not None:
+                await self._limiter.settle(lease, user_text, answer)
+        return answer
+
+    async def ask_stream(
+        self,
+        user_text: str,
+        conversation_id: str = DEFAULT_CONVERSATION_ID,
+        stateless: bool = False,
+        *,
+        user_id: str | None = None,
+        tenant_id: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Como ``ask``, pero entrega la respuesta en fragmentos de texto a medida que se generan."""
+        with log_context(conversation_id=conversation_id, turn_id=uuid.uuid4().hex[:12]):
+            lease = await self._acquire_quota(user_text, conversation_id, user_id, tenant_id)
+            chunks: list[str] = []
+            try:
+                with stage(
+                    "turn",
+                    {"stateless": str(stateless).lower()},
+                    activate=False,
+                    conversation_id=conversation_id,
+                    streaming=True,
+                ):
+                    async for chunk in self._scheduler.stream(
+                        conversation_id,
+                        lambda: self._agent.process_user_message_stream(user_text, conversation_id, stateless),
+                    ):
+                        chunks.append(chunk)
+                        yield chunk
+            except BaseException:
+                # Sin ningún fragmento entregado se devuelve la reserva; si no, se cobra lo entregado.
+                if lease is not None:
+                    if chunks:
+                        await self._limiter.settle(lease, user_text, "".join(chunks))
+                    else:
+                        await self._limiter.release(lease)
+                raise
+            if lease is not None:
+                await self._limiter.settle(lease, user_text, "".join(chunks))
+
+    async def _acquire_quota(
+        self, user_text: str, conversation_id: str, user_id: str | None, tenant_id: str | None
+    ) -> QuotaLease | None:
+        """Comprueba la cuota antes de encolar el turno (rechazo barato, sin tocar el backend)."""
+        if self._limiter is None or not (user_id or tenant_id):
+            return None
+        return await self._limiter.acquire(
+            user_text,
+            user_id=user_id,
+            tenant_id=tenant_id,
+            uses_web_search=self._agent.expects_slow_turn(user_text, conversation_id),
+        )
+
+    def expects_slow_turn(self, user_text: str, conversation_id: str = DEFAULT_CONVERSATION_ID) -> bool:
+        """Indica si el turno previsiblemente usará web search (candidato a entrega en segundo plano)."""
+        return self._agent.expects_slow_turn(user_text, conversation_id)
 
-    async def ask(self, user_text: str) -> str:
-        """Procesa un mensaje de usuario y devuelve la respuesta."""
-        return await self._agent.process_user_message(user_text)
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Métricas de sesiones y del planificador de turnos."""
+        return {
+            "sessions": self._agent.sessions.stats() if self._agent.sessions else {},
+            "response_cache": self._agent.response_cache.stats() if self._agent.response_cache else {},
+            "web_search_cache": self._agent.search_cache.stats() if self._agent.search_cache else {},
+            "intents": self._agent.intents.stats() if self._agent.intents else {},
+            "tool_routes": TOOL_ROUTER.stats(),
+            "models": self._agent.model_router.stats() if self._agent.model_router else {},
+            "resilience": self._agent.resilience.stats() if self._agent.resilience else {},
+            "history": self._agent.history.stats() if self._agent.history else {},
+            "state_store": self._agent.state_store.stats() if self._agent.state_store else {},
+            "credentials": self._agent.credential.stats() if self._agent.credential else {},
+            "transport": self.transport.stats(),
+            "agent_definitions": self._agent.definitions.stats(),
+            "scheduler": self._scheduler.stats(),
+            "quotas": self._limiter.stats() if self._limiter else {},
+            "logging": logging_stats(),
+        }
 
     async def stop(self) -> None:
         """Libera recursos del agente."""
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+            # Se espera a que la cancelación termine: un precalentamiento a medias no debe seguir usando
+            # clientes y credencial ya cerrados por cleanup(). ``wait`` no relanza la cancelación de la
+            # tarea, pero sí una cancelación de ``stop`` misma.
+            await asyncio.wait({self._warm_up_task})
+        self._ready = False
         await self._agent.cleanup()
@@ -0,0 +1,239 @@
+"""Credencial de Entra ID compartida por todo el proceso, con caché de tokens por ámbito.
+
+``DefaultAzureCredential`` recorre su cadena (variables de entorno, workload identity,
+managed identity, Azure CLI, PowerShell, VS Code) la primera vez que se le pide un
+token y recuerda después la credencial que funcionó. Crear una por cliente repite
+ese sondeo en cada arranque en frío, y el SDK renueva el token en la ruta de la
+petición cuando caduca.
+
+``CredentialProvider`` mantiene una única cadena por proceso, guarda el token de cada
+ámbito y lo renueva en segundo plano antes de que caduque, de modo que ningún turno
+espera a Entra ID salvo el primero de cada ámbito. Implementa la interfaz asíncrona
+de credenciales de azure-core (``get_token``/``get_token_info``), así que se puede
+pasar directamente a los clientes de Foundry.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable
+
+from azure.core.credentials import AccessToken, AccessTokenInfo, TokenCredential
+from azure.identity import DefaultAzureCredential
+
+from app.core.runtime_env import get_env_float, is_cloud_runtime
+from app.core.telemetry import stage
+
+logger = logging.getLogger(__name__)
+
+# Margen con el que un token en caché deja de considerarse válido (reloj desincronizado, latencia).
+EXPIRY_SKEW_SECONDS = 30.0
+# Espera mínima entre renovaciones, para no insistir en bucle si Entra ID devuelve tokens cortos.
+MIN_REFRESH_DELAY_SECONDS = 5.0
+
+
+def create_default_credential() -> DefaultAzureCredential:
+    """Devuelve la credencial Azure apropiada para el entorno actual.
+
+    - En cloud: usa DefaultAzureCredential (Managed Identity preferida)
+    - En local: usa DefaultAzureCredential que intentará Azure CLI, VS Code, etc.
+    """
+    if is_cloud_runtime():
+        return DefaultAzureCredential(exclude_interactive_browser_credential=True)
+    # En local, DefaultAzureCredential probará múltiples métodos:
+    # 1. Environment variables
+    # 2. Workload Identity
+    # 3. Managed Identity
+    # 4. Azure CLI
+    # 5. Azure PowerShell
+    # 6. Visual Studio Code
+    return DefaultAzureCredential(
+        exclude_interactive_browser_credential=True,
+        exclude_shared_token_cache_credential=True,
+    )
+
+
+class CredentialProvider:
+    """Credencial asíncrona con caché de tokens por ámbito y renovación proactiva."""
+
+    def __init__(
+        self,
+        factory: Callable[[], TokenCredential] = create_default_credential,
+        *,
+        refresh_margin_seconds: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._factory = factory
+        self._refresh_margin = max(refresh_margin_seconds, 0.0)
+        self._clock = clock
+        self._credential: TokenCredential | None = None
+        self._tokens: dict[tuple[str, ...], AccessTokenInfo] = {}
+        self._locks: dict[tuple[str, ...], asyncio.Lock] = {}
+        self._refresh_tasks: dict[tuple[str, ...], asyncio.Task[None]] = {}
+        self.fetches = 0
+        self.cache_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    @classmethod
+    def from_env(cls) -> "CredentialProvider":
+        """Renueva cada token ``CREDENTIAL_REFRESH_MARGIN_SECONDS`` antes de que caduque."""
+        return cls(refresh_margin_seconds=get_env_float("CREDENTIAL_REFRESH_MARGIN_SECONDS", 300.0))
+
+    @property
+    def source(self) -> str | None:
+        """Credencial de la cadena que obtuvo el último token (p. ej. ``ManagedIdentityCredential``)."""
+        successful = getattr(self._credential, "_successful_credential", None)
+        return type(successful or self._credential).__name__ if self._credential is not None else None
+
+    async def get_token(
+        self,
+        *scopes: str,
+        claims: str | None = None,
+        tenant_id: str | None = None,
+        enable_cae: bool = False,
+        **kwargs: Any,
+    ) -> AccessToken:
+        options: dict[str, Any] = {"enable_cae": enable_cae}
+        if claims:
+            options["claims"] = claims
+        if tenant_id:
+            options["tenant_id"] = tenant_id
+        token = await self.get_token_info(*scopes, options=options)
+        return AccessToken(token.token, token.expires_on)
+
+    async def get_token_info(self, *scopes: str, options: dict[str, Any] | None = None) -> AccessTokenInfo:
+        if not scopes:
+            raise ValueError("Se necesita al menos un ámbito para pedir un token.")
+        if options and (options.get("claims") or options.get("tenant_id")):
+            # Desafíos CAE o tenants distintos: se piden siempre al servicio, sin caché.
+            return await self._fetch(scopes, options)
+
+        key = tuple(scopes)
+        token = self._valid_token(key)
+        if token is not None:
+            self.cache_hits += 1
+            return token
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Otro turno pudo obtenerlo mientras se esperaba el lock.
+            token = self._valid_token(key)
+            if token is not None:
+                self.cache_hits += 1
+                return token
+            token = await self._fetch(key, options)
+            self._store(key, token)
+            return token
+
+    def _valid_token(self, key: tuple[str, ...]) -> AccessTokenInfo | None:
+        token = self._tokens.get(key)
+        if token is not None and token.expires_on - EXPIRY_SKEW_SECONDS > self._clock():
+            return token
+        return None
+
+    async def _fetch(self, scopes: tuple[str, ...], options: dict[str, Any] | None) -> AccessTokenInfo:
+        if self._credential is None:
+            self._credential = self._factory()
+        credential = self._credential
+        self.fetches += 1
+        with stage("credential", scopes=list(scopes)) as span:
+            # La cadena de credenciales es síncrona (puede lanzar procesos como az cli): fuera del event loop.
+            if hasattr(credential, "get_token_info"):
+                token = await asyncio.to_thread(credential.get_token_info, *scopes, options=options)
+            else:
+                legacy = await asyncio.to_thread(credential.get_token, *scopes, **(options or {}))
+                token = AccessTokenInfo(legacy.token, legacy.expires_on)
+            span.set_attribute("credential.source", self.source or "")
+        return token
+
+    def _store(self, key: tuple[str, ...], token: AccessTokenInfo) -> None:
+        self._tokens[key] = token
+        task = self._refresh_tasks.get(key)
+        if task is None or task.done():
+            self._refresh_tasks[key] = asyncio.create_task(self._refresh_loop(key))
+            logger.info(
+                "[AUTH] Token obtenido con %s para %s; renovación en segundo plano.", self.source, " ".join(key)
+            )
+
+    def _refresh_delay(self, token: AccessTokenInfo) -> float:
+        refresh_at = token.refresh_on or token.expires_on - self._refresh_margin
+        return max(refresh_at - self._clock(), MIN_REFRESH_DELAY_SECONDS)
+
+    async def _refresh_loop(self, key: tuple[str, ...]) -> None:
+        """Renueva el token del ámbito antes de que caduque; si falla, reintenta con backoff mientras siga vigente.
+
+        Si el token caduca sin haberse podido renovar, se descarta y el bucle termina: la siguiente petición lo
+        obtiene en primer plano y ``_store`` vuelve a arrancar la renovación.
+        """
+        failures = 0
+        while True:
+            if failures:
+                delay = min(60.0, 2.0 ** failures) * random.uniform(0.5, 1.0)
+            else:
+                delay = self._refresh_delay(self._tokens[key])
+            await asyncio.sleep(delay)
+            try:
+                token = await self._fetch(key, None)
+            except Exception as e:
+                failures += 1
+                self.refresh_failures += 1
+                logger.warning("[AUTH] No se pudo renovar el token de %s (intento %s): %s", " ".join(key), failures, e)
+                if self._valid_token(key) is None:
+                    self._tokens.pop(key, None)
+                    logger.warning(
+                        "[AUTH] El token de %s caducó sin renovarse; se obtendrá en la próxima petición.", " ".join(key)
+                    )
+                    return
+                continue
+            failures = 0
+            self.refreshes += 1
+            self._tokens[key] = token
+
+    def stats(self) -> dict[str, Any]:
+        """Origen de la credencial, tokens en caché y contadores de peticiones y aciertos."""
+        return {
+            "source": self.source,
+            "cached_scopes": len(self._tokens),
+            "fetches": self.fetches,
+            "cache_hits": self.cache_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+    async def close(self) -> None:
+        """Detiene las renovaciones y cierra la credencial (se recrea si se vuelve a usar)."""
+        tasks = list(self._refresh_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresh_tasks.clear()
+        self._tokens.clear()
+        self._locks.clear()
+        if self._credential is not None:
+            close = getattr(self._credential, "close", None)
+            if close is not None:
+                close()
+            self._credential = None
+
+    async def __aenter__(self) -> "CredentialProvider":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+
+_PROVIDER: CredentialProvider | None = None
+
+
+def get_credential_provider() -> CredentialProvider:
+    """Proveedor de credenciales compartido por todos los clientes del proceso."""
+    global _PROVIDER
+    if _PROVIDER is None:
+        _PROVIDER = CredentialProvider.from_env()
+    return _PROVIDER
+
+
+__all__ = ["CredentialProvider", "create_default_credential", "get_credential_provider"]
@@ -0,0 +1,135 @@
+"""Compactación del historial de conversaciones de larga duración.
+
+En Teams una conversación puede durar semanas y cada turno reenvía el historial
+completo del hilo. El compactador estima los tokens que arrastra cada hilo y, al
+superar el presupuesto, resume los turnos antiguos en una sinopsis breve. El hilo
+se sustituye por uno nuevo que se siembra con la sinopsis y una ventana deslizante
+con los últimos turnos literales, de modo que el tamaño del prompt queda acotado
+independientemente de la antigüedad de la conversación.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Awaitable, Callable
+
+from agent_framework import ChatMessage
+
+from app.core.runtime_env import get_env_int
+from app.core.sessions import ConversationSession, HistoryTurn
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Resume la siguiente conversación entre un usuario y un asistente en un máximo de {max_words} palabras. "
+    "Conserva datos concretos, decisiones, preferencias del usuario y preguntas pendientes. "
+    "Responde solo con el resumen, sin usar herramientas.\n\n{transcript}"
+)
+SYNOPSIS_HEADER = "[Resumen de la conversación anterior; úsalo como contexto]\n{synopsis}"
+
+
+def format_transcript(turns: list[HistoryTurn], synopsis: str | None = None) -> str:
+    """Transcripción en texto plano de los turnos (precedida del resumen previo, si lo hay)."""
+    lines = [f"Resumen previo: {synopsis}"] if synopsis else []
+    for turn in turns:
+        lines.append(f"Usuario: {turn.user}")
+        lines.append(f"Asistente: {turn.assistant}")
+    return "\n".join(lines)
+
+
+class HistoryCompactor:
+    """Decide cuándo compactar un hilo y construye la sinopsis y los mensajes de siembra."""
+
+    def __init__(
+        self,
+        summarize: Callable[[str], Awaitable[str]],
+        *,
+        token_budget: int = 6000,
+        keep_turns: int = 4,
+        summary_max_tokens: int = 400,
+    ) -> None:
+        if token_budget < 1:
+            raise ValueError("token_budget debe ser mayor que 0.")
+        self._summarize = summarize
+        self._token_budget = token_budget
+        self._keep_turns = max(keep_turns, 0)
+        self._summary_max_tokens = summary_max_tokens
+        self.compactions = 0
+        self.summary_failures = 0
+
+    @classmethod
+    def from_env(cls, summarize: Callable[[str], Awaitable[str]]) -> "HistoryCompactor | None":
+        """Construye el compactador desde ``HISTORY_*``; ``HISTORY_TOKEN_BUDGET=0`` lo desactiva."""
+        token_budget = get_env_int("HISTORY_TOKEN_BUDGET", 6000)
+        if token_budget <= 0:
+            return None
+        return cls(
+            summarize,
+            token_budget=token_budget,
+            keep_turns=get_env_int("HISTORY_KEEP_TURNS", 4),
+            summary_max_tokens=get_env_int("HISTORY_SUMMARY_MAX_TOKENS", 400),
+        )
+
+    def window_size(self, session: ConversationSession) -> int:
+        """Turnos recientes que se conservan literales: hasta ``keep_turns`` y sin pasar de medio presupuesto.
+
+        El margen de medio presupuesto evita que el hilo compactado vuelva a superarlo en el turno siguiente.
+        """
+        kept, tokens = 0, 0
+        for turn in reversed(session.history):
+            if kept >= self._keep_turns or tokens + turn.tokens > self._token_budget // 2:
+                break
+            kept += 1
+            tokens += turn.tokens
+        return kept
+
+    def needs_compaction(self, session: ConversationSession) -> bool:
+        """El hilo supera el presupuesto y hay turnos antiguos que resumir."""
+        return session.history_tokens > self._token_budget and len(session.history) > self.window_size(session)
+
+    async def summarize(self, session: ConversationSession) -> str:
+        """Sinopsis de los turnos que salen de la ventana (incluye la sinopsis anterior).
+
+        Si el resumen con el LLM falla se usa un extracto local, para no bloquear el turno.
+        """
+        older = session.history[: len(session.history) - self.window_size(session)]
+        transcript = format_transcript(older, session.synopsis)
+        try:
+            synopsis = (
+                await self._summarize(
+                    SUMMARY_PROMPT.format(max_words=self._summary_max_tokens * 3 // 4, transcript=transcript)
+                )
+            ).strip()
+        except Exception as e:
+            logger.warning("[HISTORY] No se pudo resumir el historial con el LLM: %s", e)
+            synopsis = ""
+        if not synopsis:
+            self.summary_failures += 1
+            # Extracto local: se conserva el final de la transcripción (lo más reciente).
+            synopsis = transcript[-self._summary_max_tokens * 4 :]
+        self.compactions += 1
+        logger.info(
+            f"[HISTORY] Conversación {session.conversation_id} compactada: "
+            f"{len(older)} turnos resumidos, {len(session.history) - len(older)} conservados."
+        )
+        return synopsis
+
+    def seed_messages(self, session: ConversationSession, message: str) -> list[ChatMessage]:
+        """Mensajes con los que arranca el hilo nuevo: sinopsis, ventana reciente y mensaje actual."""
+        messages = [ChatMessage(role="user", text=SYNOPSIS_HEADER.format(synopsis=session.synopsis or ""))]
+        for turn in session.history:
+            messages.append(ChatMessage(role="user", text=turn.user))
+            messages.append(ChatMessage(role="assistant", text=turn.assistant))
+        messages.append(ChatMessage(role="user", text=message))
+        return messages
+
+    def stats(self) -> dict[str, int]:
+        """Compactaciones realizadas y resúmenes que recurrieron al extracto local."""
+        return {
+            "token_budget": self._token_budget,
+            "compactions": self.compactions,
+            "summary_failures": self.summary_failures,
+        }
+
+
+__all__ = ["HistoryCompactor", "format_transcript", "SUMMARY_PROMPT"]
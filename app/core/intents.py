@@ -0,0 +1,150 @@
+"""Motor local de intents: resuelve sin LLM los mensajes triviales y los comandos.
+
+Los intents (saludos, ayuda, alias de comandos, FAQs conocidas) se cargan de un
+fichero JSON. Al arrancar se compila una única expresión regular con todas las
+frases (una alternativa con grupo nombrado por intent) y un índice de similitud
+con frases y ejemplos. Un mensaje se resuelve localmente si:
+
+1. coincide completo (tras normalizar) con alguna frase del patrón compilado, o
+2. es corto y su similitud TF-IDF con algún ejemplo supera el umbral.
+
+Las estadísticas de acierto permiten medir cuánto tráfico se ahorra al LLM.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from app.core.runtime_env import get_env_str
+from app.core.similarity import SimilarityIndex
+from app.core.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTENTS_PATH = Path(__file__).with_name("intents.json")
+INTENT_ACTIONS = ("reply", "clear", "exit")
+
+
+@dataclass(frozen=True)
+class Intent:
+    """Intent canónico: acción a ejecutar y respuesta predefinida."""
+
+    name: str
+    action: str
+    response: str
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    """Resultado de una coincidencia local."""
+
+    intent: Intent
+    score: float
+    method: str  # "pattern" o "similarity"
+
+
+class IntentEngine:
+    """Índice precomputado de intents con coincidencia por patrón compilado y por similitud."""
+
+    def __init__(
+        self,
+        intents: list[tuple[Intent, list[str], list[str]]],
+        *,
+        similarity_threshold: float = 0.82,
+        max_similarity_words: int = 6,
+    ) -> None:
+        self._intents: dict[str, Intent] = {}
+        self._similarity_threshold = similarity_threshold
+        self._max_similarity_words = max_similarity_words
+        self._index = SimilarityIndex()
+
+        alternatives: list[str] = []
+        for position, (intent, patterns, examples) in enumerate(intents):
+            if intent.action not in INTENT_ACTIONS:
+                raise ValueError(f"Acción de intent no soportada '{intent.action}' en '{intent.name}'.")
+            group = f"i{position}"
+            self._intents[group] = intent
+            phrases = sorted({normalize_text(p) for p in patterns if normalize_text(p)}, key=len, reverse=True)
+            if phrases:
+                alternatives.append(f"(?P<{group}>{'|'.join(re.escape(p) for p in phrases)})")
+            for number, text in enumerate([*phrases, *examples]):
+                self._index.add((group, number), text)
+
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+        self.total = 0
+        self.pattern_hits = 0
+        self.similarity_hits = 0
+        self.hits_by_intent: Counter[str] = Counter()
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "IntentEngine":
+        """Carga los intents desde un fichero JSON (ver ``app/core/intents.json``)."""
+        with open(path, encoding="utf-8") as handle:
+            config: dict[str, Any] = json.load(handle)
+        intents = [
+            (
+                Intent(name=item["name"], action=item.get("action", "reply"), response=item["response"]),
+                list(item.get("patterns", [])),
+                list(item.get("examples", [])),
+            )
+            for item in config.get("intents", [])
+        ]
+        engine = cls(
+            intents,
+            similarity_threshold=float(config.get("similarity_threshold", 0.82)),
+            max_similarity_words=int(config.get("max_similarity_words", 6)),
+        )
+        logger.info("[OK] Motor de intents cargado desde %s (%s intents).", path, len(intents))
+        return engine
+
+    @classmethod
+    def from_env(cls) -> "IntentEngine":
+        """Carga el fichero indicado en ``INTENTS_CONFIG_PATH`` o el incluido en el paquete."""
+        return cls.from_file(get_env_str("INTENTS_CONFIG_PATH") or DEFAULT_INTENTS_PATH)
+
+    def match(self, message: str, *, record: bool = True) -> IntentMatch | None:
+        """Devuelve el intent local del mensaje o ``None`` si debe ir al LLM.
+
+        Con ``record=False`` la consulta no cuenta en las estadísticas.
+        """
+        normalized = normalize_text(message)
+        result: IntentMatch | None = None
+        if normalized and self._pattern is not None:
+            hit = self._pattern.fullmatch(normalized)
+            if hit is not None:
+                result = IntentMatch(self._intents[hit.lastgroup], 1.0, "pattern")
+        if result is None and normalized and len(normalized.split()) <= self._max_similarity_words:
+            best = self._index.best_match(normalized)
+            if best is not None and best[1] >= self._similarity_threshold:
+                result = IntentMatch(self._intents[best[0][0]], best[1], "similarity")
+
+        if record:
+            self.total += 1
+            if result is not None:
+                self.hits_by_intent[result.intent.name] += 1
+                if result.method == "pattern":
+                    self.pattern_hits += 1
+                else:
+                    self.similarity_hits += 1
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        """Tasa de resolución local (mensajes que no llegaron al LLM) y desglose por intent."""
+        hits = self.pattern_hits + self.similarity_hits
+        return {
+            "messages": self.total,
+            "local_hits": hits,
+            "pattern_hits": self.pattern_hits,
+            "similarity_hits": self.similarity_hits,
+            "match_rate": hits / self.total if self.total else 0.0,
+            "by_intent": dict(self.hits_by_intent),
+        }
+
+
+__all__ = ["Intent", "IntentMatch", "IntentEngine", "DEFAULT_INTENTS_PATH"]
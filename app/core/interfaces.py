@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 
 class AgentInterface(ABC):
     """Interface for the agent to interact with the environment.
     it implements three methods:
     - initialize: to initialize the agent with the necessary information to interact with the environment.
     - process_user_message: to process the user message and return a response.
+    - process_user_message_stream: optional streaming variant that yields partial text.
     - cleanup: to clean up any resources used by the agent."""
 
     @abstractmethod
@@ -13,10 +15,17 @@ class AgentInterface(ABC):
         pass
 
     @abstractmethod
-    def process_user_message(self, message: str) -> str:
-        """Process the user message and return a response."""
+    def process_user_message(self, message: str, conversation_id: str = "default") -> str:
+        """Process the user message within the given conversation and return a response."""
         pass
 
+    async def process_user_message_stream(self, message: str, conversation_id: str = "default") -> AsyncIterator[str]:
+        """Process the user message and yield the response as text chunks.
+
+        The default implementation yields the full response of ``process_user_message`` at once;
+        agents backed by a streaming LLM should override it."""
+        yield await self.process_user_message(message, conversation_id)
+
     @abstractmethod
     def cleanup(self) -> None:
         """Clean up any resources used by the agent."""
@@ -0,0 +1,209 @@
+"""Logging sin bloquear el event loop, con registros JSON y muestreo del hot path.
+
+``configure_logging`` sustituye al ``logging.basicConfig`` que hacía el agente:
+
+- El logger raíz solo tiene un ``QueueHandler``: en el event loop cada log se limita
+  a crear el registro y encolarlo. Un ``QueueListener`` en un hilo aparte le da
+  formato (el mensaje se compone ahí, no en el loop) y lo escribe en stdout, que en
+  App Service puede bloquear durante las ráfagas. Si la cola se llena, los
+  registros nuevos se descartan y se cuentan, en lugar de frenar los turnos.
+- Cada registro lleva el ``conversation_id`` y el ``turn_id`` del turno en curso
+  (``log_context``) y el ``trace_id`` de OpenTelemetry, capturados al encolar.
+- ``LOG_FORMAT=json`` emite un objeto JSON por línea (por defecto en App Service);
+  ``text`` mantiene el formato clásico ``NIVEL:logger:mensaje`` para uso local.
+- Los eventos de alto volumen de cada turno (ruta de tools, tier elegido, aciertos
+  de caché) se marcan con ``extra=HOT_PATH`` y se muestrean a ``LOG_HOT_PATH_SAMPLE_RATE``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import datetime as dt
+import json
+import logging
+import queue
+import random
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from opentelemetry import trace
+
+from app.core.runtime_env import get_env_float, get_env_int, get_env_str, is_cloud_runtime, load_local_env_if_needed
+
+LOG_FORMATS = ("text", "json")
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+# Marca de los eventos del hot path que se muestrean: ``logger.info(..., extra=HOT_PATH)``.
+HOT_PATH = {"hot_path": True}
+
+_LOG_CONTEXT: ContextVar[dict[str, str]] = ContextVar("log_context", default={})
+_listener: QueueListener | None = None
+_queue_handler: "DroppingQueueHandler | None" = None
+
+
+@contextmanager
+def log_context(**fields: str) -> Iterator[None]:
+    """Añade ``fields`` (p. ej. ``conversation_id`` y ``turn_id``) a los logs emitidos dentro del bloque."""
+    token = _LOG_CONTEXT.set({**_LOG_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        try:
+            _LOG_CONTEXT.reset(token)
+        except ValueError:
+            # Un generador asíncrono abandonado se cierra desde otro contexto: no hay nada que restaurar.
+            pass
+
+
+class lazy:
+    """Valor de log que solo se calcula si el registro llega a formatearse."""
+
+    __slots__ = ("_func", "_args")
+
+    def __init__(self, func: Callable[..., Any], *args: Any) -> None:
+        self._func = func
+        self._args = args
+
+    def __str__(self) -> str:
+        return str(self._func(*self._args))
+
+    __repr__ = __str__
+
+
+class ContextFilter(logging.Filter):
+    """Copia al registro el contexto del turno y el ``trace_id`` (hay que hacerlo antes de encolar)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _LOG_CONTEXT.get()
+        record.conversation_id = context.get("conversation_id")
+        record.turn_id = context.get("turn_id")
+        span_context = trace.get_current_span().get_span_context()
+        record.trace_id = format(span_context.trace_id, "032x") if span_context.is_valid else None
+        return True
+
+
+class HotPathSampler(logging.Filter):
+    """Deja pasar una fracción ``rate`` de los registros marcados con ``HOT_PATH``."""
+
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        if not 0 <= rate <= 1:
+            raise ValueError("rate debe estar entre 0 y 1.")
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "hot_path", False):
+            return True
+        if self.rate >= 1:
+            return True
+        # Para que quien analice los logs pueda reescalar los recuentos.
+        record.sample_rate = self.rate
+        if random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """``QueueHandler`` que descarta (y cuenta) los registros si la cola está llena."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # El formato se aplica en el hilo del listener: aquí el registro se encola tal cual.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por registro con el contexto del turno."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, Any] = {
+            "timestamp": dt.datetime.fromtimestamp(record.created, dt.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in ("conversation_id", "turn_id", "trace_id", "sample_rate"):
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging() -> None:
+    """Instala el pipeline de logging según ``LOG_*`` (idempotente).
+
+    - ``LOG_LEVEL``: nivel del logger raíz (``INFO`` por defecto).
+    - ``LOG_FORMAT``: ``text`` o ``json`` (por defecto ``json`` en App Service y ``text`` en local).
+    - ``LOG_HOT_PATH_SAMPLE_RATE``: fracción de eventos del hot path que se conservan (0-1).
+    - ``LOG_QUEUE_SIZE``: registros pendientes de escribir antes de empezar a descartar.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    load_local_env_if_needed(Path(__file__).resolve())
+    log_format = (get_env_str("LOG_FORMAT") or ("json" if is_cloud_runtime() else "text")).lower()
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"LOG_FORMAT debe ser uno de {', '.join(LOG_FORMATS)}; recibido '{log_format}'.")
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=get_env_int("LOG_QUEUE_SIZE", 10000)))
+    _queue_handler.addFilter(HotPathSampler(get_env_float("LOG_HOT_PATH_SAMPLE_RATE", 1.0)))
+    _queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel((get_env_str("LOG_LEVEL", "INFO") or "INFO").upper())
+
+    _listener = QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    # Al salir se escriben los registros que queden en la cola.
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Detiene el listener después de vaciar la cola."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict[str, int]:
+    """Registros descartados por cola llena y eventos del hot path muestreados fuera."""
+    if _queue_handler is None:
+        return {}
+    sampler = next(f for f in _queue_handler.filters if isinstance(f, HotPathSampler))
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "hot_path_sampled_out": sampler.sampled_out,
+    }
+
+
+__all__ = [
+    "HOT_PATH",
+    "configure_logging",
+    "lazy",
+    "log_context",
+    "logging_stats",
+    "shutdown_logging",
+]
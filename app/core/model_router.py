@@ -0,0 +1,160 @@
+"""Enrutado de turnos entre varios deployments de Foundry según coste y latencia.
+
+Cada turno que llega al LLM se asigna a un *tier* de modelo a partir de las
+características del mensaje y de las tools que ha habilitado el router de tools:
+
+- ``fast``: mensajes cortos sin indicios de investigación (charla, preguntas simples)
+  y turnos cuya ruta de tools no incluye web search (p. ej. consultas del tiempo);
+  van a un deployment pequeño y barato.
+- ``default``: el resto (preguntas largas, de actualidad o que piden analizar,
+  comparar o investigar).
+
+El router devuelve la lista ordenada de deployments candidatos: si el primero
+responde con *throttling* (HTTP 429) el turno se reintenta en el siguiente. Las
+latencias de cada deployment se acumulan para poder ajustar las reglas.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from collections import deque
+from typing import Any, Callable, Iterable
+
+from app.core.runtime_env import get_env_int, get_env_str
+from app.core.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIER = "default"
+FAST_TIER = "fast"
+
+THROTTLING_HINTS = ("429", "rate limit", "too many requests", "throttl")
+
+# Palabras (normalizadas) que indican una pregunta de actualidad o de razonamiento largo.
+COMPLEX_HINTS = (
+    "noticias", "actualidad", "ultimas", "ultimo", "reciente", "recientes", "hoy", "busca", "buscar",
+    "investiga", "compara", "comparar", "analiza", "analizar", "explica", "explicame", "resume", "resumen",
+    "por que", "news", "latest", "search", "compare", "analyze", "explain",
+)
+_COMPLEX_PATTERN = re.compile(r"\b(?:" + "|".join(re.escape(hint) for hint in COMPLEX_HINTS) + r")\b")
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Indica si la excepción (o alguna de su cadena de causas) es un 429 del servicio."""
+    seen: set[int] = set()
+    current: BaseException | None = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if getattr(current, "status_code", None) == 429:
+            return True
+        text = str(current).lower()
+        if any(hint in text for hint in THROTTLING_HINTS):
+            return True
+        current = getattr(current, "inner_exception", None) or current.__cause__ or current.__context__
+    return False
+
+
+class DeploymentStats:
+    """Latencias recientes y contadores de un deployment."""
+
+    def __init__(self, window: int = 256) -> None:
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.fallbacks = 0
+
+    def record(self, latency_seconds: float, *, ok: bool = True, throttled: bool = False) -> None:
+        self.calls += 1
+        if ok:
+            self._latencies.append(latency_seconds)
+        else:
+            self.errors += 1
+            if throttled:
+                self.throttled += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        ordered = sorted(self._latencies)
+
+        def percentile(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "fallbacks": self.fallbacks,
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+            "p50_ms": round(percentile(0.5) * 1000, 1),
+            "p95_ms": round(percentile(0.95) * 1000, 1),
+        }
+
+
+class ModelRouter:
+    """Elige el deployment de cada turno y lleva las estadísticas de latencia por deployment."""
+
+    def __init__(
+        self,
+        deployments: dict[str, str],
+        *,
+        fast_max_words: int = 12,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        if DEFAULT_TIER not in deployments:
+            raise ValueError("El router de modelos necesita un deployment 'default'.")
+        self._deployments = dict(deployments)
+        self._fast_max_words = fast_max_words
+        self._clock = clock
+        self._stats = {name: DeploymentStats() for name in self._deployments.values()}
+
+    @classmethod
+    def from_env(cls, default_deployment: str) -> "ModelRouter":
+        """Usa ``DEPLOYMENT_NAME`` como tier ``default`` y ``DEPLOYMENT_NAME_FAST`` (opcional) como ``fast``."""
+        deployments = {DEFAULT_TIER: default_deployment}
+        fast_deployment = get_env_str("DEPLOYMENT_NAME_FAST")
+        if fast_deployment and fast_deployment != default_deployment:
+            deployments[FAST_TIER] = fast_deployment
+        return cls(deployments, fast_max_words=get_env_int("MODEL_ROUTER_FAST_MAX_WORDS", 12))
+
+    @property
+    def deployments(self) -> dict[str, str]:
+        """Deployment configurado para cada tier."""
+        return dict(self._deployments)
+
+    @property
+    def clock(self) -> Callable[[], float]:
+        return self._clock
+
+    def select_tier(self, message: str, tools: Iterable[object] | None) -> str:
+        """Tier preferido para el mensaje según las tools habilitadas, su longitud y su contenido."""
+        if FAST_TIER not in self._deployments:
+            return DEFAULT_TIER
+        if tools is not None and not any(getattr(tool, "name", None) == "web_search" for tool in tools):
+            # La ruta de tools ya acotó el turno a una tarea concreta sin búsqueda externa.
+            return FAST_TIER
+        normalized = normalize_text(message)
+        if len(normalized.split()) > self._fast_max_words or _COMPLEX_PATTERN.search(normalized):
+            return DEFAULT_TIER
+        return FAST_TIER
+
+    def candidates(self, message: str, tools: Iterable[object] | None) -> list[str]:
+        """Tiers en orden de preferencia: el elegido primero y el resto como *fallback*."""
+        preferred = self.select_tier(message, tools)
+        return [preferred, *(tier for tier in self._deployments if tier != preferred)]
+
+    def record(self, tier: str, latency_seconds: float, *, ok: bool = True, throttled: bool = False) -> None:
+        self._stats[self._deployments[tier]].record(latency_seconds, ok=ok, throttled=throttled)
+
+    def record_fallback(self, tier: str) -> None:
+        self._stats[self._deployments[tier]].fallbacks += 1
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Latencias (media, p50, p95) y contadores por deployment."""
+        return {name: stats.snapshot() for name, stats in self._stats.items()}
+
+
+__all__ = ["ModelRouter", "DeploymentStats", "is_throttling_error", "DEFAULT_TIER", "FAST_TIER"]
@@ -0,0 +1,291 @@
+"""Cuotas por usuario y por tenant con *token buckets* (peticiones y tokens por minuto).
+
+Cada usuario (``activity.from_property.id``) y cada tenant tienen dos cubos que se
+rellenan de forma continua: uno de peticiones por minuto y otro de tokens estimados
+por minuto. Un turno se admite solo si todos sus cubos tienen saldo; si no, se
+rechaza al momento con ``QuotaExceededError`` sin llegar al planificador ni a
+Foundry. La admisión reserva los tokens estimados del mensaje más una respuesta
+típica (y un extra si el turno habilita web search); al terminar el turno se
+ajusta con el tamaño real, de modo que un usuario que genera respuestas largas
+queda en deuda hasta que su cubo se rellena. Si el turno no llega a responderse
+(cola del planificador llena, cancelación o error), la reserva se devuelve.
+
+Los límites por defecto salen de ``RATE_LIMIT_*`` y se pueden sobrescribir por
+usuario o tenant en un JSON (``RATE_LIMITS_PATH``). El estado vive en memoria o,
+con ``RATE_LIMIT_SHARED=true``, en el almacén de estado compartido (los workers
+aplican entonces la misma cuota). Si el almacén falla, la cuota no bloquea el turno.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from app.core.runtime_env import get_env_bool, get_env_int, get_env_str
+from app.core.state_store import NEW_ETAG, StateConflictError, StateStore
+from app.core.text_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+QUOTA_KEY_PREFIX = "quota/"
+SHARED_WRITE_ATTEMPTS = 5
+
+
+@dataclass(frozen=True)
+class QuotaLimits:
+    """Peticiones y tokens estimados por minuto (0 = sin límite)."""
+
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], base: "QuotaLimits | None" = None) -> "QuotaLimits":
+        base = base or cls()
+        return cls(
+            requests_per_minute=int(data.get("requests_per_minute", base.requests_per_minute)),
+            tokens_per_minute=int(data.get("tokens_per_minute", base.tokens_per_minute)),
+        )
+
+
+class QuotaExceededError(RuntimeError):
+    """El usuario o su tenant han agotado su cuota; el turno no se ha ejecutado."""
+
+    def __init__(self, scope: str, retry_after_seconds: float) -> None:
+        super().__init__(f"Cuota agotada ({scope}); reintento en {retry_after_seconds:.0f} s.")
+        self.scope = scope
+        self.retry_after_seconds = retry_after_seconds
+
+
+@dataclass(frozen=True)
+class QuotaLease:
+    """Reserva de un turno admitido; se ajusta con ``RateLimiter.settle`` o se devuelve con ``release``."""
+
+    keys: tuple[str, ...]
+    reserved_tokens: int
+
+
+def _refill(bucket: dict[str, float], limits: QuotaLimits, now: float) -> dict[str, float]:
+    """Saldo de los cubos tras rellenarlos por el tiempo transcurrido (cubo nuevo = lleno)."""
+    elapsed = max(now - bucket.get("ts", now), 0.0)
+    rpm, tpm = limits.requests_per_minute, limits.tokens_per_minute
+    return {
+        "r": min(rpm, bucket.get("r", rpm) + elapsed * rpm / 60),
+        "t": min(tpm, bucket.get("t", tpm) + elapsed * tpm / 60),
+        "ts": now,
+    }
+
+
+def _shortfall(bucket: dict[str, float], limits: QuotaLimits, cost: int) -> float:
+    """Segundos hasta que el cubo admita el turno (0 = admitido ya)."""
+    waits = [0.0]
+    if limits.requests_per_minute > 0 and bucket["r"] < 1:
+        waits.append((1 - bucket["r"]) * 60 / limits.requests_per_minute)
+    if limits.tokens_per_minute > 0:
+        # Un turno más caro que el cubo entero se admite con el cubo lleno (si no, nunca pasaría).
+        needed = min(cost, limits.tokens_per_minute)
+        if bucket["t"] < needed:
+            waits.append((needed - bucket["t"]) * 60 / limits.tokens_per_minute)
+    return max(waits)
+
+
+def _charge(bucket: dict[str, float], limits: QuotaLimits, requests: int, tokens: int) -> dict[str, float]:
+    charged = dict(bucket)
+    if limits.requests_per_minute > 0:
+        charged["r"] -= requests
+    if limits.tokens_per_minute > 0:
+        charged["t"] -= tokens
+    return charged
+
+
+class RateLimiter:
+    """Control de admisión por usuario y tenant con cubos en memoria o en el almacén compartido."""
+
+    def __init__(
+        self,
+        *,
+        user_limits: QuotaLimits,
+        tenant_limits: QuotaLimits,
+        overrides: dict[str, QuotaLimits] | None = None,
+        reserve_output_tokens: int = 500,
+        web_search_tokens: int = 1000,
+        store: StateStore | None = None,
+        clock: Callable[[], float] = time.time,
+        max_entries: int = 10000,
+    ) -> None:
+        self._user_limits = user_limits
+        self._tenant_limits = tenant_limits
+        self._overrides = dict(overrides or {})
+        self._reserve_output_tokens = reserve_output_tokens
+        self._web_search_tokens = web_search_tokens
+        self._store = store
+        self._clock = clock
+        self._max_entries = max_entries
+        self._buckets: OrderedDict[str, dict[str, float]] = OrderedDict()
+        self.admitted = 0
+        self.refunded = 0
+        self.rejected: dict[str, int] = {"user": 0, "tenant": 0}
+        self.store_errors = 0
+
+    @classmethod
+    def from_env(cls, store: StateStore | None = None) -> "RateLimiter | None":
+        """Construye el limitador desde ``RATE_LIMIT_*``; ``None`` si no hay ningún límite configurado.
+
+        ``RATE_LIMITS_PATH`` apunta a un JSON opcional con ``user``, ``tenant`` (límites por defecto)
+        y ``overrides`` (``{"user:<id>": {...}, "tenant:<id>": {...}}``).
+        """
+        user_limits = QuotaLimits(
+            requests_per_minute=get_env_int("RATE_LIMIT_USER_RPM", 20),
+            tokens_per_minute=get_env_int("RATE_LIMIT_USER_TPM", 40000),
+        )
+        tenant_limits = QuotaLimits(
+            requests_per_minute=get_env_int("RATE_LIMIT_TENANT_RPM", 0),
+            tokens_per_minute=get_env_int("RATE_LIMIT_TENANT_TPM", 0),
+        )
+        overrides: dict[str, QuotaLimits] = {}
+        config_path = get_env_str("RATE_LIMITS_PATH")
+        if config_path:
+            try:
+                config = json.loads(Path(config_path).read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                raise ValueError(f"No se pudo leer la configuración de cuotas {config_path}: {exc}") from exc
+            user_limits = QuotaLimits.from_dict(config.get("user", {}), user_limits)
+            tenant_limits = QuotaLimits.from_dict(config.get("tenant", {}), tenant_limits)
+            for key, limits in config.get("overrides", {}).items():
+                base = user_limits if key.startswith("user:") else tenant_limits
+                overrides[key] = QuotaLimits.from_dict(limits, base)
+        if not (user_limits.enabled or tenant_limits.enabled or any(l.enabled for l in overrides.values())):
+            return None
+        return cls(
+            user_limits=user_limits,
+            tenant_limits=tenant_limits,
+            overrides=overrides,
+            reserve_output_tokens=get_env_int("RATE_LIMIT_RESERVE_OUTPUT_TOKENS", 500),
+            web_search_tokens=get_env_int("RATE_LIMIT_WEB_SEARCH_TOKENS", 1000),
+            store=store if get_env_bool("RATE_LIMIT_SHARED", False) else None,
+        )
+
+    def limits_for(self, key: str) -> QuotaLimits:
+        if key in self._overrides:
+            return self._overrides[key]
+        return self._user_limits if key.startswith("user:") else self._tenant_limits
+
+    def _keys(self, user_id: str | None, tenant_id: str | None) -> tuple[str, ...]:
+        keys = []
+        if user_id:
+            keys.append(f"user:{user_id}")
+        if tenant_id:
+            keys.append(f"tenant:{tenant_id}")
+        return tuple(key for key in keys if self.limits_for(key).enabled)
+
+    async def acquire(
+        self,
+        message: str,
+        *,
+        user_id: str | None = None,
+        tenant_id: str | None = None,
+        uses_web_search: bool = False,
+    ) -> QuotaLease | None:
+        """Admite el turno consumiendo una petición y los tokens estimados, o lanza ``QuotaExceededError``."""
+        keys = self._keys(user_id, tenant_id)
+        if not keys:
+            return None
+        cost = estimate_tokens(message) + self._reserve_output_tokens
+        if uses_web_search:
+            cost += self._web_search_tokens
+        await self._update(keys, requests=1, tokens=cost, check=True)
+        self.admitted += 1
+        return QuotaLease(keys=keys, reserved_tokens=cost)
+
+    async def settle(self, lease: QuotaLease | None, message: str, response: str) -> None:
+        """Ajusta la reserva con los tokens reales del turno (el saldo puede quedar en negativo)."""
+        if lease is None:
+            return
+        delta = estimate_tokens(message) + estimate_tokens(response) - lease.reserved_tokens
+        if delta > 0:
+            await self._update(lease.keys, requests=0, tokens=delta, check=False)
+
+    async def release(self, lease: QuotaLease | None) -> None:
+        """Devuelve la petición y los tokens reservados de un turno que no llegó a responderse."""
+        if lease is None:
+            return
+        self.refunded += 1
+        await self._update(lease.keys, requests=-1, tokens=-lease.reserved_tokens, check=False)
+
+    async def _update(self, keys: tuple[str, ...], *, requests: int, tokens: int, check: bool) -> None:
+        if self._store is None:
+            now = self._clock()
+            buckets = {key: _refill(self._buckets.get(key, {}), self.limits_for(key), now) for key in keys}
+            if check:
+                self._check(buckets, tokens)
+            for key, bucket in buckets.items():
+                self._buckets[key] = _charge(bucket, self.limits_for(key), requests, tokens)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self._max_entries:
+                self._buckets.popitem(last=False)
+            return
+        await self._update_shared(keys, requests=requests, tokens=tokens, check=check)
+
+    async def _update_shared(self, keys: tuple[str, ...], *, requests: int, tokens: int, check: bool) -> None:
+        """Misma operación sobre el almacén compartido, con compare-and-set por cubo."""
+        pending = list(keys)
+        try:
+            for _ in range(SHARED_WRITE_ATTEMPTS):
+                stored = await self._store.read([QUOTA_KEY_PREFIX + key for key in pending])
+                now = self._clock()
+                buckets, etags = {}, {}
+                for key in pending:
+                    document, etag = stored.get(QUOTA_KEY_PREFIX + key, ({}, NEW_ETAG))
+                    buckets[key] = _refill(document, self.limits_for(key), now)
+                    etags[key] = etag
+                if check:
+                    self._check(buckets, tokens)
+                items = {
+                    QUOTA_KEY_PREFIX + key: (_charge(bucket, self.limits_for(key), requests, tokens), etags[key])
+                    for key, bucket in buckets.items()
+                }
+                try:
+                    await self._store.write(items)
+                    return
+                except StateConflictError as conflict:
+                    # Otro worker actualizó alguno de los cubos: se reintentan solo esos.
+                    pending = [key for key in pending if QUOTA_KEY_PREFIX + key in conflict.keys]
+            logger.warning("[QUOTA] Conflictos repetidos al actualizar %s; se admite el turno.", pending)
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            # La cuota protege el backend, no debe tumbar el servicio si el almacén falla.
+            self.store_errors += 1
+            logger.warning("[QUOTA] Almacén de cuotas no disponible (%s); se admite el turno.", e)
+
+    def _check(self, buckets: dict[str, dict[str, float]], cost: int) -> None:
+        for key, bucket in buckets.items():
+            wait = _shortfall(bucket, self.limits_for(key), cost)
+            if wait > 0:
+                scope = key.split(":", 1)[0]
+                self.rejected[scope] += 1
+                logger.info("[QUOTA] Turno rechazado para %s; saldo disponible en %.1f s.", key, wait)
+                raise QuotaExceededError(scope, wait)
+
+    def stats(self) -> dict[str, Any]:
+        """Turnos admitidos y rechazados por ámbito, y cubos en memoria."""
+        return {
+            "admitted": self.admitted,
+            "refunded": self.refunded,
+            "rejected_user": self.rejected["user"],
+            "rejected_tenant": self.rejected["tenant"],
+            "tracked_buckets": len(self._buckets),
+            "shared": self._store is not None,
+            "store_errors": self.store_errors,
+        }
+
+
+__all__ = ["QuotaExceededError", "QuotaLease", "QuotaLimits", "RateLimiter"]
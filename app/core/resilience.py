@@ -0,0 +1,352 @@
+"""Reintentos, *circuit breaker* y peticiones *hedged* para las llamadas al LLM.
+
+Los errores transitorios de Foundry (429, 5xx, timeouts y cortes de conexión) se
+reintentan en el mismo deployment con *backoff* exponencial con *jitter*,
+respetando ``Retry-After`` cuando el servicio lo indica. Cada deployment tiene un
+*circuit breaker*: tras varios fallos seguidos se abre y las llamadas fallan al
+instante (``CircuitOpenError``) hasta que pasa el tiempo de enfriamiento; entonces
+deja pasar una única llamada de prueba (*half-open*) que lo vuelve a cerrar o a abrir.
+
+Opcionalmente, un turno idempotente (sin hilo compartido) puede lanzar una segunda
+petición si la primera supera un umbral de latencia; se usa la que termine antes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from app.core.model_router import is_throttling_error
+from app.core.runtime_env import get_env_float, get_env_int
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+TRANSIENT_ERROR_NAMES = frozenset(
+    {"APIConnectionError", "APITimeoutError", "TimeoutError", "ConnectError", "ReadTimeout", "RemoteProtocolError"}
+)
+RETRY_AFTER_HEADERS = ("retry-after-ms", "x-ms-retry-after-ms", "retry-after")
+
+
+class CircuitOpenError(RuntimeError):
+    """El deployment está marcado como no disponible; la llamada no se ha realizado."""
+
+    def __init__(self, deployment: str, retry_in_seconds: float) -> None:
+        super().__init__(f"Circuito abierto para el deployment '{deployment}' (reintento en {retry_in_seconds:.0f} s).")
+        self.deployment = deployment
+        self.retry_in_seconds = retry_in_seconds
+
+
+def _error_chain(error: BaseException):
+    seen: set[int] = set()
+    current: BaseException | None = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = getattr(current, "inner_exception", None) or current.__cause__ or current.__context__
+
+
+def retry_after_seconds(error: BaseException, *, now: Callable[[], float] = time.time) -> float | None:
+    """Espera indicada por el servicio (``Retry-After``/``retry-after-ms``) en la excepción o sus causas."""
+    for current in _error_chain(error):
+        response = getattr(current, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            continue
+        for name in RETRY_AFTER_HEADERS:
+            value = headers.get(name)
+            if not value:
+                continue
+            try:
+                seconds = float(value)
+            except ValueError:
+                # Retry-After también admite una fecha HTTP.
+                parsed = email.utils.parsedate_to_datetime(value) if name == "retry-after" else None
+                if parsed is None:
+                    continue
+                seconds = parsed.timestamp() - now()
+            else:
+                if name.endswith("-ms"):
+                    seconds /= 1000
+            return max(seconds, 0.0)
+    return None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """429, 5xx, timeouts y errores de conexión: fallos que pueden resolverse reintentando."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if is_throttling_error(error):
+        return True
+    for current in _error_chain(error):
+        if getattr(current, "status_code", None) in TRANSIENT_STATUS_CODES:
+            return True
+        if isinstance(current, (asyncio.TimeoutError, ConnectionError)) or type(current).__name__ in TRANSIENT_ERROR_NAMES:
+            return True
+    return False
+
+
+class CircuitBreaker:
+    """Circuit breaker por deployment: cerrado → abierto tras N fallos → semiabierto tras el enfriamiento."""
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int = 5,
+        reset_timeout_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._failure_threshold = max(failure_threshold, 1)
+        self._reset_timeout = reset_timeout_seconds
+        self._clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self._reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def retry_in(self) -> float:
+        return max(self._reset_timeout - (self._clock() - self._opened_at), 0.0)
+
+    def allow(self) -> bool:
+        """Indica si la llamada puede realizarse; en semiabierto solo pasa una llamada de prueba."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._state = HALF_OPEN
+            self._probe_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        self._state = CLOSED
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self._state == HALF_OPEN or self.consecutive_failures >= self._failure_threshold:
+            if self._state != OPEN:
+                self.opened += 1
+            self._state = OPEN
+            self._opened_at = self._clock()
+        self._probe_in_flight = False
+
+    def record_answered(self) -> None:
+        """El backend respondió, aunque con un error no transitorio (p. ej. 400): la prueba cierra el circuito."""
+        if self._probe_in_flight:
+            self.record_success()
+
+    def release_probe(self) -> None:
+        """Libera la llamada de prueba sin resultado (cancelada): la siguiente llamada podrá probar de nuevo."""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class ResiliencePolicy:
+    """Política de reintentos, circuit breakers por deployment y *hedging* de las llamadas al LLM."""
+
+    def __init__(
+        self,
+        *,
+        max_retries: int = 2,
+        base_delay_seconds: float = 0.5,
+        max_delay_seconds: float = 8.0,
+        max_retry_after_seconds: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout_seconds: float = 30.0,
+        hedge_after_seconds: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self._max_retries = max(max_retries, 0)
+        self._base_delay = base_delay_seconds
+        self._max_delay = max_delay_seconds
+        self._max_retry_after = max_retry_after_seconds
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout_seconds
+        self._hedge_after = hedge_after_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._counters: dict[str, dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """Configuración desde ``AGENT_RETRY_*``, ``CIRCUIT_BREAKER_*`` y ``AGENT_HEDGE_AFTER_SECONDS``."""
+        return cls(
+            max_retries=get_env_int("AGENT_RETRY_MAX_RETRIES", 2),
+            base_delay_seconds=get_env_float("AGENT_RETRY_BASE_DELAY_SECONDS", 0.5),
+            max_delay_seconds=get_env_float("AGENT_RETRY_MAX_DELAY_SECONDS", 8.0),
+            max_retry_after_seconds=get_env_float("AGENT_RETRY_MAX_RETRY_AFTER_SECONDS", 30.0),
+            failure_threshold=get_env_int("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5),
+            reset_timeout_seconds=get_env_float("CIRCUIT_BREAKER_RESET_SECONDS", 30.0),
+            hedge_after_seconds=get_env_float("AGENT_HEDGE_AFTER_SECONDS", 0.0),
+        )
+
+    def breaker(self, deployment: str) -> CircuitBreaker:
+        if deployment not in self._breakers:
+            self._breakers[deployment] = CircuitBreaker(
+                failure_threshold=self._failure_threshold,
+                reset_timeout_seconds=self._reset_timeout,
+                clock=self._clock,
+            )
+        return self._breakers[deployment]
+
+    def _count(self, deployment: str, name: str) -> None:
+        counters = self._counters.setdefault(
+            deployment, {"retries": 0, "retry_after_waits": 0, "hedges": 0, "hedges_won": 0}
+        )
+        counters[name] += 1
+
+    def before_call(self, deployment: str) -> None:
+        """Lanza ``CircuitOpenError`` si el circuito del deployment no deja pasar la llamada."""
+        breaker = self.breaker(deployment)
+        if not breaker.allow():
+            raise CircuitOpenError(deployment, breaker.retry_in())
+
+    def record_success(self, deployment: str) -> None:
+        self.breaker(deployment).record_success()
+
+    def record_failure(self, deployment: str, error: BaseException) -> bool:
+        """Cuenta el fallo en el circuit breaker si es transitorio; devuelve si se contó.
+
+        Un error no transitorio significa que el deployment respondió: si era la llamada de
+        prueba, el circuito se cierra.
+        """
+        if isinstance(error, CircuitOpenError):
+            return False
+        if not is_transient_error(error):
+            self.breaker(deployment).record_answered()
+            return False
+        self.breaker(deployment).record_failure()
+        return True
+
+    def release(self, deployment: str) -> None:
+        """La llamada se canceló sin resultado (Ctrl+C, generador cerrado...): libera la prueba del circuito."""
+        self.breaker(deployment).release_probe()
+
+    def retry_delay(
+        self, deployment: str, error: BaseException, retry: int, *, retry_throttled: bool = True
+    ) -> float | None:
+        """Registra el fallo y devuelve cuánto esperar antes de reintentar (``None`` = no reintentar).
+
+        Con ``retry_throttled=False`` los 429 no se reintentan aquí (el llamador pasa a otro deployment).
+        Los errores no transitorios (p. ej. 400) no cuentan para el circuit breaker.
+        """
+        if not self.record_failure(deployment, error):
+            return None
+        breaker = self.breaker(deployment)
+        if retry >= self._max_retries or breaker.state != CLOSED:
+            return None
+        if not retry_throttled and is_throttling_error(error):
+            return None
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            if retry_after > self._max_retry_after:
+                # Esperar tanto bloquearía el turno: mejor fallar (o pasar a otro deployment).
+                return None
+            self._count(deployment, "retry_after_waits")
+            delay = retry_after
+        else:
+            delay = min(self._max_delay, self._base_delay * 2**retry) * random.uniform(0.5, 1.0)
+        self._count(deployment, "retries")
+        logger.warning("[RESILIENCE] Error transitorio en '%s' (%s); reintento en %.2f s.", deployment, error, delay)
+        return delay
+
+    async def call(
+        self,
+        deployment: str,
+        operation: Callable[[], Awaitable[T]],
+        *,
+        hedge: bool = False,
+        retry_throttled: bool = True,
+    ) -> T:
+        """Ejecuta ``operation`` con circuit breaker y reintentos; ``hedge`` solo para operaciones idempotentes."""
+        retry = 0
+        while True:
+            self.before_call(deployment)
+            try:
+                if hedge and self._hedge_after > 0:
+                    result = await self._hedged(deployment, operation)
+                else:
+                    result = await operation()
+            except Exception as e:
+                delay = self.retry_delay(deployment, e, retry, retry_throttled=retry_throttled)
+                if delay is None:
+                    raise
+                retry += 1
+                await self._sleep(delay)
+                continue
+            except BaseException:
+                # CancelledError/GeneratorExit no son Exception: sin esto la prueba quedaría ocupada para siempre.
+                self.release(deployment)
+                raise
+            self.record_success(deployment)
+            return result
+
+    async def _hedged(self, deployment: str, operation: Callable[[], Awaitable[T]]) -> T:
+        """Lanza una segunda petición si la primera tarda más que el umbral; gana la primera que termine bien."""
+        primary = asyncio.ensure_future(operation())
+        done, _ = await asyncio.wait({primary}, timeout=self._hedge_after)
+        if done:
+            return primary.result()
+        self._count(deployment, "hedges")
+        secondary = asyncio.ensure_future(operation())
+        pending = {primary, secondary}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            self._count(deployment, "hedges_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Estado del circuit breaker y contadores de reintentos y *hedging* por deployment."""
+        return {
+            deployment: {**breaker.snapshot(), **self._counters.get(deployment, {})}
+            for deployment, breaker in self._breakers.items()
+        }
+
+
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "ResiliencePolicy",
+    "is_transient_error",
+    "retry_after_seconds",
+]
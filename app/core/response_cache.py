@@ -0,0 +1,142 @@
+"""Caché de respuestas para preguntas sin estado (primer turno o marcadas como ``stateless``).
+
+La respuesta de un primer turno no depende del historial, así que una pregunta
+repetida puede contestarse sin llamar a ``agent.run``. La clave combina el texto
+normalizado con un *scope* (deployment + versión del prompt) para invalidar
+automáticamente al cambiar de modelo o de instrucciones.
+
+Por defecto solo se sirven coincidencias exactas. La búsqueda de variantes casi
+idénticas (índice TF-IDF de n-gramas) es opcional: dos preguntas muy parecidas pueden
+pedir cosas distintas ("ventas de 2023" frente a "ventas de 2024", "funciona" frente a
+"no funciona"), así que, aun activada, solo se acepta una variante con los mismos
+números y las mismas negaciones que la pregunta cacheada.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from app.core.runtime_env import get_env_bool, get_env_float, get_env_int
+from app.core.similarity import SimilarityIndex
+from app.core.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Palabras (ya normalizadas) que invierten el sentido de la pregunta.
+NEGATION_WORDS = frozenset(
+    "no ni nunca jamas tampoco sin nada nadie ningun ninguna ninguno not never without none nor".split()
+)
+
+
+def _meaning_tokens(normalized: str) -> tuple[str, ...]:
+    """Números y negaciones de una pregunta normalizada: deben coincidir para aceptar una variante."""
+    return tuple(
+        sorted(token for token in normalized.split() if token in NEGATION_WORDS or any(ch.isdigit() for ch in token))
+    )
+
+
+class ResponseCache:
+    """Caché LRU + TTL con búsqueda exacta y por similitud dentro de cada scope."""
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = 900.0,
+        max_entries: int = 512,
+        similarity_threshold: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries debe ser mayor que 0.")
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        # Un umbral <= 0 desactiva la búsqueda por similitud y deja solo la coincidencia exacta.
+        self._similarity_threshold = similarity_threshold
+        self._clock = clock
+        self._entries: OrderedDict[tuple[str, str], tuple[float, str]] = OrderedDict()
+        self._indexes: dict[str, SimilarityIndex] = {}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache | None":
+        """Construye la caché desde ``RESPONSE_CACHE_*``; devuelve ``None`` si está desactivada."""
+        if not get_env_bool("RESPONSE_CACHE_ENABLED", True):
+            return None
+        return cls(
+            ttl_seconds=get_env_float("RESPONSE_CACHE_TTL_SECONDS", 900.0),
+            max_entries=get_env_int("RESPONSE_CACHE_MAX_ENTRIES", 512),
+            similarity_threshold=get_env_float("RESPONSE_CACHE_SIMILARITY", 0.0),
+        )
+
+    def get(self, text: str, scope: str) -> str | None:
+        """Devuelve la respuesta cacheada para ``text`` (exacta o casi idéntica) si sigue vigente."""
+        now = self._clock()
+        key = (scope, normalize_text(text))
+        response = self._lookup(key, now)
+        if response is not None:
+            self.exact_hits += 1
+            return response
+
+        index = self._indexes.get(scope)
+        if self._similarity_threshold > 0 and index is not None:
+            match = index.best_match(key[1])
+            if (
+                match is not None
+                and match[1] >= self._similarity_threshold
+                and _meaning_tokens(match[0][1]) == _meaning_tokens(key[1])
+            ):
+                response = self._lookup(match[0], now)
+                if response is not None:
+                    logger.debug("[RESPONSE_CACHE] Coincidencia aproximada (similitud=%.3f)", match[1])
+                    self.near_hits += 1
+                    return response
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, scope: str, response: str) -> None:
+        """Guarda la respuesta de una pregunta sin estado."""
+        key = (scope, normalize_text(text))
+        if not key[1]:
+            return
+        self._entries[key] = (self._clock() + self._ttl_seconds, response)
+        self._entries.move_to_end(key)
+        self._indexes.setdefault(scope, SimilarityIndex()).add(key, key[1])
+        while len(self._entries) > self._max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            self._drop_from_index(oldest)
+
+    def stats(self) -> dict[str, int]:
+        """Contadores de aciertos exactos, aproximados y fallos."""
+        return {
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+    def _lookup(self, key: tuple[str, str], now: float) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[key]
+            self._drop_from_index(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _drop_from_index(self, key: tuple[str, str]) -> None:
+        index = self._indexes.get(key[0])
+        if index is not None:
+            index.remove(key)
+            if not len(index):
+                del self._indexes[key[0]]
+
+
+__all__ = ["ResponseCache"]
@@ -32,3 +32,39 @@ def load_local_env_if_needed(start_path: Path) -> Path | None:
     if env_file:
         load_dotenv(env_file)
     return env_file
+
+
+def get_env_str(name: str, default: str | None = None) -> str | None:
+    """Lee una variable de entorno de texto; si falta o está vacía devuelve ``default``."""
+    value = os.getenv(name, "").strip()
+    return value or default
+
+
+def get_env_int(name: str, default: int) -> int:
+    """Lee una variable de entorno entera; si falta o está vacía devuelve ``default``."""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise ValueError(f"La variable de entorno {name} debe ser un entero: {value!r}") from exc
+
+
+def get_env_float(name: str, default: float) -> float:
+    """Lee una variable de entorno numérica; si falta o está vacía devuelve ``default``."""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError as exc:
+        raise ValueError(f"La variable de entorno {name} debe ser numérica: {value!r}") from exc
+
+
+def get_env_bool(name: str, default: bool) -> bool:
+    """Lee una variable de entorno booleana (true/false, 1/0, yes/no, si/no)."""
+    value = os.getenv(name, "").strip().lower()
+    if not value:
+        return default
+    return value in {"1", "true", "yes", "si", "on"}
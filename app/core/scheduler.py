@@ -0,0 +1,116 @@
+"""Planificador de turnos: paralelo entre conversaciones, secuencial dentro de cada una.
+
+- Un candado por ``conversation_id`` garantiza que los turnos de una misma conversación
+  se ejecutan en orden de llegada y nunca compiten por su ``AgentThread``.
+- Un semáforo global limita los turnos en vuelo contra el backend de Foundry.
+- La cola de espera está acotada: si se llena, el turno se rechaza al momento con
+  ``SchedulerBusyError`` para que el canal responda "ocupado" sin acumular latencia.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from app.core.runtime_env import get_env_int
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SchedulerBusyError(RuntimeError):
+    """Se lanza cuando la cola de turnos en espera está llena."""
+
+
+class _KeyLock:
+    """Candado por conversación con contador de referencias para poder liberarlo."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class TurnScheduler:
+    """Ejecuta turnos con orden por conversación y control de admisión global."""
+
+    def __init__(self, *, max_concurrent_turns: int = 16, max_queued_turns: int = 64) -> None:
+        if max_concurrent_turns < 1:
+            raise ValueError("max_concurrent_turns debe ser mayor que 0.")
+        if max_queued_turns < 0:
+            raise ValueError("max_queued_turns no puede ser negativo.")
+        self._semaphore = asyncio.Semaphore(max_concurrent_turns)
+        self._max_queued_turns = max_queued_turns
+        self._locks: dict[str, _KeyLock] = {}
+        self._waiting = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "TurnScheduler":
+        """Construye el planificador leyendo ``TURN_MAX_CONCURRENCY`` y ``TURN_MAX_QUEUE``."""
+        return cls(
+            max_concurrent_turns=get_env_int("TURN_MAX_CONCURRENCY", 16),
+            max_queued_turns=get_env_int("TURN_MAX_QUEUE", 64),
+        )
+
+    async def run(self, key: str, turn: Callable[[], Awaitable[T]]) -> T:
+        """Ejecuta ``turn`` respetando el orden de ``key`` y el límite global de concurrencia."""
+        async with self._slot(key):
+            return await turn()
+
+    async def stream(self, key: str, turn: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Variante de ``run`` para turnos en streaming: el hueco se mantiene hasta agotar el iterador."""
+        async with self._slot(key):
+            async for item in turn():
+                yield item
+
+    @asynccontextmanager
+    async def _slot(self, key: str) -> AsyncIterator[None]:
+        """Reserva el turno de ``key`` y un hueco global; rechaza si la cola está llena."""
+        if self._waiting >= self._max_queued_turns and self._semaphore.locked():
+            self._rejected += 1
+            logger.warning("[SCHEDULER] Cola llena (%s en espera); turno rechazado.", self._waiting)
+            raise SchedulerBusyError("Demasiados turnos en espera.")
+
+        key_lock = self._locks.get(key)
+        if key_lock is None:
+            key_lock = self._locks[key] = _KeyLock()
+        key_lock.users += 1
+        self._waiting += 1
+        admitted = False
+        try:
+            async with key_lock.lock:
+                async with self._semaphore:
+                    self._waiting -= 1
+                    admitted = True
+                    self._in_flight += 1
+                    try:
+                        yield
+                    finally:
+                        self._in_flight -= 1
+                        self._completed += 1
+        finally:
+            if not admitted:
+                self._waiting -= 1
+            key_lock.users -= 1
+            if key_lock.users == 0:
+                del self._locks[key]
+
+    def stats(self) -> dict[str, int]:
+        """Métricas del planificador para diagnóstico."""
+        return {
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "active_conversations": len(self._locks),
+        }
+
+
+__all__ = ["TurnScheduler", "SchedulerBusyError"]
@@ -0,0 +1,175 @@
+"""Caché TTL/LRU de resultados de web search.
+
+``HostedWebSearchTool`` se ejecuta en el servicio (Foundry/Bing), así que no hay
+una llamada local que envolver: lo que se cachea son los resultados que el servicio
+devuelve como citas (título, URL y fragmento), no la respuesta que el modelo
+redactó con ellos. Ante una consulta equivalente dentro del TTL, el agente
+responde con esos resultados como contexto y sin la tool de búsqueda.
+
+La clave combina la consulta normalizada y el bloque ``user_location`` de la tool,
+porque la misma pregunta puede tener respuestas distintas según la ubicación.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Mapping
+
+from app.core.runtime_env import get_env_bool, get_env_float, get_env_int, get_env_str
+from app.core.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def extract_web_citations(response: Any) -> list[dict[str, str]]:
+    """Devuelve las fuentes (title/url y, si lo hay, snippet) citadas en una respuesta, sin duplicados."""
+    citations: list[dict[str, str]] = []
+    seen: set[str] = set()
+    for message in getattr(response, "messages", None) or []:
+        for content in message.contents:
+            for annotation in getattr(content, "annotations", None) or []:
+                url = annotation.get("url")
+                if url and url not in seen:
+                    seen.add(url)
+                    citation = {"title": annotation.get("title") or url, "url": url}
+                    if annotation.get("snippet"):
+                        citation["snippet"] = annotation["snippet"]
+                    citations.append(citation)
+    return citations
+
+
+def format_search_results(citations: list[dict[str, str]]) -> str:
+    """Compone el texto que se cachea: un resultado por fuente, con su fragmento si lo hay."""
+    lines = []
+    for citation in citations:
+        lines.append(f"- {citation['title']}: {citation['url']}")
+        if citation.get("snippet"):
+            lines.append(f"  {citation['snippet']}")
+    return "\n".join(lines)
+
+
+class WebSearchCache:
+    """Caché en memoria (LRU + TTL) con respaldo opcional en SQLite para sobrevivir a reinicios."""
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = 600.0,
+        max_entries: int = 512,
+        disk_path: str | Path | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries debe ser mayor que 0.")
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_path:
+            self._open_disk(Path(disk_path))
+
+    @classmethod
+    def from_env(cls) -> "WebSearchCache | None":
+        """Construye la caché desde ``WEB_SEARCH_CACHE_*``; devuelve ``None`` si está desactivada."""
+        if not get_env_bool("WEB_SEARCH_CACHE_ENABLED", True):
+            return None
+        return cls(
+            ttl_seconds=get_env_float("WEB_SEARCH_CACHE_TTL_SECONDS", 600.0),
+            max_entries=get_env_int("WEB_SEARCH_CACHE_MAX_ENTRIES", 512),
+            disk_path=get_env_str("WEB_SEARCH_CACHE_PATH"),
+        )
+
+    @staticmethod
+    def make_key(query: str, user_location: Mapping[str, Any] | None) -> str:
+        """Clave estable a partir de la consulta normalizada y la ubicación del usuario."""
+        location = json.dumps(dict(user_location or {}), sort_keys=True, ensure_ascii=False)
+        raw = f"{normalize_text(query)}\x1f{location}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, query: str, user_location: Mapping[str, Any] | None) -> str | None:
+        """Devuelve el resultado cacheado si existe y no ha caducado."""
+        key = self.make_key(query, user_location)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                self._forget(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, query: str, user_location: Mapping[str, Any] | None, result: str) -> None:
+        """Guarda el resultado de una búsqueda durante el TTL configurado."""
+        key = self.make_key(query, user_location)
+        entry = (self._clock() + self._ttl_seconds, result)
+        self._remember(key, entry)
+        if self._db is not None:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO web_search_cache (key, expires_at, result) VALUES (?, ?, ?)",
+                    (key, entry[0], entry[1]),
+                )
+
+    def stats(self) -> dict[str, int]:
+        """Contadores de aciertos/fallos para medir el ahorro de búsquedas."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, entry: tuple[float, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            with self._db:
+                self._db.execute("DELETE FROM web_search_cache WHERE key = ?", (key,))
+
+    def _open_disk(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS web_search_cache "
+                "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, result TEXT NOT NULL)"
+            )
+            # Las entradas caducadas de ejecuciones anteriores no sirven: se purgan al abrir.
+            self._db.execute("DELETE FROM web_search_cache WHERE expires_at <= ?", (self._clock(),))
+        logger.info("[OK] Caché de web search persistente en %s", path)
+
+    def _read_disk(self, key: str) -> tuple[float, str] | None:
+        row = self._db.execute(
+            "SELECT expires_at, result FROM web_search_cache WHERE key = ?", (key,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+
+__all__ = ["WebSearchCache", "extract_web_citations", "format_search_results"]
@@ -0,0 +1,364 @@
+"""Estado de conversación aislado por ``conversation_id``.
+
+Cada conversación (un chat de Teams/Copilot, o la sesión única del CLI) tiene
+su propio ``AgentThread`` y su propia aprobación pendiente. El gestor aplica
+expulsión LRU, caducidad por inactividad y un tope aproximado de memoria para
+que un único proceso pueda servir miles de conversaciones con RAM acotada.
+
+Con un ``StateStore`` configurado, cada sesión se persiste (hilo serializado,
+historial y aprobación pendiente) tras los turnos que la modifican. Antes de cada
+turno se compara la versión en memoria con la almacenada y se recarga si otro
+worker avanzó la conversación (o si no estaba en memoria). Así varios workers
+comparten conversaciones y un reinicio no las pierde; una sesión
+expulsada de memoria solo deja de estar en la caché local. Las sesiones con un turno
+en curso no se expulsan, para que ese turno llegue a persistirse.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from agent_framework import AgentThread, Content
+
+from app.core.runtime_env import get_env_float, get_env_int
+from app.core.state_store import NEW_ETAG, StateConflictError, StateStore
+from app.core.text_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONVERSATION_ID = "default"
+SESSION_KEY_PREFIX = "session/"
+
+
+@dataclass(frozen=True)
+class HistoryTurn:
+    """Turno registrado en el hilo actual (texto del usuario, respuesta y tokens estimados)."""
+
+    user: str
+    assistant: str
+    tokens: int
+
+
+@dataclass
+class ConversationSession:
+    """Estado de una conversación: hilo del agente, aprobación pendiente y métricas de uso.
+
+    ``turn_count`` y ``approx_bytes`` solo cuentan los turnos que llegaron al hilo del agente
+    (no las respuestas locales ni las servidas desde caché).
+
+    ``history`` y ``history_tokens`` describen lo que contiene el hilo actual; tras una
+    compactación, ``synopsis`` resume los turnos anteriores y ``seed_pending`` indica que el
+    siguiente turno debe sembrar el hilo nuevo con el resumen y la ventana reciente.
+
+    ``approval_requested_at`` (epoch) es el momento en que se pidió la aprobación pendiente;
+    mide cuánto espera una tool a que el usuario responda. ``pending_approval_tier`` y
+    ``pending_approval_tools`` son el tier y las tools (por nombre) del turno que la pidió:
+    la continuación tras aprobarla va al mismo deployment con las mismas tools.
+
+    ``dirty`` marca cambios pendientes de persistir y ``etag`` la versión almacenada
+    sobre la que se hicieron (control de concurrencia optimista entre workers); una sesión
+    creada en este proceso usa ``NEW_ETAG`` para no pisar la que otro worker guarde antes.
+
+    ``active_turns`` cuenta los turnos en curso; mientras sea mayor que 0 la sesión no se expulsa.
+    """
+
+    conversation_id: str
+    thread: AgentThread
+    pending_approval: Content | None = None
+    pending_approval_tier: str | None = None
+    pending_approval_tools: list[str] = field(default_factory=list)
+    approval_requested_at: float | None = None
+    turn_count: int = 0
+    approx_bytes: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    history: list[HistoryTurn] = field(default_factory=list)
+    history_tokens: int = 0
+    synopsis: str | None = None
+    seed_pending: bool = False
+    dirty: bool = False
+    etag: str | None = None
+    active_turns: int = 0
+
+
+class SessionManager:
+    """Almacén LRU de sesiones con caducidad por inactividad y tope de memoria.
+
+    - ``max_sessions``: número máximo de conversaciones residentes.
+    - ``idle_ttl_seconds``: una conversación sin actividad durante este tiempo se expulsa.
+    - ``max_memory_bytes``: tope aproximado (texto acumulado de los turnos) para el total
+      de sesiones; al superarlo se expulsan las menos usadas recientemente.
+    """
+
+    def __init__(
+        self,
+        thread_factory: Callable[[], AgentThread],
+        *,
+        store: StateStore | None = None,
+        thread_loader: Callable[[dict[str, Any]], Awaitable[AgentThread]] | None = None,
+        max_sessions: int = 1000,
+        idle_ttl_seconds: float = 3600.0,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_sessions < 1:
+            raise ValueError("max_sessions debe ser mayor que 0.")
+        if store is not None and thread_loader is None:
+            raise ValueError("Para persistir sesiones hace falta un thread_loader que deserialice los hilos.")
+        self._thread_factory = thread_factory
+        self._store = store
+        self._thread_loader = thread_loader
+        self._max_sessions = max_sessions
+        self._idle_ttl_seconds = idle_ttl_seconds
+        self._max_memory_bytes = max_memory_bytes
+        self._clock = clock
+        self._sessions: OrderedDict[str, ConversationSession] = OrderedDict()
+        self._total_bytes = 0
+        self._evictions = 0
+        self._conflicts = 0
+
+    @classmethod
+    def from_env(
+        cls,
+        thread_factory: Callable[[], AgentThread],
+        *,
+        store: StateStore | None = None,
+        thread_loader: Callable[[dict[str, Any]], Awaitable[AgentThread]] | None = None,
+    ) -> "SessionManager":
+        """Construye el gestor leyendo los límites de las variables ``SESSION_*``."""
+        return cls(
+            thread_factory,
+            store=store,
+            thread_loader=thread_loader,
+            max_sessions=get_env_int("SESSION_MAX_COUNT", 1000),
+            idle_ttl_seconds=get_env_float("SESSION_IDLE_TTL_SECONDS", 3600.0),
+            max_memory_bytes=int(get_env_float("SESSION_MAX_MEMORY_MB", 256.0) * 1024 * 1024),
+        )
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._sessions
+
+    def get(self, conversation_id: str) -> ConversationSession:
+        """Devuelve la sesión de la conversación, creándola si no existe."""
+        now = self._clock()
+        self._evict_idle(now)
+
+        session = self._sessions.get(conversation_id)
+        if session is None:
+            session = ConversationSession(
+                conversation_id=conversation_id,
+                thread=self._thread_factory(),
+                last_used=now,
+                etag=NEW_ETAG if self._store is not None else None,
+            )
+            self._sessions[conversation_id] = session
+            logger.debug("Sesión creada para la conversación %s", conversation_id)
+            self._enforce_limits()
+        else:
+            session.last_used = now
+            self._sessions.move_to_end(conversation_id)
+        return session
+
+    def reset(self, conversation_id: str) -> ConversationSession:
+        """Reinicia el historial de la conversación con un hilo nuevo."""
+        session = self.get(conversation_id)
+        self._total_bytes -= session.approx_bytes
+        session.thread = self._thread_factory()
+        session.pending_approval = None
+        session.pending_approval_tier = None
+        session.pending_approval_tools = []
+        session.approval_requested_at = None
+        session.turn_count = 0
+        session.approx_bytes = 0
+        session.history = []
+        session.history_tokens = 0
+        session.synopsis = None
+        session.seed_pending = False
+        session.dirty = True
+        return session
+
+    def rebase(self, session: ConversationSession, thread: AgentThread, synopsis: str, keep_turns: int) -> None:
+        """Sustituye el hilo por uno nuevo que partirá del resumen y de los ``keep_turns`` últimos turnos."""
+        retained = session.history[-keep_turns:] if keep_turns > 0 else []
+        retained_bytes = len(synopsis.encode("utf-8")) + sum(
+            len(turn.user.encode("utf-8")) + len(turn.assistant.encode("utf-8")) for turn in retained
+        )
+        if self._sessions.get(session.conversation_id) is session:
+            self._total_bytes += retained_bytes - session.approx_bytes
+        session.thread = thread
+        session.history = list(retained)
+        session.history_tokens = estimate_tokens(synopsis) + sum(turn.tokens for turn in retained)
+        session.approx_bytes = retained_bytes
+        session.synopsis = synopsis
+        session.seed_pending = True
+        session.dirty = True
+
+    def begin_turn(self, session: ConversationSession) -> None:
+        """Marca un turno en curso: la sesión no se expulsa hasta el ``end_turn`` correspondiente."""
+        session.active_turns += 1
+
+    def end_turn(self, session: ConversationSession) -> None:
+        """Cierra un turno abierto con ``begin_turn`` y aplica los límites que se aplazaron por él."""
+        session.active_turns -= 1
+        if session.active_turns == 0 and self._sessions.get(session.conversation_id) is session:
+            self._enforce_limits()
+
+    def discard(self, conversation_id: str) -> None:
+        """Elimina la sesión (si existe) y libera su estado."""
+        session = self._sessions.pop(conversation_id, None)
+        if session is not None:
+            self._total_bytes -= session.approx_bytes
+
+    def record_turn(
+        self, session: ConversationSession, user_text: str, response_text: str, *, in_thread: bool = True
+    ) -> None:
+        """Contabiliza un turno completado en el tamaño aproximado de la sesión."""
+        if not in_thread:
+            return
+        turn_bytes = len(user_text.encode("utf-8")) + len(response_text.encode("utf-8"))
+        turn = HistoryTurn(user_text, response_text, estimate_tokens(user_text) + estimate_tokens(response_text))
+        session.turn_count += 1
+        session.approx_bytes += turn_bytes
+        session.history.append(turn)
+        session.history_tokens += turn.tokens
+        session.dirty = True
+        if self._sessions.get(session.conversation_id) is session:
+            self._sessions.move_to_end(session.conversation_id)
+            self._total_bytes += turn_bytes
+            self._enforce_limits()
+
+    async def hydrate(self, conversation_id: str) -> None:
+        """Carga la sesión desde el almacén si no está en memoria o si la copia local quedó obsoleta.
+
+        Sin afinidad, otro worker puede haber respondido turnos de la conversación: el etag
+        almacenado (leído del backend, sin la caché de lectura) se compara con el de la copia
+        local y, si cambió, la sesión se sustituye antes de atender el turno.
+        """
+        if self._store is None:
+            return
+        records = await self._store.read([SESSION_KEY_PREFIX + conversation_id], fresh=True)
+        record = records.get(SESSION_KEY_PREFIX + conversation_id)
+        if record is None:
+            return
+        snapshot, etag = record
+        current = self._sessions.get(conversation_id)
+        if current is not None and (current.etag == etag or current.active_turns):
+            return
+        pending = snapshot.get("pending_approval")
+        session = ConversationSession(
+            conversation_id=conversation_id,
+            thread=await self._thread_loader(snapshot["thread"]),
+            pending_approval=Content.from_dict(pending) if pending else None,
+            pending_approval_tier=snapshot.get("pending_approval_tier"),
+            pending_approval_tools=snapshot.get("pending_approval_tools", []),
+            approval_requested_at=snapshot.get("approval_requested_at"),
+            turn_count=snapshot.get("turn_count", 0),
+            approx_bytes=snapshot.get("approx_bytes", 0),
+            last_used=self._clock(),
+            history=[HistoryTurn(*turn) for turn in snapshot.get("history", [])],
+            history_tokens=snapshot.get("history_tokens", 0),
+            synopsis=snapshot.get("synopsis"),
+            seed_pending=snapshot.get("seed_pending", False),
+            etag=etag,
+        )
+        if self._sessions.get(conversation_id) is not current:
+            # Mientras se deserializaba el hilo otro turno ya cargó o creó la sesión.
+            return
+        if current is not None:
+            logger.debug("Sesión %s obsoleta (otro worker la modificó); se recarga del almacén", conversation_id)
+            self.discard(conversation_id)
+        self._sessions[conversation_id] = session
+        self._total_bytes += session.approx_bytes
+        logger.debug("Sesión %s recuperada del almacén de estado", conversation_id)
+        self._enforce_limits()
+
+    async def persist(self, session: ConversationSession) -> None:
+        """Guarda la sesión si tiene cambios; ante un conflicto descarta la copia local.
+
+        El conflicto indica que otro worker avanzó (o creó) la conversación: el turno de esta
+        copia se pierde, se registra un aviso y el turno siguiente vuelve a cargar la versión
+        almacenada.
+        """
+        if self._store is None or not session.dirty or self._sessions.get(session.conversation_id) is not session:
+            return
+        key = SESSION_KEY_PREFIX + session.conversation_id
+        snapshot = {
+            "thread": await session.thread.serialize(),
+            "pending_approval": session.pending_approval.to_dict() if session.pending_approval is not None else None,
+            "pending_approval_tier": session.pending_approval_tier,
+            "pending_approval_tools": session.pending_approval_tools,
+            "approval_requested_at": session.approval_requested_at,
+            "turn_count": session.turn_count,
+            "approx_bytes": session.approx_bytes,
+            "history": [[turn.user, turn.assistant, turn.tokens] for turn in session.history],
+            "history_tokens": session.history_tokens,
+            "synopsis": session.synopsis,
+            "seed_pending": session.seed_pending,
+        }
+        try:
+            etags = await self._store.write({key: (snapshot, session.etag)})
+        except StateConflictError:
+            self._conflicts += 1
+            logger.warning(
+                "Conflicto al guardar la sesión %s: otro worker la modificó y se descarta el último turno; "
+                "se recargará del almacén.",
+                session.conversation_id,
+            )
+            self.discard(session.conversation_id)
+            return
+        session.etag = etags[key]
+        session.dirty = False
+
+    def stats(self) -> dict[str, int]:
+        """Métricas del gestor para diagnóstico."""
+        return {
+            "sessions": len(self._sessions),
+            "approx_bytes": self._total_bytes,
+            "evictions": self._evictions,
+            "conflicts": self._conflicts,
+        }
+
+    def _evict_idle(self, now: float) -> None:
+        # El OrderedDict está en orden de último uso: basta con recorrer desde el principio
+        # hasta encontrar la primera sesión todavía activa (las que tienen un turno en curso se saltan).
+        expired = []
+        for conversation_id, session in self._sessions.items():
+            if now - session.last_used < self._idle_ttl_seconds:
+                break
+            if session.active_turns == 0:
+                expired.append(conversation_id)
+        for conversation_id in expired:
+            self._evict(conversation_id, reason="inactividad")
+
+    def _over_limits(self) -> bool:
+        return len(self._sessions) > self._max_sessions or self._total_bytes > self._max_memory_bytes
+
+    def _enforce_limits(self) -> None:
+        # Nunca se expulsa la sesión más reciente ni las que tienen un turno en curso: si solo
+        # quedan esas, el tope se supera temporalmente y se vuelve a aplicar en ``end_turn``.
+        if not self._over_limits():
+            return
+        candidates = [
+            conversation_id for conversation_id, session in self._sessions.items() if session.active_turns == 0
+        ]
+        newest = next(reversed(self._sessions))
+        for conversation_id in candidates:
+            if not self._over_limits():
+                break
+            if conversation_id != newest:
+                self._evict(conversation_id, reason="capacidad")
+
+    def _evict(self, conversation_id: str, *, reason: str) -> None:
+        session = self._sessions.pop(conversation_id)
+        self._total_bytes -= session.approx_bytes
+        self._evictions += 1
+        logger.debug("Sesión %s expulsada por %s", conversation_id, reason)
+
+
+__all__ = ["ConversationSession", "HistoryTurn", "SESSION_KEY_PREFIX", "SessionManager", "DEFAULT_CONVERSATION_ID"]
@@ -0,0 +1,97 @@
+"""Índice de similitud TF-IDF de n-gramas de caracteres, vectorizado con NumPy.
+
+Se usa para detectar textos casi idénticos (variantes de una misma pregunta con
+erratas, puntuación u orden ligeramente distinto) sin depender de un servicio de
+embeddings. Los n-gramas se proyectan con *hashing* a un espacio de dimensión
+fija, por lo que no hace falta mantener un vocabulario.
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Hashable, Iterable
+
+import numpy as np
+
+from app.core.text_utils import normalize_text
+
+
+def char_ngrams(text: str, sizes: Iterable[int] = (3, 4)) -> list[str]:
+    """N-gramas de caracteres del texto normalizado, con bordes marcados por espacios."""
+    padded = f" {normalize_text(text)} "
+    grams: list[str] = []
+    for size in sizes:
+        grams.extend(padded[i : i + size] for i in range(max(len(padded) - size + 1, 0)))
+    return grams
+
+
+class SimilarityIndex:
+    """Índice en memoria: añade/elimina textos por clave y devuelve el más parecido (coseno TF-IDF)."""
+
+    def __init__(self, *, dim: int = 4096, ngram_sizes: tuple[int, ...] = (3, 4), initial_capacity: int = 64) -> None:
+        self._dim = dim
+        self._ngram_sizes = ngram_sizes
+        self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._doc_freq = np.zeros(dim, dtype=np.float32)
+        self._keys: list[Hashable | None] = []
+        self._row_of: dict[Hashable, int] = {}
+        self._free_rows: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def vectorize(self, text: str) -> np.ndarray:
+        """Vector de frecuencias (tf sublineal) de los n-gramas del texto."""
+        grams = char_ngrams(text, self._ngram_sizes)
+        if not grams:
+            return np.zeros(self._dim, dtype=np.float32)
+        indices = np.fromiter((zlib.crc32(g.encode("utf-8")) % self._dim for g in grams), dtype=np.int64, count=len(grams))
+        counts = np.bincount(indices, minlength=self._dim).astype(np.float32)
+        return np.log1p(counts, out=counts)
+
+    def add(self, key: Hashable, text: str) -> None:
+        """Indexa ``text`` bajo ``key`` (sustituye la entrada previa con la misma clave)."""
+        self.remove(key)
+        vector = self.vectorize(text)
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._keys[row] = key
+        else:
+            row = len(self._keys)
+            if row == self._matrix.shape[0]:
+                self._matrix = np.vstack([self._matrix, np.zeros_like(self._matrix)])
+            self._keys.append(key)
+        self._matrix[row] = vector
+        self._doc_freq += vector > 0
+        self._row_of[key] = row
+
+    def remove(self, key: Hashable) -> None:
+        row = self._row_of.pop(key, None)
+        if row is None:
+            return
+        self._doc_freq -= self._matrix[row] > 0
+        self._matrix[row] = 0.0
+        self._keys[row] = None
+        self._free_rows.append(row)
+
+    def best_match(self, text: str) -> tuple[Hashable, float] | None:
+        """Devuelve ``(clave, similitud)`` del texto indexado más parecido, o ``None`` si está vacío."""
+        if not self._row_of:
+            return None
+        used = len(self._keys)
+        idf = np.log((1.0 + len(self._row_of)) / (1.0 + self._doc_freq)) + 1.0
+        query = self.vectorize(text) * idf
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0.0:
+            return None
+        weighted = self._matrix[:used] * idf
+        norms = np.linalg.norm(weighted, axis=1)
+        norms[norms == 0.0] = np.inf
+        scores = (weighted @ query) / (norms * query_norm)
+        row = int(np.argmax(scores))
+        if self._keys[row] is None:
+            return None
+        return self._keys[row], float(scores[row])
+
+
+__all__ = ["SimilarityIndex", "char_ngrams"]
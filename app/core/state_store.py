@@ -0,0 +1,349 @@
+"""Almacén de estado duradero compartido entre procesos (sesiones y estado del canal).
+
+Sustituye al estado en memoria para poder servir el mismo conjunto de
+conversaciones desde varios workers y sobrevivir a reinicios. Se compone de:
+
+- un *backend* clave/valor con control de concurrencia optimista por etag
+  (``SqliteStateBackend`` en modo WAL; ``RedisStateBackend`` como alternativa
+  para despliegues con varias instancias);
+- ``StateStore``, que añade una caché de lectura para las conversaciones activas
+  y agrupa en una sola transacción las escrituras concurrentes (*group commit*).
+
+``STATE_STORE_URL`` selecciona el backend: ``sqlite:///ruta/estado.db`` o
+``redis://host:6379/0``. Vacío desactiva la persistencia (estado en memoria).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Protocol
+
+from app.core.runtime_env import get_env_float, get_env_int, get_env_str
+
+logger = logging.getLogger(__name__)
+
+# Un etag esperado "*" (o None) escribe sin comprobar la versión almacenada.
+ANY_ETAG = "*"
+# Un etag esperado "0" solo escribe si la clave todavía no existe (creación sin carreras).
+NEW_ETAG = "0"
+
+
+class StateConflictError(RuntimeError):
+    """Otra escritura modificó las claves desde que se leyeron (etag obsoleto)."""
+
+    def __init__(self, keys: list[str]) -> None:
+        super().__init__(f"Conflicto de concurrencia al escribir: {', '.join(keys)}")
+        self.keys = keys
+
+
+class StateBackend(Protocol):
+    """Backend clave/valor con etags. Los valores son documentos JSON serializados."""
+
+    async def read_many(self, keys: list[str]) -> dict[str, tuple[str, str]]:
+        """Devuelve ``{clave: (valor, etag)}``; las claves inexistentes se omiten."""
+        ...
+
+    async def write_many(self, items: list[tuple[str, str, str | None]]) -> list[str | None]:
+        """Escribe ``(clave, valor, etag_esperado)`` en orden; devuelve el etag nuevo o ``None`` si hubo conflicto."""
+        ...
+
+    async def delete_many(self, keys: list[str]) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class SqliteStateBackend:
+    """Backend SQLite en modo WAL: lectores concurrentes y un escritor por transacción entre procesos."""
+
+    def __init__(self, path: str | Path, *, busy_timeout_ms: int = 5000) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None: las transacciones se abren explícitamente con BEGIN IMMEDIATE.
+        self._db = sqlite3.connect(str(self._path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS agent_state "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        logger.info("[OK] Almacén de estado SQLite (WAL) en %s", self._path)
+
+    async def read_many(self, keys: list[str]) -> dict[str, tuple[str, str]]:
+        return await asyncio.to_thread(self._read_many, keys)
+
+    async def write_many(self, items: list[tuple[str, str, str | None]]) -> list[str | None]:
+        return await asyncio.to_thread(self._write_many, items)
+
+    async def delete_many(self, keys: list[str]) -> None:
+        await asyncio.to_thread(self._delete_many, keys)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _read_many(self, keys: list[str]) -> dict[str, tuple[str, str]]:
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, value, version FROM agent_state WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        return {key: (value, str(version)) for key, value, version in rows}
+
+    def _write_many(self, items: list[tuple[str, str, str | None]]) -> list[str | None]:
+        results: list[str | None] = []
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE toma el bloqueo de escritura: la comprobación del etag y la escritura
+            # son atómicas también frente a otros procesos.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key, value, expected in items:
+                    row = self._db.execute("SELECT version FROM agent_state WHERE key = ?", (key,)).fetchone()
+                    current = row[0] if row else None
+                    if expected == NEW_ETAG:
+                        conflict = current is not None
+                    else:
+                        conflict = expected not in (None, ANY_ETAG) and (current is None or str(current) != expected)
+                    if conflict:
+                        results.append(None)
+                        continue
+                    version = (current or 0) + 1
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO agent_state (key, value, version, updated_at) VALUES (?, ?, ?, ?)",
+                        (key, value, version, now),
+                    )
+                    results.append(str(version))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return results
+
+    def _delete_many(self, keys: list[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM agent_state WHERE key = ?", [(key,) for key in keys])
+
+
+# Comprobación del etag y escritura atómicas en Redis (el script se ejecuta sin intercalarse con otros comandos).
+_REDIS_CAS_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'etag')
+if ARGV[2] == '0' then
+    if current then
+        return false
+    end
+elseif ARGV[2] ~= '' and ARGV[2] ~= '*' and current ~= ARGV[2] then
+    return false
+end
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('HSET', KEYS[1], 'value', ARGV[1], 'etag', tostring(version))
+return tostring(version)
+"""
+
+
+class RedisStateBackend:
+    """Backend Redis (o compatible) para varias instancias; requiere el paquete opcional ``redis``."""
+
+    def __init__(self, client: Any, *, namespace: str = "agent_state:") -> None:
+        self._client = client
+        self._namespace = namespace
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisStateBackend":
+        try:
+            from redis.asyncio import from_url
+        except ImportError as e:
+            raise ValueError("STATE_STORE_URL apunta a Redis pero el paquete 'redis' no está instalado.") from e
+        logger.info("[OK] Almacén de estado Redis configurado.")
+        return cls(from_url(url, decode_responses=True))
+
+    async def read_many(self, keys: list[str]) -> dict[str, tuple[str, str]]:
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(self._namespace + key, "value", "etag")
+        rows = await pipe.execute()
+        return {key: (value, etag) for key, (value, etag) in zip(keys, rows) if value is not None}
+
+    async def write_many(self, items: list[tuple[str, str, str | None]]) -> list[str | None]:
+        pipe = self._client.pipeline(transaction=False)
+        for key, value, expected in items:
+            pipe.eval(_REDIS_CAS_SCRIPT, 1, self._namespace + key, value, expected or "")
+        return [str(etag) if etag else None for etag in await pipe.execute()]
+
+    async def delete_many(self, keys: list[str]) -> None:
+        await self._client.delete(*(self._namespace + key for key in keys))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_state_backend(url: str) -> StateBackend:
+    """Crea el backend indicado por la URL (``sqlite:///ruta`` o ``redis://...``)."""
+    if url.startswith(("redis://", "rediss://")):
+        return RedisStateBackend.from_url(url)
+    if url.startswith("sqlite:///"):
+        return SqliteStateBackend(url[len("sqlite:///") :])
+    raise ValueError(f"STATE_STORE_URL no soportada: '{url}'. Usa sqlite:///ruta o redis://host:puerto/db.")
+
+
+class StateStore:
+    """Capa sobre el backend: caché de lectura LRU+TTL y escrituras agrupadas con etags.
+
+    Las escrituras que llegan dentro de ``batch_window_seconds`` se envían juntas al backend
+    (una transacción en SQLite, un *pipeline* en Redis). Cada elemento conserva su propia
+    comprobación de etag, así que un conflicto solo afecta a quien escribió esa clave.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        *,
+        cache_entries: int = 1024,
+        cache_ttl_seconds: float = 30.0,
+        batch_window_seconds: float = 0.005,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._backend = backend
+        self._cache_entries = cache_entries
+        self._cache_ttl_seconds = cache_ttl_seconds
+        self._batch_window_seconds = batch_window_seconds
+        self._clock = clock
+        self._cache: OrderedDict[str, tuple[float, str, str]] = OrderedDict()
+        self._pending: list[tuple[list[tuple[str, str, str | None]], asyncio.Future[list[str | None]]]] = []
+        self._flush_task: asyncio.Task[None] | None = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.writes = 0
+        self.batches = 0
+        self.conflicts = 0
+
+    @classmethod
+    def from_env(cls) -> "StateStore | None":
+        """Construye el almacén desde ``STATE_STORE_*``; devuelve ``None`` si no hay URL configurada."""
+        url = get_env_str("STATE_STORE_URL")
+        if not url:
+            return None
+        return cls(
+            create_state_backend(url),
+            cache_entries=get_env_int("STATE_STORE_CACHE_ENTRIES", 1024),
+            cache_ttl_seconds=get_env_float("STATE_STORE_CACHE_TTL_SECONDS", 30.0),
+            batch_window_seconds=get_env_float("STATE_STORE_BATCH_WINDOW_MS", 5.0) / 1000,
+        )
+
+    async def read(self, keys: list[str], *, fresh: bool = False) -> dict[str, tuple[Any, str]]:
+        """Devuelve ``{clave: (documento, etag)}`` leyendo primero de la caché.
+
+        Con ``fresh=True`` se lee siempre del backend (la caché puede no reflejar lo que otro
+        worker escribió durante su TTL) y el resultado la actualiza.
+        """
+        now = self._clock()
+        found: dict[str, tuple[str, str]] = {}
+        missing: list[str] = []
+        for key in keys:
+            entry = None if fresh else self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                found[key] = (entry[1], entry[2])
+                self.cache_hits += 1
+            else:
+                missing.append(key)
+        if missing:
+            self.cache_misses += len(missing)
+            loaded = await self._backend.read_many(missing)
+            for key, (value, etag) in loaded.items():
+                self._remember(key, value, etag)
+            found.update(loaded)
+        # Se devuelve una copia nueva en cada lectura: quien lee puede modificar el documento.
+        return {key: (json.loads(value), etag) for key, (value, etag) in found.items()}
+
+    async def write(self, items: dict[str, tuple[Any, str | None]]) -> dict[str, str]:
+        """Escribe ``{clave: (documento, etag_esperado)}`` y devuelve los etags nuevos.
+
+        Lanza ``StateConflictError`` con las claves cuyo etag esperado ya no es el vigente.
+        """
+        if not items:
+            return {}
+        batch = [(key, json.dumps(value, ensure_ascii=False), expected) for key, (value, expected) in items.items()]
+        future: asyncio.Future[list[str | None]] = asyncio.get_running_loop().create_future()
+        self._pending.append((batch, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        etags = await future
+
+        conflicts = [key for (key, _, _), etag in zip(batch, etags) if etag is None]
+        for (key, value, _), etag in zip(batch, etags):
+            if etag is None:
+                self._cache.pop(key, None)
+            else:
+                self._remember(key, value, etag)
+        if conflicts:
+            self.conflicts += len(conflicts)
+            raise StateConflictError(conflicts)
+        return {key: etag for (key, _, _), etag in zip(batch, etags)}
+
+    async def delete(self, keys: list[str]) -> None:
+        for key in keys:
+            self._cache.pop(key, None)
+        await self._backend.delete_many(keys)
+
+    def stats(self) -> dict[str, int]:
+        """Aciertos de la caché de lectura, escrituras, lotes enviados y conflictos de etag."""
+        return {
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cached_entries": len(self._cache),
+            "writes": self.writes,
+            "batches": self.batches,
+            "conflicts": self.conflicts,
+        }
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._backend.close()
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self._batch_window_seconds)
+        pending, self._pending = self._pending, []
+        self._flush_task = None
+        items = [item for batch, _ in pending for item in batch]
+        self.writes += len(items)
+        self.batches += 1
+        try:
+            etags = await self._backend.write_many(items)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for batch, future in pending:
+            if not future.done():
+                future.set_result(etags[offset : offset + len(batch)])
+            offset += len(batch)
+
+    def _remember(self, key: str, value: str, etag: str) -> None:
+        self._cache[key] = (self._clock() + self._cache_ttl_seconds, value, etag)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_entries:
+            self._cache.popitem(last=False)
+
+
+__all__ = [
+    "ANY_ETAG",
+    "NEW_ETAG",
+    "StateBackend",
+    "StateConflictError",
+    "SqliteStateBackend",
+    "RedisStateBackend",
+    "StateStore",
+    "create_state_backend",
+]
@@ -0,0 +1,183 @@
+"""Trazas y métricas OpenTelemetry de cada turno.
+
+``stage`` abre un span y, al cerrarlo, registra su duración en el histograma
+``app.stage.duration`` con el nombre de la etapa (``http_request``, ``routing``,
+``credential``, ``agent_run``, ``approval_wait``, ``send_activity``...), de modo que
+el p99 de cada tramo del turno se puede consultar por separado. ``record_usage``
+añade a un span los tokens del turno (atributos ``gen_ai.usage.*``) y los acumula
+en ``app.turn.tokens``.
+
+Sin ``OTEL_ENABLED`` la API de OpenTelemetry no tiene proveedores y todo esto es
+prácticamente gratis. ``configure_telemetry`` instala los proveedores con los
+exportadores de ``OTEL_EXPORTER`` (``otlp``, ``console`` o ``file`` para uso sin
+conexión) y activa además la instrumentación de agent_framework, que aporta los
+spans de ``agent.run``, de cada llamada al modelo y de cada tool con sus tokens.
+Debe llamarse al arrancar, antes de importar los módulos que registran tools.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Mapping
+
+from opentelemetry import metrics, trace
+
+from app.core.runtime_env import get_env_bool, get_env_str, load_local_env_if_needed
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_EXPORTERS = ("otlp", "console", "file")
+
+TRACER = trace.get_tracer("app")
+METER = metrics.get_meter("app")
+STAGE_DURATION = METER.create_histogram(
+    "app.stage.duration", unit="s", description="Duración de cada etapa del turno (HTTP, enrutado, LLM, envío...)."
+)
+TOKEN_USAGE = METER.create_histogram(
+    "app.turn.tokens", unit="{token}", description="Tokens de entrada y salida por llamada al agente."
+)
+APPROVAL_OUTCOMES = METER.create_counter(
+    "app.approval.outcomes", description="Aprobaciones de tools resueltas por el usuario."
+)
+
+
+def _file_exporters(path: str) -> list[Any]:
+    """Exportadores que escriben spans y métricas como JSON, una línea por elemento."""
+    from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # El fichero se mantiene abierto mientras viva el proceso (lo cierran los proveedores al apagar).
+    out = target.open("a", encoding="utf-8", buffering=1)
+    return [
+        ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n"),
+        ConsoleMetricExporter(out=out, formatter=lambda data: data.to_json(indent=None) + "\n"),
+    ]
+
+
+def configure_telemetry() -> bool:
+    """Instala los proveedores OpenTelemetry según ``OTEL_*``; devuelve si la telemetría quedó activa.
+
+    - ``OTEL_EXPORTER=otlp`` usa las variables estándar ``OTEL_EXPORTER_OTLP_*``.
+    - ``OTEL_EXPORTER=console`` escribe en la salida estándar.
+    - ``OTEL_EXPORTER=file`` escribe JSON por líneas en ``OTEL_FILE_PATH``.
+    """
+    # Se llama antes de importar el agente, que es quien carga normalmente el .env local.
+    load_local_env_if_needed(Path(__file__).resolve())
+    if not get_env_bool("OTEL_ENABLED", False):
+        return False
+    exporter = (get_env_str("OTEL_EXPORTER", "otlp") or "otlp").lower()
+    if exporter not in TELEMETRY_EXPORTERS:
+        raise ValueError(f"OTEL_EXPORTER debe ser uno de {', '.join(TELEMETRY_EXPORTERS)}; recibido '{exporter}'.")
+
+    from agent_framework.observability import configure_otel_providers
+
+    exporters: list[Any] = []
+    if exporter == "console":
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        exporters = [ConsoleSpanExporter(), ConsoleMetricExporter()]
+    elif exporter == "file":
+        exporters = _file_exporters(get_env_str("OTEL_FILE_PATH", "telemetry.jsonl"))
+    # Con otlp, agent_framework crea los exportadores a partir de OTEL_EXPORTER_OTLP_*.
+    configure_otel_providers(
+        exporters=exporters,
+        enable_sensitive_data=get_env_bool("OTEL_CAPTURE_CONTENT", False),
+    )
+    logger.info("[TELEMETRY] OpenTelemetry activo con exportador '%s'.", exporter)
+    return True
+
+
+@contextmanager
+def stage(
+    name: str, labels: Mapping[str, str] | None = None, *, activate: bool = True, **attributes: Any
+) -> Iterator[trace.Span]:
+    """Span de una etapa del turno cuya duración se registra en ``app.stage.duration``.
+
+    ``labels`` (valores de baja cardinalidad, p. ej. el deployment) se añaden al span y al
+    histograma; ``attributes`` solo al span. Con ``activate=False`` el span no pasa a ser el
+    actual: es lo que necesitan los generadores asíncronos, que ceden el control en mitad de
+    la etapa y no pueden dejar el contexto cambiado entre un ``yield`` y el siguiente.
+    """
+    metric_attributes = {"stage": name, **(labels or {})}
+    outcome = "ok"
+    start = time.perf_counter()
+    span = TRACER.start_span(name, attributes={**metric_attributes, **attributes})
+    try:
+        if activate:
+            with trace.use_span(span, end_on_exit=False, record_exception=False, set_status_on_exception=False):
+                yield span
+        else:
+            yield span
+    except BaseException as exc:
+        outcome = "error"
+        if isinstance(exc, Exception):
+            span.record_exception(exc)
+            span.set_status(trace.StatusCode.ERROR, str(exc))
+        raise
+    finally:
+        span.end()
+        STAGE_DURATION.record(time.perf_counter() - start, {**metric_attributes, "outcome": outcome})
+
+
+def client_trace_config(name: str) -> Any:
+    """``aiohttp.TraceConfig`` que registra cada petición saliente de la sesión como la etapa ``name``."""
+    from aiohttp import TraceConfig
+
+    async def on_request_start(_session: Any, context: Any, params: Any) -> None:
+        context.start = time.perf_counter()
+        context.span = TRACER.start_span(
+            name,
+            kind=trace.SpanKind.CLIENT,
+            attributes={"stage": name, "http.request.method": params.method, "url.path": params.url.path},
+        )
+
+    def finish(context: Any, outcome: str) -> None:
+        context.span.end()
+        STAGE_DURATION.record(time.perf_counter() - context.start, {"stage": name, "outcome": outcome})
+
+    async def on_request_end(_session: Any, context: Any, params: Any) -> None:
+        status = params.response.status
+        context.span.set_attribute("http.response.status_code", status)
+        if status >= 400:
+            context.span.set_status(trace.StatusCode.ERROR)
+        finish(context, "ok" if status < 400 else "error")
+
+    async def on_request_exception(_session: Any, context: Any, params: Any) -> None:
+        context.span.record_exception(params.exception)
+        context.span.set_status(trace.StatusCode.ERROR, str(params.exception))
+        finish(context, "error")
+
+    config = TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
+
+
+def record_usage(span: trace.Span, usage: Mapping[str, Any] | None, labels: Mapping[str, str] | None = None) -> None:
+    """Añade al span los tokens de la respuesta y los registra en ``app.turn.tokens``."""
+    if not usage:
+        return
+    for kind, key in (("input", "input_token_count"), ("output", "output_token_count")):
+        tokens = usage.get(key)
+        if tokens is None:
+            continue
+        span.set_attribute(f"gen_ai.usage.{kind}_tokens", tokens)
+        TOKEN_USAGE.record(tokens, {"token_type": kind, **(labels or {})})
+
+
+def record_approval(waited_seconds: float, approved: bool) -> None:
+    """Tiempo que una tool estuvo esperando la aprobación del usuario."""
+    outcome = "approved" if approved else "rejected"
+    STAGE_DURATION.record(waited_seconds, {"stage": "approval_wait", "outcome": outcome})
+    APPROVAL_OUTCOMES.add(1, {"outcome": outcome})
+    trace.get_current_span().add_event("approval_resolved", {"outcome": outcome, "waited_seconds": waited_seconds})
+
+
+__all__ = ["client_trace_config", "configure_telemetry", "record_approval", "record_usage", "stage"]
@@ -0,0 +1,24 @@
+"""Utilidades de normalización de texto compartidas por cachés, intents y routers."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza un texto: minúsculas, sin acentos ni puntuación y con espacios colapsados."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    without_accents = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", without_accents)).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token) sin depender de un tokenizador."""
+    return (len(text) + 3) // 4
+
+
+__all__ = ["normalize_text", "estimate_tokens"]
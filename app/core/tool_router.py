@@ -0,0 +1,164 @@
+"""Router declarativo de tools: registro en JSON compilado a un único patrón al arrancar.
+
+Cada ruta declara sus tools (por nombre), palabras clave, expresiones regulares y,
+opcionalmente, frases prototipo para coincidencia por similitud. Al construir el
+router:
+
+- todas las palabras clave se fusionan en un trie y se emiten como una sola
+  expresión regular con prefijos compartidos, de modo que el coste por mensaje
+  no crece linealmente con el número de palabras clave;
+- las expresiones regulares de cada ruta se añaden a ese mismo patrón como grupos
+  nombrados;
+- la lista de tools de cada ruta se resuelve una única vez a una tupla inmutable.
+
+Si varias rutas coinciden gana la declarada antes (prioridad por orden). Si
+ninguna coincide se usa ``default_route``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Mapping
+
+from app.core.similarity import SimilarityIndex
+from app.core.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUTES_PATH = Path(__file__).with_name("tool_routes.json")
+
+
+@dataclass(frozen=True)
+class Route:
+    """Ruta resuelta: nombre y tupla inmutable de tools."""
+
+    name: str
+    tools: tuple[object, ...]
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Compila un conjunto de literales a una regex con forma de trie (prefijos compartidos)."""
+    trie: dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Un nodo terminal con continuaciones hace opcional el resto (coincidencia más larga primero).
+        if terminal:
+            return ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+
+    return emit(trie)
+
+
+class ToolRouter:
+    """Selecciona el conjunto de tools de cada mensaje a partir de un registro declarativo."""
+
+    def __init__(
+        self,
+        routes: list[Mapping[str, Any]],
+        catalog: Mapping[str, object],
+        *,
+        default_route: str,
+        prototype_threshold: float = 0.8,
+    ) -> None:
+        self._routes: list[Route] = []
+        self._by_name: dict[str, Route] = {}
+        keyword_route: dict[str, int] = {}
+        regex_groups: list[str] = []
+        self._group_route: dict[str, int] = {}
+        self._prototypes = SimilarityIndex()
+        self._prototype_threshold = prototype_threshold
+
+        for position, spec in enumerate(routes):
+            name = spec["name"]
+            missing = [tool_name for tool_name in spec.get("tools", []) if tool_name not in catalog]
+            if missing:
+                raise ValueError(f"La ruta '{name}' referencia tools no registradas: {', '.join(missing)}")
+            route = Route(name=name, tools=tuple(catalog[tool_name] for tool_name in spec.get("tools", [])))
+            self._routes.append(route)
+            self._by_name[name] = route
+
+            for keyword in spec.get("keywords", []):
+                normalized = normalize_text(keyword)
+                if normalized:
+                    keyword_route.setdefault(normalized, position)
+            for number, pattern in enumerate(spec.get("regexes", [])):
+                group = f"r{position}_{number}"
+                self._group_route[group] = position
+                regex_groups.append(f"(?P<{group}>{pattern})")
+            for number, prototype in enumerate(spec.get("prototypes", [])):
+                self._prototypes.add((position, number), prototype)
+
+        if default_route not in self._by_name:
+            raise ValueError(f"default_route '{default_route}' no está definida en el registro de rutas.")
+        self._default = self._by_name[default_route]
+        self._keyword_route = keyword_route
+
+        alternatives = []
+        if keyword_route:
+            alternatives.append(f"(?P<kw>{_trie_regex(keyword_route)})")
+        alternatives.extend(regex_groups)
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+        self.hits_by_route: Counter[str] = Counter()
+
+    @classmethod
+    def from_file(cls, path: str | Path, catalog: Mapping[str, object]) -> "ToolRouter":
+        """Carga el registro de rutas desde JSON (ver ``app/core/tool_routes.json``)."""
+        with open(path, encoding="utf-8") as handle:
+            config: dict[str, Any] = json.load(handle)
+        return cls(
+            config.get("routes", []),
+            catalog,
+            default_route=config["default_route"],
+            prototype_threshold=float(config.get("prototype_threshold", 0.8)),
+        )
+
+    @property
+    def routes(self) -> tuple[Route, ...]:
+        return tuple(self._routes)
+
+    def route(self, message: str, *, record: bool = True) -> Route:
+        """Devuelve la ruta del mensaje (la de mayor prioridad entre las que coinciden).
+
+        Con ``record=False`` la consulta no cuenta en las estadísticas.
+        """
+        normalized = normalize_text(message)
+        best: int | None = None
+        if self._pattern is not None:
+            for hit in self._pattern.finditer(normalized):
+                group = hit.lastgroup
+                position = self._keyword_route[hit.group()] if group == "kw" else self._group_route[group]
+                if best is None or position < best:
+                    best = position
+                    if best == 0:
+                        break
+        if best is None and len(self._prototypes):
+            match = self._prototypes.best_match(normalized)
+            if match is not None and match[1] >= self._prototype_threshold:
+                best = match[0][0]
+
+        route = self._routes[best] if best is not None else self._default
+        if record:
+            self.hits_by_route[route.name] += 1
+        return route
+
+    def stats(self) -> dict[str, int]:
+        """Número de mensajes enrutados a cada ruta."""
+        return dict(self.hits_by_route)
+
+
+__all__ = ["Route", "ToolRouter", "DEFAULT_ROUTES_PATH"]
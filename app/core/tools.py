@@ -6,34 +6,46 @@ agente. No debe contener lógica específica de canales.
 
 from __future__ import annotations
 
+import logging
 import os
 import random
+from pathlib import Path
 from typing import Annotated
 
-from dotenv import load_dotenv
 from agent_framework import tool, HostedWebSearchTool
 from pydantic import Field
 
-# Cargar variables de entorno
-load_dotenv()
+from app.core.logging_config import HOT_PATH
+from app.core.runtime_env import get_env_str, load_local_env_if_needed
+from app.core.telemetry import stage
+from app.core.tool_router import DEFAULT_ROUTES_PATH, ToolRouter
+
+# Cargar el .env local (BING_*, TOOL_ROUTES_PATH). Se busca desde este fichero, no desde la pila de
+# llamadas como hace load_dotenv() sin argumentos, y en App Service no se lee nada.
+load_local_env_if_needed(Path(__file__).resolve())
+
+logger = logging.getLogger(__name__)
 
 ESTADOS_TIEMPO = ["soleado", "nublado", "lluvioso"]
-ROUTE_WEATHER_KEYWORDS = ("tiempo", "clima", "meteo", "pronostico")
 
-# Esta función es un ejemplo de cómo podríamos enrutar a diferentes tools según el mensaje del usuario.
+# Enrutado de tools por mensaje: el registro declarativo (tool_routes.json o TOOL_ROUTES_PATH)
+# se compila una vez al importar el módulo; ver app/core/tool_router.py.
 def route_tools_for_message(message: str) -> list[object]:
 	"""Devuelve el conjunto de tools segun el texto del usuario."""
-	import logging
-	logger = logging.getLogger(__name__)
-	normalized = message.lower()
-	if any(keyword in normalized for keyword in ROUTE_WEATHER_KEYWORDS):
-		tools = [get_weather_by_city]
-		logger.info("[ROUTE] Detectada palabra clave de tiempo - solo weather_tool")
-	else:
-		tools = [get_weather_by_city, web_search_tool]
-		logger.info("[ROUTE] Sin palabras clave de tiempo - weather_tool + web_search_tool habilitados")
-	logger.debug(f"[TOOLS] Habilitadas: {[t.name if hasattr(t, 'name') else str(t) for t in tools]}")
-	return tools
+	with stage("routing") as span:
+		route = TOOL_ROUTER.route(message)
+		span.set_attribute("route.name", route.name)
+		span.set_attribute("route.tool_count", len(route.tools))
+	logger.info("[ROUTE] Ruta '%s' - %s tools habilitadas", route.name, len(route.tools), extra=HOT_PATH)
+	if logger.isEnabledFor(logging.DEBUG):
+		logger.debug("[TOOLS] Habilitadas: %s", [getattr(t, "name", str(t)) for t in route.tools])
+	# ChatAgent.run solo acepta listas; la tupla precomputada de la ruta no se modifica.
+	return list(route.tools)
+
+
+def route_expects_web_search(message: str) -> bool:
+	"""Indica, sin efectos secundarios, si el router habilitará web_search para el mensaje."""
+	return web_search_tool in TOOL_ROUTER.route(message, record=False).tools
 
 
 @tool(
@@ -71,6 +83,13 @@ def get_weather_by_city(
 bing_connection_id = os.getenv("BING_CONNECTION_ID")
 bing_search_api_key = os.getenv("BING_SEARCH_API_KEY")
 
+# Ubicación que se envía a la búsqueda; también forma parte de la clave de la caché de web search.
+WEB_SEARCH_USER_LOCATION = {
+    "city": "Madrid",
+    "country": "ES",
+    "timezone": "Europe/Madrid",
+}
+
 web_search_tool = HostedWebSearchTool(
     description=(
         "Busca informacion actual en internet para responder preguntas "
@@ -78,16 +97,20 @@ web_search_tool = HostedWebSearchTool(
     ),
     connection_id=bing_connection_id,  # Pasar explícitamente el connection ID
     additional_properties={
-        "user_location": {
-            "city": "Madrid",
-            "country": "ES",
-            "timezone": "Europe/Madrid",
-        },
+        "user_location": WEB_SEARCH_USER_LOCATION,
         # Si el framework requiere la API key también:
         "api_key": bing_search_api_key if bing_search_api_key else None,
     },
 )
 
-__all__ = ["get_weather_by_city", "web_search_tool", "route_tools_for_message"]
+# Tools registradas por nombre: las rutas las referencian y las continuaciones de aprobación las recuperan.
+TOOL_CATALOG = {tool.name: tool for tool in (get_weather_by_city, web_search_tool)}
+
+TOOL_ROUTER = ToolRouter.from_file(
+	get_env_str("TOOL_ROUTES_PATH") or DEFAULT_ROUTES_PATH,
+	catalog=TOOL_CATALOG,
+)
+
+__all__ = ["get_weather_by_city", "web_search_tool", "WEB_SEARCH_USER_LOCATION", "route_tools_for_message", "route_expects_web_search", "TOOL_CATALOG", "TOOL_ROUTER"]
 
 
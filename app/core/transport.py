@@ -0,0 +1,183 @@
+"""Transporte HTTP saliente compartido (pools de conexiones con keep-alive).
+
+Sin configuración, cada librería crea sus propios clientes HTTP: el cliente de
+Foundry construye un ``AsyncOpenAI`` (con su pool de httpx) en cada llamada y el
+adapter de M365 abre una ``ClientSession`` de aiohttp por respuesta, lo que se
+traduce en handshakes TLS repetidos y sockets que no se reutilizan.
+
+``HttpTransport`` centraliza esos recursos para todo el servicio:
+
+- un ``httpx.AsyncClient`` para el cliente OpenAI de Foundry (respuestas del modelo);
+- un ``aiohttp.TCPConnector`` con caché DNS, compartido por el pipeline de
+  azure-core (API de proyectos de Foundry) y por las sesiones del Bot Connector.
+
+Los recursos se crean al primer uso (necesitan el event loop en marcha) y se
+cierran con ``close()``.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from azure.ai.projects.aio import AIProjectClient
+from azure.core.pipeline.transport import AioHttpTransport
+
+from agent_framework import AGENT_FRAMEWORK_USER_AGENT
+from agent_framework_azure_ai import AzureAIClient
+
+from app.core.runtime_env import get_env_bool, get_env_float, get_env_int
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TransportSettings:
+    """Tamaños de pool, keep-alive, HTTP/2, caché DNS y timeouts de las conexiones salientes."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_seconds: float = 30.0
+    http2: bool = False
+    dns_cache_ttl_seconds: int = 300
+    connect_timeout_seconds: float = 10.0
+    read_timeout_seconds: float = 120.0
+
+    @classmethod
+    def from_env(cls) -> "TransportSettings":
+        """Lee la configuración desde las variables ``HTTP_*``."""
+        return cls(
+            max_connections=get_env_int("HTTP_POOL_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=get_env_int("HTTP_POOL_MAX_KEEPALIVE", 20),
+            keepalive_seconds=get_env_float("HTTP_KEEPALIVE_SECONDS", 30.0),
+            http2=get_env_bool("HTTP_HTTP2", False),
+            dns_cache_ttl_seconds=get_env_int("HTTP_DNS_CACHE_TTL_SECONDS", 300),
+            connect_timeout_seconds=get_env_float("HTTP_CONNECT_TIMEOUT_SECONDS", 10.0),
+            read_timeout_seconds=get_env_float("HTTP_READ_TIMEOUT_SECONDS", 120.0),
+        )
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HttpTransport:
+    """Pools de conexiones salientes compartidos por los clientes de Foundry y el adapter de M365."""
+
+    def __init__(self, settings: TransportSettings | None = None) -> None:
+        self._settings = settings or TransportSettings()
+        self._httpx_client: httpx.AsyncClient | None = None
+        self._connector: TCPConnector | None = None
+        self._azure_session: ClientSession | None = None
+        self.sessions_opened = 0
+
+    @classmethod
+    def from_env(cls) -> "HttpTransport":
+        return cls(TransportSettings.from_env())
+
+    @property
+    def settings(self) -> TransportSettings:
+        return self._settings
+
+    def httpx_client(self) -> httpx.AsyncClient:
+        """Cliente httpx compartido para el cliente OpenAI de Foundry."""
+        if self._httpx_client is None:
+            settings = self._settings
+            http2 = settings.http2 and _http2_available()
+            if settings.http2 and not http2:
+                logger.warning("[HTTP] HTTP_HTTP2=true requiere el paquete h2 (pip install httpx[http2]); se usa HTTP/1.1.")
+            self._httpx_client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.max_connections,
+                    max_keepalive_connections=settings.max_keepalive_connections,
+                    keepalive_expiry=settings.keepalive_seconds,
+                ),
+                timeout=httpx.Timeout(settings.read_timeout_seconds, connect=settings.connect_timeout_seconds),
+                follow_redirects=True,
+            )
+        return self._httpx_client
+
+    def connector(self) -> TCPConnector:
+        """Connector aiohttp compartido (pool de sockets y caché DNS)."""
+        if self._connector is None or self._connector.closed:
+            settings = self._settings
+            self._connector = TCPConnector(
+                limit=settings.max_connections,
+                ttl_dns_cache=settings.dns_cache_ttl_seconds,
+                keepalive_timeout=settings.keepalive_seconds,
+            )
+        return self._connector
+
+    def session(self, **kwargs: Any) -> ClientSession:
+        """Sesión aiohttp sobre el connector compartido; cerrarla no cierra las conexiones del pool."""
+        self.sessions_opened += 1
+        kwargs.setdefault(
+            "timeout",
+            ClientTimeout(total=self._settings.read_timeout_seconds, connect=self._settings.connect_timeout_seconds),
+        )
+        return ClientSession(connector=self.connector(), connector_owner=False, **kwargs)
+
+    def azure_transport(self) -> AioHttpTransport:
+        """Transporte de azure-core para los clientes de Azure SDK (p. ej. ``AIProjectClient``)."""
+        if self._azure_session is None or self._azure_session.closed:
+            self._azure_session = self.session()
+        return AioHttpTransport(session=self._azure_session, session_owner=False)
+
+    def stats(self) -> dict[str, Any]:
+        """Configuración del pool y uso actual del connector aiohttp."""
+        connector = self._connector
+        return {
+            "max_connections": self._settings.max_connections,
+            "max_keepalive_connections": self._settings.max_keepalive_connections,
+            "http2": self._settings.http2,
+            "aiohttp_sessions_opened": self.sessions_opened,
+            "aiohttp_idle_connections": sum(len(conns) for conns in connector._conns.values())
+            if connector is not None and not connector.closed
+            else 0,
+        }
+
+    async def close(self) -> None:
+        """Cierra los pools; se vuelven a crear si el transporte se usa de nuevo."""
+        if self._azure_session is not None:
+            await self._azure_session.close()
+            self._azure_session = None
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+        if self._httpx_client is not None:
+            await self._httpx_client.aclose()
+            self._httpx_client = None
+
+
+class PooledAzureAIClient(AzureAIClient):
+    """``AzureAIClient`` que usa el transporte compartido y crea su cliente OpenAI una sola vez."""
+
+    def __init__(self, *, project_endpoint: str, credential: Any, transport: HttpTransport, **kwargs: Any) -> None:
+        project_client = AIProjectClient(
+            endpoint=project_endpoint,
+            credential=credential,
+            user_agent=AGENT_FRAMEWORK_USER_AGENT,
+            transport=transport.azure_transport(),
+        )
+        super().__init__(project_client=project_client, credential=credential, **kwargs)
+        # El cliente de proyecto es nuestro: ``close()`` debe cerrarlo (el pool es del transporte).
+        self._should_close_client = True
+        self._transport = transport
+
+    async def _initialize_client(self) -> None:
+        # La implementación base crea un AsyncOpenAI (y un pool de conexiones) en cada llamada.
+        if self.client is None:
+            client = self.project_client.get_openai_client()
+            # ``get_openai_client`` no admite un http_client propio: se copia la configuración sobre el compartido.
+            self.client = client.copy(http_client=self._transport.httpx_client())
+            await client.close()
+
+__all__ = ["HttpTransport", "TransportSettings", "PooledAzureAIClient"]
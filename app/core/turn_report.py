@@ -0,0 +1,59 @@
+"""Resumen de un turno (origen, tier, tools y tokens) para quien lo pida.
+
+``ChatService.ask`` solo devuelve el texto. Los consumidores que necesitan saber
+cómo se resolvió el turno (p. ej. el modo batch, que lo guarda junto a cada
+respuesta) abren ``capture_turn()`` alrededor de la llamada y el agente rellena el
+``TurnReport`` activo en el contexto con ``note_turn``. Sin captura abierta,
+``note_turn`` no hace nada.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+
+TURN_SOURCES = ("local", "response_cache", "agent", "error")
+
+
+@dataclass
+class TurnReport:
+    """Cómo se atendió un turno: sin LLM (``local``), desde caché, por el agente o con error."""
+
+    source: str = "local"
+    tier: str | None = None
+    deployment: str | None = None
+    tools_offered: list[str] = field(default_factory=list)
+    tools_called: list[str] = field(default_factory=list)
+    usage: dict[str, int] = field(default_factory=dict)
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+_CURRENT_REPORT: ContextVar[TurnReport | None] = ContextVar("turn_report", default=None)
+
+
+@contextmanager
+def capture_turn() -> Iterator[TurnReport]:
+    """Abre un ``TurnReport`` que rellenan los turnos ejecutados dentro del bloque."""
+    report = TurnReport()
+    token = _CURRENT_REPORT.set(report)
+    try:
+        yield report
+    finally:
+        _CURRENT_REPORT.reset(token)
+
+
+def note_turn(**fields: Any) -> None:
+    """Actualiza los campos del ``TurnReport`` activo, si hay alguno."""
+    report = _CURRENT_REPORT.get()
+    if report is None:
+        return
+    for name, value in fields.items():
+        setattr(report, name, value)
+
+
+__all__ = ["TURN_SOURCES", "TurnReport", "capture_turn", "note_turn"]
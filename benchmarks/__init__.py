@@ -0,0 +1,6 @@
+"""Micro-benchmarks y pruebas de carga del laboratorio (se ejecutan con ``python -m benchmarks.<modulo>``).
+
+``load_test`` levanta el canal M365 con el backend simulado de ``fake_backend`` (sin
+consumir cuota de Foundry), ``import_time`` vigila el presupuesto de importación de
+cada runtime (arranque en frío) y ``report`` compara sus informes JSON entre builds.
+"""
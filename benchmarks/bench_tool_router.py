@@ -0,0 +1,102 @@
+"""Micro-benchmark del enrutado de tools.
+
+Compara el coste por mensaje del ``ToolRouter`` compilado con el escaneo lineal
+original (``any(keyword in message)`` por ruta) a medida que crecen el número de
+tools y de palabras clave. Uso::
+
+    python -m benchmarks.bench_tool_router [--messages 2000] [--sizes 10,100,500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import string
+import time
+from dataclasses import dataclass
+
+from app.core.text_utils import normalize_text
+from app.core.tool_router import ToolRouter
+
+KEYWORDS_PER_ROUTE = 4
+SAMPLE_MESSAGES = [
+    "que tiempo hace hoy en Madrid",
+    "cuales son las ultimas noticias sobre inteligencia artificial",
+    "resumeme el partido de ayer",
+    "necesito el pronostico para el fin de semana en Sevilla",
+    "explicame como funciona un transformer",
+]
+
+
+@dataclass(frozen=True)
+class _FakeTool:
+    name: str
+
+
+def _random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+
+
+def build_registry(tool_count: int, seed: int = 7) -> tuple[list[dict], dict[str, _FakeTool]]:
+    """Registro sintético: una ruta por tool con ``KEYWORDS_PER_ROUTE`` palabras clave."""
+    rng = random.Random(seed)
+    catalog = {f"tool_{n}": _FakeTool(f"tool_{n}") for n in range(tool_count)}
+    routes = [
+        {"name": f"route_{n}", "tools": [f"tool_{n}"], "keywords": [_random_word(rng) for _ in range(KEYWORDS_PER_ROUTE)]}
+        for n in range(tool_count)
+    ]
+    routes.append({"name": "general", "tools": list(catalog)})
+    return routes, catalog
+
+
+def naive_route(routes: list[dict], catalog: dict[str, _FakeTool], message: str) -> list[_FakeTool]:
+    """Réplica del enrutado original: escaneo lineal de palabras clave y lista nueva por llamada."""
+    lowered = normalize_text(message)
+    for spec in routes:
+        if any(keyword in lowered for keyword in spec.get("keywords", [])):
+            return [catalog[name] for name in spec["tools"]]
+    return [catalog[name] for name in routes[-1]["tools"]]
+
+
+def _per_message_us(func, messages: list[str]) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def run(sizes: list[int], message_count: int) -> list[dict[str, float]]:
+    rng = random.Random(11)
+    results = []
+    for size in sizes:
+        routes, catalog = build_registry(size)
+        router = ToolRouter(routes, catalog, default_route="general")
+        # Mezcla de mensajes que no coinciden y mensajes con una palabra clave de una ruta al azar.
+        messages = [
+            f"{rng.choice(SAMPLE_MESSAGES)} {rng.choice(routes[:-1])['keywords'][0]}" if n % 2 else rng.choice(SAMPLE_MESSAGES)
+            for n in range(message_count)
+        ]
+        results.append(
+            {
+                "tools": size,
+                "keywords": size * KEYWORDS_PER_ROUTE,
+                "compiled_us": _per_message_us(router.route, messages),
+                "naive_us": _per_message_us(lambda m: naive_route(routes, catalog, m), messages),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--sizes", default="10,100,500")
+    args = parser.parse_args()
+
+    print(f"{'tools':>6} {'keywords':>9} {'compilado (us)':>15} {'lineal (us)':>12}")
+    for row in run([int(s) for s in args.sizes.split(",")], args.messages):
+        print(f"{row['tools']:>6} {row['keywords']:>9} {row['compiled_us']:>15.2f} {row['naive_us']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
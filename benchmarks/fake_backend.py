@@ -0,0 +1,218 @@
+"""Backend simulado de Foundry para pruebas de carga sin consumir cuota.
+
+``FakeChatClient`` sustituye a ``AzureAIClient`` en ``SimpleChatAgent`` (ver
+``chat_client_factory``). Pasa por el mismo pipeline de agent_framework que el
+cliente real (invocación de tools, aprobaciones, middleware e instrumentación),
+pero en lugar de llamar al servicio espera una latencia sorteada de la
+distribución configurada y devuelve un texto sintético, en fragmentos si el turno
+es en streaming. Según el perfil también pide ejecutar tools locales (las que
+requieren aprobación generan la petición de aprobación real) o falla con un 429
+que lleva ``Retry-After``, como hace Foundry cuando se agota la cuota.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import uuid
+from collections.abc import AsyncIterable, MutableSequence
+from dataclasses import dataclass, fields
+from typing import Any
+
+from agent_framework import (
+    BaseChatClient,
+    ChatMessage,
+    ChatResponse,
+    ChatResponseUpdate,
+    Content,
+    FunctionTool,
+    HostedWebSearchTool,
+    use_chat_middleware,
+    use_function_invocation,
+)
+from agent_framework.observability import use_instrumentation
+
+from app.core.text_utils import estimate_tokens
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+# Percentil 95 de una normal estándar: con la mediana y el p95 se obtiene la sigma de la lognormal.
+Z_95 = 1.6449
+LOREM = (
+    "Esta es una respuesta simulada del backend de pruebas que imita la longitud y el ritmo de una "
+    "respuesta real del modelo para medir latencia y rendimiento sin llamar a Foundry."
+).split()
+
+
+@dataclass(frozen=True)
+class FakeBackendProfile:
+    """Comportamiento del backend simulado (tiempos en segundos, tasas entre 0 y 1)."""
+
+    latency: str = "lognormal"
+    latency_median: float = 0.8
+    latency_p95: float = 2.5
+    web_search_latency: float = 1.5
+    first_token_fraction: float = 0.3
+    chunks: int = 12
+    response_words: int = 60
+    tool_call_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    seed: int | None = None
+
+    def __post_init__(self) -> None:
+        if self.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency debe ser una de {', '.join(LATENCY_DISTRIBUTIONS)}; recibido '{self.latency}'.")
+        if self.latency_p95 < self.latency_median:
+            raise ValueError("latency_p95 no puede ser menor que latency_median.")
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "FakeBackendProfile":
+        known = {field.name for field in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Campos desconocidos en el perfil del backend simulado: {sorted(unknown)}")
+        return cls(**data)
+
+
+class FakeResponse:
+    """Respuesta HTTP mínima para que el 429 simulado exponga ``Retry-After`` como la del SDK."""
+
+    def __init__(self, status_code: int, headers: dict[str, str]) -> None:
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeThrottlingError(RuntimeError):
+    """429 simulado (``status_code`` y ``response.headers`` como los errores del SDK de OpenAI)."""
+
+    def __init__(self, retry_after_seconds: float) -> None:
+        super().__init__("Error code: 429 - Rate limit exceeded (simulado).")
+        self.status_code = 429
+        self.response = FakeResponse(429, {"retry-after": f"{retry_after_seconds:g}"})
+
+
+@use_function_invocation
+@use_instrumentation
+@use_chat_middleware
+class FakeChatClient(BaseChatClient):
+    """Cliente de chat que simula Foundry con latencias, streaming, tools y 429 configurables."""
+
+    OTEL_PROVIDER_NAME = "fake_foundry"
+
+    def __init__(self, profile: FakeBackendProfile | None = None, *, deployment: str = "fake", **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.profile = profile or FakeBackendProfile()
+        self.deployment = deployment
+        self._rng = random.Random(self.profile.seed)
+        self.calls = 0
+        self.throttled = 0
+        self.tool_calls = 0
+
+    def _latency(self, options: dict[str, Any]) -> float:
+        profile = self.profile
+        if profile.latency == "fixed":
+            latency = profile.latency_median
+        elif profile.latency == "uniform":
+            # Uniforme entre 0 y el doble de la mediana, recortada al p95 configurado.
+            latency = min(self._rng.uniform(0, 2 * profile.latency_median), profile.latency_p95)
+        else:
+            sigma = math.log(profile.latency_p95 / profile.latency_median) / Z_95 if profile.latency_median > 0 else 0
+            latency = self._rng.lognormvariate(math.log(max(profile.latency_median, 1e-6)), sigma)
+        if any(isinstance(tool, HostedWebSearchTool) for tool in options.get("tools") or []):
+            latency += profile.web_search_latency
+        return latency
+
+    def _begin_call(self) -> None:
+        self.calls += 1
+        if self._rng.random() < self.profile.throttle_rate:
+            self.throttled += 1
+            raise FakeThrottlingError(self.profile.retry_after_seconds)
+
+    def _tool_call(self, messages: MutableSequence[ChatMessage], options: dict[str, Any]) -> Content | None:
+        """Llamada a una tool local si el perfil lo pide y el turno no viene ya de ejecutar una."""
+        if self.profile.tool_call_rate <= 0 or self._rng.random() >= self.profile.tool_call_rate:
+            return None
+        last_contents = messages[-1].contents if messages else []
+        if any(content.type in ("function_result", "function_approval_response") for content in last_contents):
+            return None
+        local_tools = [tool for tool in options.get("tools") or [] if isinstance(tool, FunctionTool)]
+        if not local_tools:
+            return None
+        self.tool_calls += 1
+        tool = self._rng.choice(local_tools)
+        return Content.from_function_call(
+            call_id=f"call_{uuid.uuid4().hex[:12]}", name=tool.name, arguments={"ciudad": "Madrid"}
+        )
+
+    def _answer(self, messages: MutableSequence[ChatMessage]) -> str:
+        words = [LOREM[n % len(LOREM)] for n in range(self.profile.response_words)]
+        prompt = messages[-1].text if messages else ""
+        return f"[{self.deployment}] {' '.join(words)} ({len(prompt)} caracteres recibidos)"
+
+    def _usage(self, messages: MutableSequence[ChatMessage], answer: str) -> dict[str, int]:
+        input_tokens = sum(estimate_tokens(message.text or "") for message in messages)
+        output_tokens = estimate_tokens(answer)
+        return {
+            "input_token_count": input_tokens,
+            "output_token_count": output_tokens,
+            "total_token_count": input_tokens + output_tokens,
+        }
+
+    async def _inner_get_response(
+        self, *, messages: MutableSequence[ChatMessage], options: dict[str, Any], **kwargs: Any
+    ) -> ChatResponse:
+        self._begin_call()
+        await asyncio.sleep(self._latency(options))
+        call = self._tool_call(messages, options)
+        if call is not None:
+            return ChatResponse(messages=[ChatMessage(role="assistant", contents=[call])], model_id=self.deployment)
+        answer = self._answer(messages)
+        return ChatResponse(
+            messages=[ChatMessage(role="assistant", text=answer)],
+            model_id=self.deployment,
+            usage_details=self._usage(messages, answer),
+        )
+
+    async def _inner_get_streaming_response(
+        self, *, messages: MutableSequence[ChatMessage], options: dict[str, Any], **kwargs: Any
+    ) -> AsyncIterable[ChatResponseUpdate]:
+        self._begin_call()
+        latency = self._latency(options)
+        # El primer fragmento llega tras una parte de la latencia; el resto se reparte entre los fragmentos.
+        await asyncio.sleep(latency * self.profile.first_token_fraction)
+        call = self._tool_call(messages, options)
+        if call is not None:
+            yield ChatResponseUpdate(role="assistant", contents=[call], model_id=self.deployment)
+            return
+        answer = self._answer(messages)
+        words = answer.split(" ")
+        chunk_count = max(1, min(self.profile.chunks, len(words)))
+        step = math.ceil(len(words) / chunk_count)
+        delay = latency * (1 - self.profile.first_token_fraction) / chunk_count
+        for start in range(0, len(words), step):
+            if start:
+                await asyncio.sleep(delay)
+            text = " ".join(words[start : start + step]) + ("" if start + step >= len(words) else " ")
+            yield ChatResponseUpdate(role="assistant", text=text, model_id=self.deployment)
+        yield ChatResponseUpdate(
+            role="assistant", contents=[Content.from_usage(self._usage(messages, answer))], model_id=self.deployment
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {"calls": self.calls, "throttled": self.throttled, "tool_calls": self.tool_calls}
+
+    async def close(self) -> None:
+        """Sin recursos que liberar; existe porque ``SimpleChatAgent.cleanup`` cierra sus clientes."""
+
+
+def fake_client_factory(profile: FakeBackendProfile) -> Any:
+    """Factoría para ``SimpleChatAgent(chat_client_factory=...)``: un cliente simulado por tier."""
+
+    def create(tier: str, deployment: str) -> FakeChatClient:
+        return FakeChatClient(profile, deployment=deployment)
+
+    return create
+
+
+__all__ = ["FakeBackendProfile", "FakeChatClient", "FakeThrottlingError", "fake_client_factory"]
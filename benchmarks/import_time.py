@@ -0,0 +1,185 @@
+"""Presupuesto de tiempo de importación de cada runtime (arranque en frío).
+
+Cada punto de entrada se importa en un intérprete nuevo con ``python -X importtime``
+y se comprueba que:
+
+- el tiempo acumulado de la importación no supera su presupuesto (en segundos), y
+- no carga SDK que ese runtime no necesita (p. ej. el dispatcher de ``main.py`` y la
+  CLI no deben importar agent_framework ni el Microsoft 365 Agents SDK al arrancar).
+
+Uso::
+
+    python -m benchmarks.import_time [--repeat 5] [--budget-scale 2] \\
+        [--output benchmarks/results/import_time.json] [--baseline anterior.json]
+
+Termina con código 1 si algún runtime se sale del presupuesto o importa un módulo
+prohibido. Los presupuestos son para una máquina de desarrollo; en agentes de CI
+más lentos, ``--budget-scale`` los multiplica. Los módulos prohibidos no dependen de
+la máquina y son la comprobación más fiable.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from benchmarks.report import compare_reports, environment, print_comparison, write_report
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Paquetes pesados que solo deben cargarse en el runtime que los usa.
+AGENT_SDKS = ("agent_framework", "agent_framework_azure_ai", "azure.ai.projects", "openai")
+M365_SDKS = ("microsoft_agents",)
+
+
+@dataclass(frozen=True)
+class Entrypoint:
+    """Módulo que importa un runtime al arrancar, su presupuesto y lo que no debe cargar."""
+
+    name: str
+    module: str
+    budget_seconds: float
+    forbidden: tuple[str, ...] = ()
+
+
+ENTRYPOINTS = (
+    Entrypoint("dispatcher", "main", 0.3, AGENT_SDKS + M365_SDKS),
+    Entrypoint("serve_supervisor", "app.channels.worker_pool", 0.8, AGENT_SDKS + M365_SDKS),
+    Entrypoint("cli", "main_cli", 0.5, AGENT_SDKS + M365_SDKS),
+    Entrypoint("batch", "app.channels.batch_app", 6.0, M365_SDKS),
+    Entrypoint("m365", "main_m365", 8.0),
+)
+
+
+@dataclass
+class ImportSample:
+    cumulative_seconds: float
+    wall_seconds: float
+    modules: dict[str, tuple[int, int, int]]  # nombre -> (self µs, acumulado µs, profundidad)
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int, int]]:
+    """Convierte la salida de ``-X importtime`` en ``{módulo: (self µs, acumulado µs, profundidad)}``."""
+    modules: dict[str, tuple[int, int, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def measure(module: str) -> ImportSample:
+    """Importa ``module`` en un intérprete nuevo y devuelve sus tiempos de importación."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{result.stderr[-2000:]}")
+    modules = parse_importtime(result.stderr)
+    if module not in modules:
+        raise RuntimeError(f"La salida de -X importtime no incluye {module}.")
+    return ImportSample(modules[module][1] / 1e6, wall, modules)
+
+
+def heaviest(modules: dict[str, tuple[int, int, int]], target: str, count: int = 8) -> list[dict[str, Any]]:
+    """Dependencias directas de ``target`` que más tiempo acumulan."""
+    depth = modules[target][2]
+    direct = [(name, data) for name, data in modules.items() if data[2] == depth + 1]
+    direct.sort(key=lambda item: item[1][1], reverse=True)
+    return [{"module": name, "cumulative_seconds": data[1] / 1e6} for name, data in direct[:count]]
+
+
+def run_budget(repeat: int = 3, budget_scale: float = 1.0) -> dict[str, Any]:
+    """Mide cada runtime ``repeat`` veces (se queda con la mejor) y evalúa su presupuesto."""
+    results: dict[str, Any] = {}
+    metrics: dict[str, Any] = {}
+    for entry in ENTRYPOINTS:
+        samples = [measure(entry.module) for _ in range(repeat)]
+        best = min(samples, key=lambda sample: sample.cumulative_seconds)
+        budget = entry.budget_seconds * budget_scale
+        loaded_forbidden = sorted(
+            name for name in best.modules if any(name == root or name.startswith(f"{root}.") for root in entry.forbidden)
+        )
+        results[entry.name] = {
+            "module": entry.module,
+            "budget_seconds": budget,
+            "within_budget": best.cumulative_seconds <= budget,
+            # Solo los paquetes raíz: la lista completa de submódulos no aporta nada.
+            "forbidden_imports": sorted({name.split(".")[0] for name in loaded_forbidden}),
+            "heaviest_imports": heaviest(best.modules, entry.module),
+        }
+        metrics[entry.name] = {
+            "import_seconds": best.cumulative_seconds,
+            "import_wall_seconds": min(sample.wall_seconds for sample in samples),
+            "import_module_count": len(best.modules),
+        }
+    return {
+        "environment": environment(),
+        "config": {"repeat": repeat, "budget_scale": budget_scale},
+        "metrics": metrics,
+        "entrypoints": results,
+    }
+
+
+def print_summary(report: dict[str, Any]) -> None:
+    print(f"{'runtime':<18} {'importación':>12} {'presupuesto':>12} {'módulos':>8}  estado")
+    for name, entry in report["entrypoints"].items():
+        metrics = report["metrics"][name]
+        problems = []
+        if not entry["within_budget"]:
+            problems.append("fuera de presupuesto")
+        if entry["forbidden_imports"]:
+            problems.append(f"importa {', '.join(entry['forbidden_imports'])}")
+        print(
+            f"{name:<18} {metrics['import_seconds']:>11.3f}s {entry['budget_seconds']:>11.3f}s "
+            f"{metrics['import_module_count']:>8}  {'; '.join(problems) or 'ok'}"
+        )
+
+
+def failures(report: dict[str, Any]) -> list[str]:
+    """Runtimes que incumplen su presupuesto o cargan módulos prohibidos."""
+    return [
+        name
+        for name, entry in report["entrypoints"].items()
+        if not entry["within_budget"] or entry["forbidden_imports"]
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación de cada runtime.")
+    parser.add_argument("--repeat", type=int, default=3, help="Mediciones por runtime (se usa la mejor).")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiplica todos los presupuestos.")
+    parser.add_argument("--output", default="benchmarks/results/import_time.json")
+    parser.add_argument("--baseline", help="Informe anterior con el que comparar.")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    report = run_budget(repeat=args.repeat, budget_scale=args.budget_scale)
+    print_summary(report)
+    path = write_report(args.output, report)
+    print(f"Informe guardado en {path}")
+    failed = failures(report)
+    if args.baseline:
+        rows = compare_reports(json.loads(Path(args.baseline).read_text(encoding="utf-8")), report, args.threshold)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            failed.append("baseline")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
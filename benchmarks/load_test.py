@@ -0,0 +1,326 @@
+"""Prueba de carga del canal M365 contra el backend simulado de Foundry.
+
+Levanta en este proceso el servidor real (``/api/messages`` con el mismo pipeline
+de middlewares, adapter y ``AgentApplication`` que producción, pero sin validación
+JWT) con ``FakeChatClient`` en lugar de Foundry, y un Bot Connector simulado que
+recibe las respuestas. Un generador de carga envía actividades de Bot Framework
+realistas (saludos, preguntas generales, búsquedas web y peticiones de tools con
+su aprobación) desde varias conversaciones concurrentes. Uso::
+
+    python -m benchmarks.load_test --conversations 50 --turns 6 --concurrency 20 \\
+        --output bench/load.json [--baseline bench/anterior.json]
+
+El informe JSON incluye p50/p95/p99 de la latencia de cada petición y de la
+primera respuesta que llega al Bot Connector, throughput, crecimiento de memoria
+por conversación y retardo del event loop (el generador comparte el loop con el
+servidor, así que el lag incluye su trabajo, que es mínimo). Con ``--baseline``
+se compara con un informe anterior (ver ``benchmarks.report``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from aiohttp import ClientSession, web
+
+from benchmarks.fake_backend import FakeBackendProfile, fake_client_factory
+from benchmarks.report import (
+    LoopLagMonitor,
+    compare_reports,
+    current_rss_bytes,
+    environment,
+    print_comparison,
+    summarize,
+    write_report,
+)
+
+# Conversación típica: saludo, preguntas al LLM, búsqueda web y una tool con aprobación.
+CONVERSATION_SCRIPT = (
+    "hola",
+    "explícame en pocas líneas qué es la computación cuántica",
+    "cuáles son las últimas noticias sobre energías renovables",
+    "qué tiempo hace hoy en Madrid",
+    "si",
+    "dame tres ideas para mejorar la productividad de un equipo remoto",
+    "gracias",
+)
+BENCH_TENANT_ID = "bench-tenant"
+
+
+class StubConnector:
+    """Bot Connector simulado: acepta las actividades del bot y anota cuándo llega cada una."""
+
+    def __init__(self) -> None:
+        self.first_reply_at: dict[str, float] = {}
+        self.activities = 0
+        self.by_type: Counter[str] = Counter()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        activity = await request.json()
+        self.activities += 1
+        activity_type = activity.get("type", "")
+        self.by_type[activity_type] += 1
+        reply_to = activity.get("replyToId")
+        if reply_to and activity_type == "message" and reply_to not in self.first_reply_at:
+            self.first_reply_at[reply_to] = time.perf_counter()
+        return web.json_response({"id": uuid.uuid4().hex})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v3/conversations/{conversation_id}/activities", self.handle)
+        app.router.add_post("/v3/conversations/{conversation_id}/activities/{activity_id}", self.handle)
+        app.router.add_put("/v3/conversations/{conversation_id}/activities/{activity_id}", self.handle)
+        return app
+
+
+def build_activity(conversation: int, text: str, service_url: str, channel: str) -> dict[str, Any]:
+    """Actividad ``message`` como las que envía el Bot Service para un chat personal de Teams."""
+    user_id = f"bench-user-{conversation}"
+    return {
+        "type": "message",
+        "id": uuid.uuid4().hex,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        "channelId": channel,
+        "serviceUrl": service_url,
+        "from": {"id": user_id, "name": f"Usuario {conversation}", "aadObjectId": user_id},
+        "recipient": {"id": "bench-bot", "name": "Agente"},
+        "conversation": {
+            "id": f"bench-conversation-{conversation}",
+            "conversationType": "personal",
+            "tenantId": BENCH_TENANT_ID,
+        },
+        "channelData": {"tenant": {"id": BENCH_TENANT_ID}},
+        "locale": "es-ES",
+        "textFormat": "plain",
+        "text": text,
+    }
+
+
+async def _start_site(app: web.Application) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f"http://{host}:{port}"
+
+
+async def _start_agent_server(profile: FakeBackendProfile) -> tuple[web.AppRunner, str, Any, list[Any]]:
+    """Servidor M365 real con el backend simulado y sin validación JWT (peticiones anónimas)."""
+    from microsoft_agents.hosting.aiohttp import CloudAdapter
+
+    import app.channels.m365_app as m365_app
+    from app.channels.connector_clients import PooledChannelServiceClientFactory
+    from app.channels.start_server import build_app
+    from app.core.agent import SimpleChatAgent
+    from app.core.agent_viewer import ChatService
+
+    agent = SimpleChatAgent(chat_client_factory=fake_client_factory(profile))
+    service = ChatService(agent=agent)
+    # Los handlers del canal usan el servicio del módulo: se sustituye por el del backend simulado.
+    m365_app.set_chat_service(service)
+    adapter = CloudAdapter(channel_service_client_factory=PooledChannelServiceClientFactory(None, service.transport))
+    agent_app = m365_app.create_agent_application(adapter=adapter)
+    server = build_app(
+        agent_app,
+        None,
+        on_startup=[service.start_warm_up],
+        on_shutdown=[m365_app.background_turns.drain, service.stop],
+        readiness=lambda: service.ready,
+    )
+    runner, url = await _start_site(server)
+    return runner, url, service, list(agent.chat_clients.values())
+
+
+async def _wait_ready(session: ClientSession, url: str, timeout_seconds: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout_seconds
+    while time.perf_counter() < deadline:
+        async with session.get(f"{url}/readyz") as response:
+            if response.status == 200:
+                return
+        await asyncio.sleep(0.05)
+    raise RuntimeError("El servidor de pruebas no quedó listo a tiempo.")
+
+
+async def run_load(
+    *,
+    conversations: int,
+    turns: int,
+    concurrency: int,
+    think_time_seconds: float,
+    channel: str,
+    profile: FakeBackendProfile,
+    seed: int,
+) -> dict[str, Any]:
+    """Ejecuta la prueba y devuelve el informe (configuración, entorno y métricas)."""
+    connector = StubConnector()
+    connector_runner, connector_url = await _start_site(connector.app())
+    agent_runner, agent_url, service, clients = await _start_agent_server(profile)
+    rng = random.Random(seed)
+    request_latencies: list[float] = []
+    first_reply_latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+    errors: Counter[str] = Counter()
+    sent_at: dict[str, float] = {}
+    per_message: dict[str, list[float]] = defaultdict(list)
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def converse(session: ClientSession, conversation: int) -> None:
+        async with limiter:
+            for turn in range(turns):
+                text = CONVERSATION_SCRIPT[turn % len(CONVERSATION_SCRIPT)]
+                activity = build_activity(conversation, text, connector_url, channel)
+                start = time.perf_counter()
+                sent_at[activity["id"]] = start
+                try:
+                    async with session.post(f"{agent_url}/api/messages", json=activity) as response:
+                        await response.read()
+                        statuses[response.status] += 1
+                except Exception as exc:
+                    errors[type(exc).__name__] += 1
+                    continue
+                latency = time.perf_counter() - start
+                request_latencies.append(latency)
+                per_message[text].append(latency)
+                if think_time_seconds:
+                    await asyncio.sleep(rng.uniform(0, 2 * think_time_seconds))
+
+    async with ClientSession() as session:
+        await _wait_ready(session, agent_url)
+        gc.collect()
+        rss_before = current_rss_bytes()
+        lag = LoopLagMonitor()
+        lag.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(converse(session, n) for n in range(conversations)))
+        elapsed = time.perf_counter() - started
+        loop_lag = await lag.stop()
+        gc.collect()
+        rss_after = current_rss_bytes()
+
+    for activity_id, replied_at in connector.first_reply_at.items():
+        if activity_id in sent_at:
+            first_reply_latencies.append(replied_at - sent_at[activity_id])
+    service_stats = service.stats()
+    await agent_runner.cleanup()
+    await connector_runner.cleanup()
+
+    completed = len(request_latencies)
+    return {
+        "benchmark": "load_test",
+        "environment": environment(),
+        "config": {
+            "conversations": conversations,
+            "turns": turns,
+            "concurrency": concurrency,
+            "think_time_seconds": think_time_seconds,
+            "channel": channel,
+            "seed": seed,
+            "profile": asdict(profile),
+        },
+        "metrics": {
+            "request_latency_seconds": summarize(request_latencies),
+            "first_reply_latency_seconds": summarize(first_reply_latencies),
+            "throughput_turns_per_second": completed / elapsed if elapsed else 0.0,
+            "loop_lag_seconds": loop_lag,
+            "memory": {
+                "rss_growth_bytes": rss_after - rss_before,
+                "rss_growth_bytes_per_conversation": (rss_after - rss_before) / max(conversations, 1),
+                "session_bytes": service_stats["sessions"].get("approx_bytes", 0),
+            },
+            "by_message_latency_seconds": {text: summarize(values) for text, values in per_message.items()},
+        },
+        "outcome": {
+            "elapsed_seconds": elapsed,
+            "completed_turns": completed,
+            "statuses": {str(status): count for status, count in statuses.items()},
+            "errors": dict(errors),
+            "connector_activities": dict(connector.by_type),
+            "backend": [client.stats() for client in clients],
+            "service": service_stats,
+        },
+    }
+
+
+def print_summary(report: dict[str, Any]) -> None:
+    metrics = report["metrics"]
+    print(f"{'métrica':<32} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name in ("request_latency_seconds", "first_reply_latency_seconds", "loop_lag_seconds"):
+        row = metrics[name]
+        print(f"{name:<32} {row['p50']:>9.3f} {row['p95']:>9.3f} {row['p99']:>9.3f} {row['max']:>9.3f}")
+    print(f"throughput: {metrics['throughput_turns_per_second']:.2f} turnos/s")
+    print(f"memoria por conversación: {metrics['memory']['rss_growth_bytes_per_conversation'] / 1024:.1f} KiB")
+    print(f"estados HTTP: {report['outcome']['statuses']}  errores: {report['outcome']['errors']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=len(CONVERSATION_SCRIPT))
+    parser.add_argument("--concurrency", type=int, default=10, help="Conversaciones activas a la vez.")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pausa media entre turnos (s).")
+    parser.add_argument("--channel", default="msteams", help="msteams (streaming) o emulator (mensaje final).")
+    parser.add_argument("--profile", help="JSON con los campos de FakeBackendProfile.")
+    parser.add_argument("--latency", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-median", type=float, default=0.8)
+    parser.add_argument("--latency-p95", type=float, default=2.5)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--tool-call-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="benchmarks/results/load_test.json")
+    parser.add_argument("--baseline", help="Informe anterior con el que comparar.")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.profile:
+        profile = FakeBackendProfile.from_dict(json.loads(Path(args.profile).read_text(encoding="utf-8")))
+    else:
+        profile = FakeBackendProfile(
+            latency=args.latency,
+            latency_median=args.latency_median,
+            latency_p95=args.latency_p95,
+            throttle_rate=args.throttle_rate,
+            tool_call_rate=args.tool_call_rate,
+            seed=args.seed,
+        )
+    # El backend simulado no necesita endpoint; las cuotas por usuario no deben limitar la carga.
+    os.environ.setdefault("DEPLOYMENT_NAME", "fake-deployment")
+    os.environ.setdefault("RATE_LIMIT_USER_RPM", "0")
+    os.environ.setdefault("RATE_LIMIT_USER_TPM", "0")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = asyncio.run(
+        run_load(
+            conversations=args.conversations,
+            turns=args.turns,
+            concurrency=args.concurrency,
+            think_time_seconds=args.think_time,
+            channel=args.channel,
+            profile=profile,
+            seed=args.seed,
+        )
+    )
+    print_summary(report)
+    path = write_report(args.output, report)
+    print(f"Informe guardado en {path}")
+    if args.baseline:
+        rows = compare_reports(json.loads(Path(args.baseline).read_text(encoding="utf-8")), report, args.threshold)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Métricas y comparación de resultados de las pruebas de carga.
+
+Los informes se guardan en JSON con la métrica, el entorno (commit, Python, máquina)
+y la configuración de la ejecución, para poder compararlos entre builds::
+
+    python -m benchmarks.report anterior.json actual.json [--threshold 10]
+
+La comparación muestra la variación de cada métrica numérica y termina con código 1
+si alguna latencia, uso de memoria o retardo del event loop empeora más del umbral
+(en %), o si el throughput cae más de ese umbral.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterable
+
+# Métricas en las que un valor mayor es peor (latencias, memoria, lag, importación) o mejor (throughput).
+LOWER_IS_BETTER = ("latency", "lag", "memory", "bytes", "import_seconds", "import_wall")
+HIGHER_IS_BETTER = ("throughput",)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Percentil ``q`` (0-100) con interpolación lineal; 0 si no hay valores."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    """Resumen de una serie de medidas: número, media, p50/p95/p99 y máximo."""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values, default=0.0),
+    }
+
+
+def current_rss_bytes() -> int:
+    """Memoria residente actual del proceso (en Linux desde /proc; si no, el pico de ``getrusage``)."""
+    import resource  # Solo existe en sistemas POSIX.
+
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        pages = int(statm.read_text().split()[1])
+        return pages * resource.getpagesize()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KiB en Linux y en bytes en macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class LoopLagMonitor:
+    """Mide cuánto se retrasa el event loop respecto a un temporizador periódico."""
+
+    def __init__(self, interval_seconds: float = 0.01) -> None:
+        self._interval = interval_seconds
+        self._task: asyncio.Task | None = None
+        self.samples: list[float] = []
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self._interval
+            await asyncio.sleep(self._interval)
+            self.samples.append(max(time.perf_counter() - expected, 0.0))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict[str, float]:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        return summarize(self.samples)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> dict[str, Any]:
+    """Datos del entorno que identifican la ejecución (para comparar builds comparables)."""
+    return {
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_report(path: str | Path, report: dict[str, Any]) -> Path:
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    return target
+
+
+def _flatten(data: Any, prefix: str = "") -> Iterable[tuple[str, float]]:
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix, float(data)
+
+
+def compare_reports(baseline: dict[str, Any], current: dict[str, Any], threshold_pct: float = 10.0) -> list[dict[str, Any]]:
+    """Variación de cada métrica de ``metrics`` entre dos informes; marca las regresiones."""
+    before = dict(_flatten(baseline.get("metrics", {})))
+    after = dict(_flatten(current.get("metrics", {})))
+    rows = []
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        change = (new - old) / old * 100 if old else 0.0
+        regression = False
+        if name.endswith(".count"):
+            pass
+        elif any(hint in name for hint in HIGHER_IS_BETTER):
+            regression = change < -threshold_pct
+        elif any(hint in name for hint in LOWER_IS_BETTER):
+            regression = change > threshold_pct
+        rows.append({"metric": name, "baseline": old, "current": new, "change_pct": change, "regression": regression})
+    return rows
+
+
+def print_comparison(rows: list[dict[str, Any]]) -> None:
+    print(f"{'métrica':<45} {'anterior':>12} {'actual':>12} {'cambio':>9}")
+    for row in rows:
+        flag = "  <-- regresión" if row["regression"] else ""
+        print(
+            f"{row['metric']:<45} {row['baseline']:>12.4f} {row['current']:>12.4f} {row['change_pct']:>8.1f}%{flag}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compara dos informes JSON de benchmarks.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Empeoramiento máximo tolerado (en %%).")
+    args = parser.parse_args()
+
+    rows = compare_reports(
+        json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+        json.loads(Path(args.current).read_text(encoding="utf-8")),
+        args.threshold,
+    )
+    print_comparison(rows)
+    if any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,25 +3,102 @@
 Usage:
 - `python main.py` -> starts Microsoft 365 runtime (`main_m365.py`)
 - `python main.py cli` -> starts CLI runtime (`main_cli.py`)
+- `python main.py serve --workers N [--affinity]` -> starts Microsoft 365 runtime with N worker processes
+- `python main.py batch prompts.jsonl [--output results.jsonl] [--workers N] [--rpm R] [--fresh] [--response-cache | --no-response-cache]`
+  -> answers a JSONL file of prompts offline, resuming from the output file if it exists
 """
 
 import argparse
+import asyncio
+import os
 import runpy
 
+from app.core.runtime_env import get_env_bool, get_env_float, get_env_int
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Run the desired runtime entrypoint")
     parser.add_argument(
         "mode",
         nargs="?",
-        choices=["cli"],
-        help="Execution mode. Use 'cli' for local interactive CLI.",
+        choices=["cli", "serve", "batch"],
+        help=(
+            "Execution mode. Use 'cli' for local interactive CLI, 'serve' for the multi-worker M365 server "
+            "or 'batch' to answer a JSONL file of prompts."
+        ),
+    )
+    parser.add_argument("input", nargs="?", help="JSONL file with one prompt per line (required by 'batch').")
+    parser.add_argument(
+        "--output",
+        help="Results JSONL for 'batch'; also the checkpoint it resumes from (default: <input>.results.jsonl).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=(
+            "Number of worker processes for 'serve' (default: SERVER_WORKERS or CPU count) "
+            "or of concurrent prompts for 'batch' (default: BATCH_WORKERS or 4)."
+        ),
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=get_env_float("BATCH_RPM", 0.0),
+        help="Global ceiling of prompts per minute for 'batch' (default: BATCH_RPM; 0 = unlimited).",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Ignore and overwrite a previous 'batch' output instead of resuming from it.",
+    )
+    parser.add_argument(
+        "--response-cache",
+        action=argparse.BooleanOptionalAction,
+        default=get_env_bool("BATCH_USE_RESPONSE_CACHE", False),
+        help="Let 'batch' answer repeated prompts from the response cache (default: BATCH_USE_RESPONSE_CACHE; off).",
+    )
+    parser.add_argument(
+        "--affinity",
+        action="store_true",
+        default=get_env_bool("SERVER_CONVERSATION_AFFINITY", False),
+        help="Route each conversation to a fixed worker so its in-memory state stays local.",
     )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    if args.mode == "serve":
+        from app.channels.worker_pool import serve
+        from app.core.logging_config import configure_logging
+
+        configure_logging()
+
+        serve(args.workers or get_env_int("SERVER_WORKERS", 0) or os.cpu_count() or 1, affinity=args.affinity)
+        return
+    if args.mode == "batch":
+        if not args.input:
+            raise SystemExit("batch mode requires the input JSONL file: python main.py batch prompts.jsonl")
+        from app.core.logging_config import configure_logging
+        from app.core.telemetry import configure_telemetry
+
+        configure_logging()
+        # Antes de importar los módulos que registran tools, para que su instrumentación quede activa.
+        configure_telemetry()
+        from app.channels.batch_app import run_batch_channel
+
+        asyncio.run(
+            run_batch_channel(
+                args.input,
+                args.output,
+                workers=args.workers,
+                rpm=args.rpm,
+                resume=not args.fresh,
+                use_response_cache=args.response_cache,
+            )
+        )
+        return
     target_module = "main_cli" if args.mode == "cli" else "main_m365"
     runpy.run_module(target_module, run_name="__main__")
 
@@ -2,6 +2,13 @@
 
 import asyncio
 
+from app.core.logging_config import configure_logging
+from app.core.telemetry import configure_telemetry
+
+configure_logging()
+# Antes de importar los módulos que registran tools, para que su instrumentación quede activa.
+configure_telemetry()
+
 from app.channels.cli_app import run_cli_channel
 
 
@@ -1,11 +1,40 @@
 """Entry point for Microsoft 365 channel endpoint."""
 
-from app.channels.m365_app import create_agent_application
+from app.core.logging_config import configure_logging
+from app.core.telemetry import configure_telemetry
+
+configure_logging()
+# Antes de importar los módulos que registran tools, para que su instrumentación quede activa.
+configure_telemetry()
+
+from app.channels.m365_app import background_turns, create_agent_application, get_chat_service
 from app.channels.m365_auth import create_m365_auth_runtime
 from app.channels.start_server import start_server
+from app.channels.state_storage import DurableStorage
+from app.channels.worker_pool import WorkerSlot
+
+
+def run(worker: WorkerSlot | None = None) -> None:
+    """Arranca el canal M365 en este proceso (``worker`` lo identifica dentro de un pool)."""
+    chat_service = get_chat_service()
+    # El adapter comparte con los clientes de Foundry el pool de conexiones salientes del servicio.
+    adapter, auth_configuration = create_m365_auth_runtime(transport=chat_service.transport)
+    # Con STATE_STORE_URL el estado de turno se persiste y se comparte entre workers.
+    storage = DurableStorage.from_env()
+    agent_app = create_agent_application(adapter=adapter, storage=storage)
+    on_shutdown = [background_turns.drain, chat_service.stop]
+    if storage is not None:
+        on_shutdown.append(storage.close)
+    start_server(
+        agent_app,
+        auth_configuration,
+        # El agente se inicializa y precalienta en segundo plano; /readyz responde 503 hasta entonces.
+        on_startup=[chat_service.start_warm_up],
+        on_shutdown=on_shutdown,
+        readiness=lambda: chat_service.ready,
+        worker=worker,
+    )
 
 
 if __name__ == "__main__":
-    adapter, auth_configuration = create_m365_auth_runtime()
-    agent_app = create_agent_application(adapter=adapter)
-    start_server(agent_app, auth_configuration)
+    run()